@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DrawSchedule, DrawType, NumberLimit, Zone
+
+VERSION_KEY = 'catalog_snapshot_version'
+
+
+class CatalogSnapshot:
+    """Copia inmutable del catálogo en memoria, indexada por (zone_id, draw_type_id)"""
+
+    __slots__ = ('version', 'zones', 'draw_types', 'schedules', 'limits')
+
+    def __init__(self, version, zones, draw_types, schedules, limits):
+        self.version = version
+        self.zones: Dict[int, Zone] = zones
+        self.draw_types: Dict[int, DrawType] = draw_types
+        self.schedules: Dict[Tuple[int, int], DrawSchedule] = schedules
+        self.limits: Dict[Tuple[int, int], Dict[str, int]] = limits
+
+    @classmethod
+    def load(cls, version) -> 'CatalogSnapshot':
+        """Carga el catálogo completo desde la base de datos (4 consultas)"""
+        zones = {z.id: z for z in Zone.objects.all()}
+        draw_types = {d.id: d for d in DrawType.objects.all()}
+        schedules = {
+            (s.zone_id, s.draw_type_id): s
+            for s in DrawSchedule.objects.filter(is_active=True)
+        }
+        limits: Dict[Tuple[int, int], Dict[str, int]] = {}
+        for zone_id, draw_type_id, number, max_pieces in NumberLimit.objects.values_list(
+            'zone_id', 'draw_type_id', 'number', 'max_pieces'
+        ):
+            limits.setdefault((zone_id, draw_type_id), {})[number] = max_pieces
+        return cls(version, zones, draw_types, schedules, limits)
+
+    def get_schedule(self, zone_id: int, draw_type_id: int) -> Optional[DrawSchedule]:
+        """Horario activo para la zona y sorteo, o None"""
+        return self.schedules.get((zone_id, draw_type_id))
+
+    def get_limits(self, zone_id: int, draw_type_id: int) -> Dict[str, int]:
+        """Topes por número para la zona y sorteo"""
+        return self.limits.get((zone_id, draw_type_id), {})
+
+
+class CatalogCacheService:
+    """
+    Snapshot del catálogo por proceso, versionado mediante una clave en Redis
+
+    Cada proceso mantiene su propia copia y solo consulta la versión en Redis
+    cada CATALOG_SNAPSHOT_CHECK_SECONDS. Las escrituras al catálogo incrementan
+    la versión, lo que obliga a todos los procesos a recargar la copia.
+    """
+
+    _snapshot: Optional[CatalogSnapshot] = None
+    _checked_at: float = 0.0
+    _lock = threading.Lock()
+    # Este proceso escribió al catálogo y la transacción aún no se confirmó
+    _pending: bool = False
+
+    @classmethod
+    def get_snapshot(cls) -> CatalogSnapshot:
+        """Obtiene el snapshot vigente, recargándolo si la versión cambió"""
+        snapshot = cls._snapshot
+        now = time.monotonic()
+        interval = getattr(settings, 'CATALOG_SNAPSHOT_CHECK_SECONDS', 1)
+        if snapshot is not None and now - cls._checked_at < interval:
+            return snapshot
+
+        version = cls._get_version()
+        if snapshot is not None and version is not None and snapshot.version == version:
+            cls._checked_at = now
+            return snapshot
+
+        with cls._lock:
+            snapshot = cls._snapshot
+            if snapshot is None or version is None or snapshot.version != version:
+                in_transaction = transaction.get_connection().in_atomic_block
+                if not in_transaction:
+                    # Fuera de una transacción solo se leen datos confirmados
+                    cls._pending = False
+                # Una copia con cambios propios sin confirmar (que pueden revertirse)
+                # no se asocia a ninguna versión: se vuelve a cargar en la próxima revisión
+                snapshot = CatalogSnapshot.load(None if cls._pending and in_transaction else version)
+                cls._snapshot = snapshot
+            cls._checked_at = now
+        return snapshot
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """
+        Invalida el snapshot en este proceso y en todos los demás
+
+        La copia local se descarta de inmediato (este proceso ve sus propios
+        cambios); la versión compartida se incrementa solo al confirmar la
+        transacción, así ningún otro proceso recarga datos previos al commit.
+        """
+        cls._snapshot = None
+        cls._pending = True
+        transaction.on_commit(cls._invalidate_committed)
+
+    @classmethod
+    def _invalidate_committed(cls) -> None:
+        cls._snapshot = None
+        cls._pending = False
+        cls._bump_version()
+
+    @staticmethod
+    def _get_version():
+        try:
+            version = cache.get(VERSION_KEY)
+            if version is None:
+                cache.add(VERSION_KEY, 0, None)
+                version = cache.get(VERSION_KEY)
+            return version
+        except Exception:
+            # Sin Redis no se puede validar la copia: forzar recarga
+            return None
+
+    @staticmethod
+    def _bump_version() -> None:
+        try:
+            cache.add(VERSION_KEY, 0, None)
+            cache.incr(VERSION_KEY)
+        except Exception:
+            pass
@@ -1,8 +1,29 @@
 from rest_framework import serializers
 
+from .cache_service import CatalogCacheService
 from .models import DrawSchedule, DrawType, NumberLimit, Zone
 
 
+class CatalogSnapshotRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField que resuelve zonas/sorteos desde el snapshot del catálogo, sin consultas"""
+
+    def __init__(self, snapshot_attr, **kwargs):
+        self.snapshot_attr = snapshot_attr
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = getattr(CatalogCacheService.get_snapshot(), self.snapshot_attr).get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
 class ZoneSerializer(serializers.ModelSerializer):
     class Meta:
         model = Zone
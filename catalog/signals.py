@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_service import CatalogCacheService
+from .models import DrawSchedule, DrawType, NumberLimit, Zone
+
+
+@receiver([post_save, post_delete], sender=Zone)
+@receiver([post_save, post_delete], sender=DrawType)
+@receiver([post_save, post_delete], sender=DrawSchedule)
+@receiver([post_save, post_delete], sender=NumberLimit)
+def invalidate_catalog_snapshot(sender, **kwargs):
+    """Cualquier escritura al catálogo invalida el snapshot de todos los procesos"""
+    CatalogCacheService.invalidate()
@@ -7,6 +7,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 
 from accounts.models import User
 
+from .cache_service import CatalogCacheService
 from .models import DrawSchedule, DrawType, NumberLimit, Zone
 from .serializers import (
     DrawScheduleSerializer,
@@ -541,3 +542,56 @@ class CatalogPermissionsTests(TestCase):
         self.client.credentials(**self.get_auth_headers(self.seller_user))
         response = self.client.get(reverse("numberlimit-list"))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin123"
+        )
+        self.zone = Zone.objects.create(name="Snapshot Zone")
+        self.draw_type = DrawType.objects.create(code="SNAP", name="Snapshot Draw")
+        self.limit = NumberLimit.objects.create(
+            zone=self.zone, draw_type=self.draw_type, number="12", max_pieces=100
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.admin_user).access_token}"
+        )
+
+    def test_snapshot_served_without_queries(self):
+        CatalogCacheService.get_snapshot()
+        with self.assertNumQueries(0):
+            snapshot = CatalogCacheService.get_snapshot()
+            self.assertEqual(snapshot.zones[self.zone.id].name, "Snapshot Zone")
+            self.assertEqual(
+                snapshot.get_limits(self.zone.id, self.draw_type.id), {"12": 100}
+            )
+
+    def test_write_through_api_invalidates_snapshot(self):
+        before = CatalogCacheService._get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("numberlimit-detail", args=[self.limit.id]),
+                {"max_pieces": 150},
+                format="json",
+            )
+            # Este proceso ya ve el cambio; los demás recién al confirmar
+            self.assertEqual(
+                CatalogCacheService.get_snapshot().get_limits(self.zone.id, self.draw_type.id), {"12": 150}
+            )
+            self.assertEqual(CatalogCacheService._get_version(), before)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        after = CatalogCacheService.get_snapshot()
+        self.assertGreater(after.version, before)
+        self.assertEqual(after.get_limits(self.zone.id, self.draw_type.id), {"12": 150})
+
+    def test_inactive_schedule_not_in_snapshot(self):
+        DrawSchedule.objects.create(
+            zone=self.zone,
+            draw_type=self.draw_type,
+            cutoff_time="18:00:00",
+            is_active=False,
+        )
+        snapshot = CatalogCacheService.get_snapshot()
+        self.assertIsNone(snapshot.get_schedule(self.zone.id, self.draw_type.id))
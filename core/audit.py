@@ -1,9 +1,22 @@
+import atexit
+import fcntl
+import json
 import logging
-from typing import Any, Dict, Optional
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import InterfaceError, OperationalError, close_old_connections, models, transaction
 from django.utils import timezone
+from prometheus_client import Counter, Gauge, Histogram
 
 
 # Configuración del logger de auditoría
@@ -26,7 +39,8 @@ class AuditLog(models.Model):
         ('SYSTEM', 'Sistema'),
     ]
     
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Hora del evento, no de la escritura (los eventos se guardan por lotes)
+    timestamp = models.DateTimeField(default=timezone.now)
     user = models.ForeignKey(
         'accounts.User', 
         on_delete=models.SET_NULL, 
@@ -45,7 +59,8 @@ class AuditLog(models.Model):
     class Meta:
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['timestamp']),
+            # BRIN: la auditoría se inserta en orden de tiempo (ver migración 0003)
+            BrinIndex(fields=['timestamp'], name='audit_timestamp_brin'),
             models.Index(fields=['user', 'action']),
             models.Index(fields=['resource_type', 'resource_id']),
         ]
@@ -80,21 +95,25 @@ class AuditLog(models.Model):
         )
         
         # También loggear al logger de auditoría
+        log_entry.emit_log()
+        
+        return log_entry
+    
+    def emit_log(self):
+        """Escribe la entrada en el logger de auditoría"""
         audit_logger.info(
-            f"AUDIT: {action} - {description} - User: {user} - "
-            f"Resource: {resource_type}:{resource_id}",
+            f"AUDIT: {self.action} - {self.description} - User: {self.user_id} - "
+            f"Resource: {self.resource_type}:{self.resource_id}",
             extra={
-                'audit_log_id': log_entry.id,
-                'user_id': user.id if user else None,
-                'action': action,
-                'resource_type': resource_type,
-                'resource_id': resource_id,
-                'ip_address': ip_address,
-                'metadata': metadata
+                'audit_log_id': self.id,
+                'user_id': self.user_id,
+                'action': self.action,
+                'resource_type': self.resource_type,
+                'resource_id': self.resource_id,
+                'ip_address': self.ip_address,
+                'metadata': self.metadata
             }
         )
-        
-        return log_entry
 
 
 class AuditMixin:
@@ -171,6 +190,261 @@ def audit_function_call(
     return decorator
 
 
+# Campos de AuditLog que se guardan en el archivo de desborde
+SPILL_FIELDS = (
+    'timestamp', 'user_id', 'action', 'resource_type', 'resource_id',
+    'description', 'ip_address', 'user_agent', 'metadata',
+)
+
+audit_events_total = Counter(
+    'audit_events_total',
+    'Eventos de auditoría por destino',
+    ['result']
+)
+audit_queue_depth = Gauge(
+    'audit_queue_depth',
+    'Eventos de auditoría esperando escritura'
+)
+audit_flush_duration_seconds = Histogram(
+    'audit_flush_duration_seconds',
+    'Duración de cada escritura por lotes de auditoría'
+)
+
+
+class AuditLogWriter:
+    """
+    Escritura de auditoría fuera del camino crítico de la petición
+
+    Las entradas se encolan en memoria (cola acotada a AUDIT_LOG_QUEUE_SIZE)
+    y un hilo las guarda con bulk_create cada AUDIT_LOG_BATCH_SIZE eventos o
+    AUDIT_LOG_FLUSH_INTERVAL_MS milisegundos. Si la cola está llena o la base
+    falla, los eventos se agregan a AUDIT_LOG_SPILL_FILE (JSON por línea) y se
+    reintentan después de la siguiente escritura exitosa.
+    """
+    
+    def __init__(self):
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'spilled': 0, 'dropped': 0, 'quarantined': 0, 'flushes': 0}
+    
+    def enqueue(self, entry: AuditLog):
+        """Encola una entrada sin guardar; nunca bloquea a quien la registra"""
+        if not getattr(settings, 'AUDIT_LOG_ASYNC', True):
+            entry.save()
+            entry.emit_log()
+            self.stats['written'] += 1
+            audit_events_total.labels(result='written').inc()
+            return
+        self._ensure_thread()
+        try:
+            self._get_queue().put_nowait(entry)
+        except queue.Full:
+            self._spill([entry])
+            return
+        self.stats['queued'] += 1
+        audit_queue_depth.set(self._queue.qsize())
+    
+    def flush(self) -> int:
+        """Escribe todo lo encolado en el hilo actual; devuelve cuántas entradas"""
+        written = 0
+        batch_size = getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+        while True:
+            batch = self._drain(batch_size)
+            if not batch:
+                break
+            written += len(batch) if self._write(batch) else 0
+        self._replay_spill()
+        return written
+    
+    def _get_queue(self) -> queue.Queue:
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 10000))
+        return self._queue
+    
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+    
+    def _run(self):
+        batch_size = getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+        interval = getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL_MS', 200) / 1000
+        events = self._get_queue()
+        while True:
+            try:
+                batch = [events.get()]
+                deadline = time.monotonic() + interval
+                while len(batch) < batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(events.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                close_old_connections()
+                if self._write(batch):
+                    self._replay_spill()
+            except Exception:
+                audit_logger.exception('Error en el escritor de auditoría')
+    
+    def _drain(self, limit: int) -> List[AuditLog]:
+        batch = []
+        events = self._get_queue()
+        while len(batch) < limit:
+            try:
+                batch.append(events.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write(self, batch: List[AuditLog]) -> bool:
+        """Guarda un lote; si la base falla lo manda al archivo de desborde"""
+        start = time.perf_counter()
+        try:
+            AuditLog.objects.bulk_create(batch)
+        except Exception:
+            audit_logger.warning('No se pudo guardar la auditoría, desbordando a disco', exc_info=True)
+            self._spill(batch)
+            return False
+        finally:
+            audit_flush_duration_seconds.observe(time.perf_counter() - start)
+            if self._queue is not None:
+                audit_queue_depth.set(self._queue.qsize())
+        self.stats['written'] += len(batch)
+        self.stats['flushes'] += 1
+        audit_events_total.labels(result='written').inc(len(batch))
+        for entry in batch:
+            entry.emit_log()
+        return True
+    
+    def _spill(self, entries: List[AuditLog]):
+        path = Path(settings.AUDIT_LOG_SPILL_FILE)
+        lines = ''.join(
+            json.dumps({field: getattr(entry, field) for field in SPILL_FIELDS}, default=str) + '\n'
+            for entry in entries
+        )
+        try:
+            with self._spill_lock:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as spill:
+                    spill.write(lines)
+                    spill.flush()
+                    os.fsync(spill.fileno())
+        except OSError:
+            audit_logger.error(f'Se perdieron {len(entries)} eventos de auditoría', exc_info=True)
+            self.stats['dropped'] += len(entries)
+            audit_events_total.labels(result='dropped').inc(len(entries))
+            return
+        self.stats['spilled'] += len(entries)
+        audit_events_total.labels(result='spilled').inc(len(entries))
+    
+    def _replay_spill(self):
+        """
+        Reintenta los eventos desbordados
+
+        Hay un solo dueño a la vez: un lock en el proceso y un flock sobre
+        <archivo>.lock entre procesos. El archivo se renombra a .replay antes
+        de leerlo. Si el lote falla se reintenta fila por fila: las que fallan
+        solas van a <archivo>.quarantine y, si la base no responde, lo que
+        falta queda en .replay para el próximo intento.
+        """
+        path = Path(settings.AUDIT_LOG_SPILL_FILE)
+        replaying = path.with_name(path.name + '.replay')
+        if not path.exists() and not replaying.exists():
+            return
+        with self._replay_lock, _exclusive(path.with_name(path.name + '.lock')) as owner:
+            if not owner:
+                return
+            with self._spill_lock:
+                if not replaying.exists():
+                    if not path.exists():
+                        return
+                    os.replace(path, replaying)
+            with open(replaying, encoding='utf-8') as spill:
+                lines = [line for line in spill if line.strip()]
+            pending = self._replay_lines(lines, path.with_name(path.name + '.quarantine'))
+            if pending:
+                partial = replaying.with_name(replaying.name + '.tmp')
+                partial.write_text(''.join(pending), encoding='utf-8')
+                os.replace(partial, replaying)
+            else:
+                replaying.unlink()
+    
+    def _replay_lines(self, lines: List[str], quarantine: Path) -> List[str]:
+        """Guarda las líneas desbordadas; devuelve las que quedan pendientes"""
+        entries, bad = [], []
+        for line in lines:
+            try:
+                entries.append((line, _from_spill(json.loads(line))))
+            except (ValueError, TypeError):
+                bad.append(line)
+        written, pending = 0, []
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create(
+                    [entry for _, entry in entries], batch_size=getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+                )
+            written = len(entries)
+        except (OperationalError, InterfaceError):
+            audit_logger.warning('Base no disponible, se reintentará la auditoría desbordada', exc_info=True)
+            pending = [line for line, _ in entries]
+        except Exception:
+            for index, (line, entry) in enumerate(entries):
+                try:
+                    with transaction.atomic():
+                        AuditLog.objects.bulk_create([entry])
+                    written += 1
+                except (OperationalError, InterfaceError):
+                    pending = [line for line, _ in entries[index:]]
+                    break
+                except Exception:
+                    bad.append(line)
+        if bad:
+            audit_logger.error(f'{len(bad)} eventos de auditoría inválidos movidos a {quarantine}')
+            with open(quarantine, 'a', encoding='utf-8') as spill:
+                spill.write(''.join(bad))
+            self.stats['quarantined'] += len(bad)
+            audit_events_total.labels(result='quarantined').inc(len(bad))
+        self.stats['written'] += written
+        audit_events_total.labels(result='replayed').inc(written)
+        return pending
+
+
+@contextmanager
+def _exclusive(lock_path: Path) -> Iterator[bool]:
+    """flock no bloqueante: indica si este proceso es el dueño del reintento"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _from_spill(data: Dict[str, Any]) -> AuditLog:
+    data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+    return AuditLog(**data)
+
+
+# Instancia global del escritor de auditoría
+audit_writer = AuditLogWriter()
+
+
 class AuditMiddleware:
     """
     Middleware para capturar información de auditoría automáticamente
@@ -202,7 +476,7 @@ class AuditMiddleware:
                 f"Petición {request.method} a {request.path}"
             )
             
-            AuditLog.log_action(
+            entry = AuditLog(
                 user=request.user,
                 action=action,
                 description=description,
@@ -217,6 +491,8 @@ class AuditMiddleware:
                     'status_code': response.status_code,
                 }
             )
+            # Se encola al confirmar la transacción (de inmediato si no hay una abierta)
+            transaction.on_commit(lambda: audit_writer.enqueue(entry))
     
     def _get_client_ip(self, request):
         """Obtiene la IP real del cliente"""
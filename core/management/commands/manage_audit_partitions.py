@@ -0,0 +1,54 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.partitioning import AuditPartitionService, month_start, next_month, previous_month
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea por adelantado las particiones mensuales de auditoría y separa o elimina las vencidas '
+        '(PostgreSQL; correr a diario o mensualmente)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=2, help='Meses a futuro a crear (por defecto 2)')
+        parser.add_argument(
+            '--retain-months', type=int, default=settings.AUDIT_LOG_RETENTION_MONTHS,
+            help='Separar los meses anteriores a los últimos N (por defecto AUDIT_LOG_RETENTION_MONTHS)',
+        )
+        parser.add_argument('--drop', action='store_true', help='Eliminar las particiones separadas')
+
+    def handle(self, *args, **options):
+        if not AuditPartitionService.is_supported():
+            raise CommandError('La auditoría no está particionada (requiere PostgreSQL y la migración core 0003)')
+        if options['ahead'] < 0:
+            raise CommandError('--ahead debe ser mayor o igual que 0')
+        if options['retain_months'] < 1:
+            raise CommandError('--retain-months debe ser mayor que 0')
+
+        current = month_start(datetime.now(dt_timezone.utc).date())
+        last = current
+        for _ in range(options['ahead']):
+            last = next_month(last)
+        created = AuditPartitionService.ensure_monthly(current, last)
+        self.stdout.write(self.style.SUCCESS(f'Particiones creadas: {len(created)}'))
+        for name in created:
+            self.stdout.write(f'  + {name}')
+
+        # Se conserva el mes actual y los retain_months - 1 anteriores
+        cutoff = current
+        for _ in range(options['retain_months'] - 1):
+            cutoff = previous_month(cutoff)
+        detached = AuditPartitionService.detach_before(cutoff, drop=options['drop'])
+        action = 'eliminadas' if options['drop'] else 'separadas'
+        self.stdout.write(self.style.SUCCESS(f'Particiones {action} (anteriores a {cutoff}): {len(detached)}'))
+        for name in detached:
+            self.stdout.write(f'  - {name}')
+
+        pending = AuditPartitionService.default_rows()
+        if pending:
+            self.stdout.write(self.style.WARNING(
+                f'La partición DEFAULT tiene {pending} eventos: faltaban particiones para esas fechas'
+            ))
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+# Meses a futuro que se crean de antemano (luego: manage.py manage_audit_partitions)
+MONTHS_AHEAD = 2
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_auditlog(apps, schema_editor):
+    """
+    Convierte core_auditlog en una tabla particionada por mes de timestamp.
+
+    Solo PostgreSQL; en otros motores no hace nada. El índice B-tree sobre
+    timestamp se reemplaza por uno BRIN: la auditoría se inserta en orden de
+    tiempo, así el índice ocupa unas pocas páginas y no encarece cada insert.
+    Copia los datos en la misma transacción (conviene una ventana de
+    mantenimiento si la tabla es grande).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    user_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    today = datetime.now(dt_timezone.utc).date()
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(timestamp) FROM core_auditlog')
+        first = cursor.fetchone()[0]
+        month = _month_start(first.astimezone(dt_timezone.utc).date() if first else today)
+        last = _month_start(today)
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+
+        cursor.execute('ALTER TABLE core_auditlog RENAME TO core_auditlog_legacy')
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = 'core_auditlog_legacy'::regclass AND contype = 'p'"
+        )
+        pkey = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE core_auditlog_legacy RENAME CONSTRAINT {pkey} TO core_auditlog_legacy_pkey')
+        cursor.execute(
+            'CREATE TABLE core_auditlog (LIKE core_auditlog_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (timestamp)'
+        )
+        cursor.execute('ALTER TABLE core_auditlog ADD PRIMARY KEY (id, timestamp)')
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE core_auditlog_p{month:%Y%m} PARTITION OF core_auditlog FOR VALUES FROM (%s) TO (%s)',
+                [f'{month.isoformat()} 00:00+00', f'{_next_month(month).isoformat()} 00:00+00'],
+            )
+            month = _next_month(month)
+        cursor.execute('CREATE TABLE core_auditlog_default PARTITION OF core_auditlog DEFAULT')
+        cursor.execute('INSERT INTO core_auditlog SELECT * FROM core_auditlog_legacy')
+        cursor.execute('DROP TABLE core_auditlog_legacy CASCADE')
+
+        cursor.execute('CREATE SEQUENCE core_auditlog_id_seq OWNED BY core_auditlog.id')
+        cursor.execute("ALTER TABLE core_auditlog ALTER COLUMN id SET DEFAULT nextval('core_auditlog_id_seq')")
+        cursor.execute(
+            "SELECT setval('core_auditlog_id_seq', COALESCE(max(id), 1), max(id) IS NOT NULL) FROM core_auditlog"
+        )
+
+        # Índices (se propagan a cada partición) y clave foránea
+        cursor.execute('CREATE INDEX audit_timestamp_brin ON core_auditlog USING brin (timestamp)')
+        cursor.execute('CREATE INDEX core_auditl_user_id_4f5b78_idx ON core_auditlog (user_id, action)')
+        cursor.execute(
+            'CREATE INDEX core_auditl_resourc_a674ad_idx ON core_auditlog (resource_type, resource_id)'
+        )
+        cursor.execute(
+            f'ALTER TABLE core_auditlog ADD CONSTRAINT core_auditlog_user_id_fk '
+            f'FOREIGN KEY (user_id) REFERENCES {user_table} (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auditlog_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='auditlog',
+                    name='core_auditl_timesta_80074f_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='auditlog',
+                    index=django.contrib.postgres.indexes.BrinIndex(
+                        fields=['timestamp'], name='audit_timestamp_brin'
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(partition_auditlog),
+            ],
+        ),
+    ]
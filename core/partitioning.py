@@ -0,0 +1,137 @@
+import re
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional
+
+from django.db import connection, transaction
+
+AUDIT_TABLE = 'core_auditlog'
+
+# Límites de una partición por timestamp (en UTC, la zona de la conexión)
+_BOUND_RE = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})[^']*'\) TO \('(\d{4}-\d{2}-\d{2})[^']*'\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    # Rango semiabierto [start, end) en UTC; None en la partición DEFAULT
+    start: Optional[date]
+    end: Optional[date]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def previous_month(day: date) -> date:
+    return month_start(day.replace(day=1) - timedelta(days=1))
+
+
+class AuditPartitionService:
+    """
+    Particiones mensuales por timestamp de la auditoría
+
+    Solo aplica en PostgreSQL con la tabla ya particionada por la migración
+    core 0003. Cada mes es una tabla propia, así la retención separa o
+    elimina meses completos en lugar de borrar filas.
+    """
+
+    @staticmethod
+    def is_supported() -> bool:
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [AUDIT_TABLE])
+            row = cursor.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    @staticmethod
+    def list_partitions() -> List[Partition]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                ORDER BY c.relname
+                """,
+                [AUDIT_TABLE],
+            )
+            rows = cursor.fetchall()
+        partitions = []
+        for name, bound in rows:
+            match = _BOUND_RE.search(bound)
+            if match:
+                partitions.append(Partition(name, date.fromisoformat(match[1]), date.fromisoformat(match[2])))
+            else:
+                partitions.append(Partition(name, None, None))
+        return partitions
+
+    @staticmethod
+    def ensure_monthly(start: date, end: date) -> List[str]:
+        """
+        Crea las particiones mensuales que falten entre los meses de start y end
+
+        Las filas de esos meses que ya cayeron en la partición DEFAULT se
+        mueven a la partición nueva en la misma transacción.
+
+        Returns:
+            Nombres de las particiones creadas
+        """
+        created = []
+        with transaction.atomic():
+            covered = [p for p in AuditPartitionService.list_partitions() if p.start is not None]
+            month = month_start(start)
+            while month <= end:
+                if not any(p.start <= month < p.end for p in covered):
+                    name = f'{AUDIT_TABLE}_p{month:%Y%m}'
+                    bounds = [f'{month.isoformat()} 00:00+00', f'{next_month(month).isoformat()} 00:00+00']
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f'CREATE TABLE {name} (LIKE {AUDIT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+                        )
+                        cursor.execute(
+                            f'WITH moved AS (DELETE FROM {AUDIT_TABLE}_default '
+                            f'WHERE timestamp >= %s AND timestamp < %s RETURNING *) '
+                            f'INSERT INTO {name} SELECT * FROM moved',
+                            bounds,
+                        )
+                        cursor.execute(
+                            f'ALTER TABLE {AUDIT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                            bounds,
+                        )
+                    created.append(name)
+                month = next_month(month)
+        return created
+
+    @staticmethod
+    def detach_before(cutoff: date, drop: bool = False) -> List[str]:
+        """
+        Separa (y opcionalmente elimina) las particiones que terminan antes de cutoff
+
+        Las particiones separadas quedan como tablas sueltas con sus datos,
+        fuera de las consultas sobre AuditLog, listas para pg_dump.
+
+        Returns:
+            Nombres de las particiones separadas
+        """
+        detached = []
+        with transaction.atomic():
+            for partition in AuditPartitionService.list_partitions():
+                if partition.end is None or partition.end > cutoff:
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {partition.name}')
+                    if drop:
+                        cursor.execute(f'DROP TABLE {partition.name}')
+                detached.append(partition.name)
+        return detached
+
+    @staticmethod
+    def default_rows() -> int:
+        """Filas que cayeron en la partición DEFAULT (falta crear particiones)"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {AUDIT_TABLE}_default')
+            return cursor.fetchone()[0]
@@ -0,0 +1,192 @@
+from ipaddress import ip_address, ip_network
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpRequest
+
+# Cómo se identifica al cliente: usuario autenticado o IP, solo IP, o un
+# único contador compartido por todos los clientes del endpoint
+IDENTIFIER_STRATEGIES = ('user_or_ip', 'ip', 'global')
+
+# Bloques de RATE_LIMITING con las rutas y límites que usan si no los declaran
+DEFAULT_BLOCKS = (
+    ('AUTH', {'paths': ('/api/auth/', '/admin/login/'), 'max_requests': 5, 'window_seconds': 300}),
+    ('REPORTS', {'paths': ('/api/sales/tickets/reports/',), 'max_requests': 20, 'window_seconds': 3600}),
+    ('API', {'paths': ('/api/',), 'max_requests': 1000, 'window_seconds': 3600}),
+    ('DEFAULT', {'paths': ('/',), 'max_requests': 100, 'window_seconds': 3600}),
+)
+
+_rules: Optional['RateLimitRules'] = None
+
+
+class RateLimitRule:
+    """Límite para un conjunto de rutas (prefijos por segmento, '*' = un segmento cualquiera)"""
+
+    __slots__ = ('name', 'paths', 'methods', 'identifier', 'limiter')
+
+    def __init__(
+        self,
+        name: str,
+        paths: Iterable[str],
+        max_requests: int,
+        window_seconds: int,
+        methods: Optional[Iterable[str]] = None,
+        identifier: str = 'user_or_ip',
+    ):
+        if identifier not in IDENTIFIER_STRATEGIES:
+            raise ImproperlyConfigured(
+                f"RATE_LIMITING: identifier inválido '{identifier}' en la regla '{name}'"
+            )
+        self.name = name
+        self.paths = tuple(paths)
+        self.methods: Optional[FrozenSet[str]] = frozenset(m.upper() for m in methods) if methods else None
+        self.identifier = identifier
+        # Import diferido: core.rate_limiting importa este módulo
+        from .rate_limiting import RateLimiter
+
+        self.limiter = RateLimiter(
+            key_prefix=f'rate_limit:{name}', max_requests=max_requests, window_seconds=window_seconds
+        )
+
+
+class _Node:
+    __slots__ = ('children', 'rules')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        # (segmentos literales, orden en la configuración, regla)
+        self.rules: List[Tuple[int, int, RateLimitRule]] = []
+
+
+class RateLimitRules:
+    """
+    Reglas de RATE_LIMITING compiladas una sola vez
+
+    Las rutas se guardan en un trie por segmentos, así encontrar la regla de
+    una petición recorre la ruta una vez (O(largo de la ruta)) en lugar de
+    probar cada regla. Gana la regla más profunda; a igual profundidad, la
+    que tiene más segmentos literales y luego la declarada primero. Las
+    listas blancas se convierten a conjuntos y redes CIDR al compilar.
+    """
+
+    def __init__(self, rl_settings: Dict):
+        self.enabled = rl_settings.get('ENABLED', True)
+        ips, networks = set(), []
+        for entry in rl_settings.get('WHITELIST_IPS', []):
+            if '/' in entry:
+                networks.append(ip_network(entry, strict=False))
+            else:
+                ips.add(entry)
+        self.whitelist_ips: FrozenSet[str] = frozenset(ips)
+        self.whitelist_networks = tuple(networks)
+        self.whitelist_hosts: FrozenSet[str] = frozenset(rl_settings.get('WHITELIST_HOSTS', []))
+
+        self.rules: List[RateLimitRule] = []
+        for config in rl_settings.get('RULES', []):
+            self.rules.append(_build_rule(config['name'], config, config.get('paths')))
+        for block, defaults in DEFAULT_BLOCKS:
+            config = {**defaults, **rl_settings.get(block, {})}
+            self.rules.append(_build_rule(block.lower(), config, config['paths']))
+
+        self._root = _Node()
+        for order, rule in enumerate(self.rules):
+            for path in rule.paths:
+                node = self._root
+                literals = 0
+                for segment in _segments(path):
+                    node = node.children.setdefault(segment, _Node())
+                    literals += segment != '*'
+                node.rules.append((literals, order, rule))
+
+    def match(self, path: str, method: str) -> Optional[RateLimitRule]:
+        """Regla más específica para la ruta y el método, o None"""
+        segments = _segments(path)
+        best: Optional[Tuple[int, int, int]] = None
+        best_rule = None
+        active = [self._root]
+        depth = 0
+        while active:
+            for node in active:
+                for literals, order, rule in node.rules:
+                    if rule.methods is not None and method not in rule.methods:
+                        continue
+                    rank = (depth, literals, -order)
+                    if best is None or rank > best:
+                        best, best_rule = rank, rule
+            if depth == len(segments):
+                break
+            segment = segments[depth]
+            active = [
+                child
+                for node in active
+                for child in (node.children.get(segment), node.children.get('*'))
+                if child is not None
+            ]
+            depth += 1
+        return best_rule
+
+    def is_whitelisted(self, request: HttpRequest) -> bool:
+        ip = client_ip(request)
+        if ip in self.whitelist_ips:
+            return True
+        if ip and self.whitelist_networks:
+            try:
+                address = ip_address(ip.strip())
+            except ValueError:
+                address = None
+            if address is not None and any(address in network for network in self.whitelist_networks):
+                return True
+        host = request.get_host().split(':')[0]
+        return bool(host) and host in self.whitelist_hosts
+
+    @staticmethod
+    def identify(rule: RateLimitRule, request: HttpRequest) -> str:
+        """Identificador del cliente según la estrategia de la regla"""
+        if rule.identifier == 'global':
+            return 'global'
+        if rule.identifier == 'user_or_ip' and hasattr(request, 'user') and request.user.is_authenticated:
+            return f"user_{request.user.id}"
+        return f"ip_{client_ip(request)}"
+
+
+def get_rules() -> RateLimitRules:
+    """Reglas compiladas desde settings.RATE_LIMITING (se recompilan si el setting cambia)"""
+    global _rules
+    if _rules is None:
+        from django.conf import settings
+
+        _rules = RateLimitRules(getattr(settings, 'RATE_LIMITING', {}))
+    return _rules
+
+
+def client_ip(request: HttpRequest) -> Optional[str]:
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+@receiver(setting_changed)
+def _reset_rules(setting, **kwargs):
+    global _rules
+    if setting == 'RATE_LIMITING':
+        _rules = None
+
+
+def _build_rule(name: str, config: Dict, paths: Optional[Iterable[str]]) -> RateLimitRule:
+    if not paths:
+        raise ImproperlyConfigured(f"RATE_LIMITING: la regla '{name}' no define 'paths'")
+    return RateLimitRule(
+        name,
+        paths,
+        config['max_requests'],
+        config['window_seconds'],
+        methods=config.get('methods'),
+        identifier=config.get('identifier', 'user_or_ip'),
+    )
+
+
+def _segments(path: str) -> List[str]:
+    return [segment for segment in path.split('/') if segment]
@@ -1,15 +1,112 @@
+import threading
 import time
-from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from typing import Dict, Tuple
 
 from django.conf import settings
 from django.core.cache import cache
-from django.http import HttpRequest, JsonResponse
+from django.http import JsonResponse
 from rest_framework import status
 
+from .rate_limit_rules import get_rules
+
+
+# GCRA (generic cell rate algorithm): una sola clave con el "theoretical
+# arrival time" (TAT) en microsegundos. Equivale a un balde de max_requests
+# fichas que se recarga de forma continua a lo largo de la ventana, sin el
+# doble de ráfaga que permite la ventana fija en el borde entre ventanas.
+# Usa TIME de Redis para que todos los procesos compartan el mismo reloj.
+# Se pueden pedir varias fichas a la vez (préstamo para el balde local) y se
+# conceden las disponibles hasta ese número; las fichas devueltas (préstamo
+# anterior sin usar) se descuentan del TAT antes de conceder.
+#
+# KEYS[1]: clave; ARGV[1]: max_requests; ARGV[2]: window_seconds; ARGV[3]: fichas pedidas
+# (0 = solo consultar); ARGV[4]: fichas devueltas
+# Devuelve {concedidas, restantes, segundos hasta recargar todo, segundos para reintentar}
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2]) * 1000000
+local requested = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4] or '0')
+local interval = window / limit
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000000 + tonumber(clock[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now) - refund * interval
+if tat < now then
+    tat = now
+end
+if requested == 0 and refund == 0 then
+    local available = math.floor((now + window - tat) / interval)
+    return {0, available, math.ceil((tat - now) / 1000000), math.max(0, math.ceil((tat + interval - window - now) / 1000000))}
+end
+local granted = math.min(requested, math.floor((now + window - tat) / interval))
+if granted <= 0 then
+    if refund > 0 then
+        redis.call('SET', KEYS[1], string.format('%.0f', tat), 'PX', math.max(1, math.ceil((tat - now) / 1000)))
+    end
+    return {0, 0, math.ceil((tat - now) / 1000000), math.ceil((tat + interval - window - now) / 1000000)}
+end
+local new_tat = tat + granted * interval
+redis.call('SET', KEYS[1], string.format('%.0f', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+return {granted, math.floor((now + window - new_tat) / interval), math.ceil((new_tat - now) / 1000000), 0}
+"""
+
+# Baldes locales que se guardan como máximo por proceso (se descartan los menos usados)
+LOCAL_BUCKETS_MAX = 10000
+# Segundos que un proceso recuerda un rechazo sin consultar Redis: acotado para
+# ver pronto las fichas que devuelven otros procesos
+REJECTION_CACHE_SECONDS = 1.0
+
+_gcra_script = None
+_local_buckets: "OrderedDict[tuple, _LocalBucket]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+class _LocalBucket:
+    """Fichas prestadas por Redis a este proceso para un identificador"""
+
+    __slots__ = ('lease', 'leased_at', 'tokens', 'remaining', 'reset_time', 'expires_at', 'retry_at')
+
+    def __init__(
+        self,
+        lease: int,
+        leased_at: float,
+        tokens: int,
+        remaining: int,
+        reset_time: int,
+        expires_at: float,
+        retry_at: float = 0.0,
+    ):
+        # Tamaño del préstamo y cuándo se pidió
+        self.lease = lease
+        self.leased_at = leased_at
+        self.tokens = tokens
+        # Restantes en Redis al momento del préstamo (para los headers)
+        self.remaining = remaining
+        self.reset_time = reset_time
+        self.expires_at = expires_at
+        # Rechazo cacheado: hasta este momento no se vuelve a consultar Redis
+        self.retry_at = retry_at
+
 
 class RateLimiter:
     """
     Sistema de rate limiting personalizado usando Redis
+
+    Cada consulta a Redis es un único script atómico (GCRA) que decide y
+    devuelve los valores de los headers en el mismo viaje. Para no pagar
+    ese viaje en cada petición, cada proceso toma fichas prestadas y decide
+    localmente hasta agotarlas. El préstamo se adapta al ritmo local: empieza
+    en una ficha, se duplica cada vez que se agota antes de vencer (hasta
+    RATE_LIMITING['LOCAL_LEASE_FRACTION'] del límite, 10% por defecto) y se
+    reduce a la mitad si vence con fichas sin usar, que se devuelven a Redis
+    en el siguiente préstamo. Así un cliente con poco tráfico repartido entre
+    muchos procesos no agota su límite en préstamos. El límite global se
+    mantiene porque las fichas prestadas ya están descontadas en Redis. Los
+    rechazos se recuerdan a lo sumo REJECTION_CACHE_SECONDS.
+
+    Si el cache no es Redis (tests, desarrollo) se usa una ventana fija con
+    cache.add + cache.incr.
     """
     
     def __init__(
@@ -27,163 +124,254 @@ class RateLimiter:
         current_window = int(time.time() // self.window_seconds)
         return f"{self.key_prefix}:{identifier}:{current_window}"
     
+    def _lease_size(self) -> int:
+        """Máximo de fichas que se piden a Redis por vez"""
+        fraction = getattr(settings, 'RATE_LIMITING', {}).get('LOCAL_LEASE_FRACTION', 0.1)
+        return max(1, int(self.max_requests * fraction))
+    
     def is_allowed(self, identifier: str) -> Tuple[bool, Dict]:
         """
-        Verifica si la petición está permitida
+        Verifica si la petición está permitida y la cuenta
         
         Returns:
-            Tuple[bool, Dict]: (permitido, información del rate limit)
+            Tuple[bool, Dict]: (permitido, información del rate limit);
+            headers_for(info) arma los headers sin volver a consultar
         """
-        cache_key = self._get_cache_key(identifier)
-        
-        # Obtener conteo actual
-        current_count = cache.get(cache_key, 0)
+        max_lease = self._lease_size()
+        if max_lease == 1:
+            granted, info = self._lease(identifier, 1)
+            return bool(granted), info
         
-        if current_count >= self.max_requests:
-            # Calcular tiempo restante
-            current_time = time.time()
-            window_start = (
-                current_time // self.window_seconds
-            ) * self.window_seconds
-            reset_time = window_start + self.window_seconds
-            time_remaining = int(reset_time - current_time)
-            
-            return False, {
-                'limit_exceeded': True,
-                'current_count': current_count,
-                'max_requests': self.max_requests,
-                'window_seconds': self.window_seconds,
-                'reset_time': reset_time,
-                'time_remaining': time_remaining
-            }
+        key = (self.key_prefix, identifier, self.max_requests, self.window_seconds)
+        now = time.time()
+        lease, refund, leased_at = 1, 0, now
+        with _local_lock:
+            bucket = _local_buckets.get(key)
+            if bucket is not None:
+                _local_buckets.move_to_end(key)
+                if bucket.retry_at > now:
+                    return False, self._local_info(bucket, now, allowed=False)
+                if bucket.tokens > 0 and bucket.expires_at > now:
+                    bucket.tokens -= 1
+                    return True, self._local_info(bucket, now)
+                if bucket.tokens > 0:
+                    # Venció con fichas sin usar: se devuelven y el préstamo se achica
+                    lease = max(1, bucket.lease // 2)
+                    refund, leased_at = bucket.tokens, bucket.leased_at
+                    bucket.tokens = 0
+                elif bucket.expires_at > now:
+                    # Se agotó antes de vencer: el ritmo local pide un préstamo mayor
+                    lease = min(max_lease, bucket.lease * 2)
+                else:
+                    lease = max(1, bucket.lease)
         
-        # Incrementar contador
-        cache.set(cache_key, current_count + 1, self.window_seconds)
+        granted, info = self._lease(identifier, lease, refund, leased_at)
+        with _local_lock:
+            if granted:
+                # Las fichas prestadas equivalen a lease/max_requests de la ventana
+                bucket = _LocalBucket(
+                    lease,
+                    now,
+                    granted - 1,
+                    info['remaining_requests'],
+                    info['reset_time'],
+                    now + max(1.0, self.window_seconds * lease / self.max_requests),
+                )
+            else:
+                bucket = _LocalBucket(
+                    0, now, 0, 0, info['reset_time'], now,
+                    now + min(info['retry_after'], REJECTION_CACHE_SECONDS),
+                )
+            _local_buckets[key] = bucket
+            _local_buckets.move_to_end(key)
+            # Los baldes descartados pierden sus fichas (solo vuelve más estricto el límite)
+            while len(_local_buckets) > LOCAL_BUCKETS_MAX:
+                _local_buckets.popitem(last=False)
+        if not granted:
+            return False, info
+        return True, self._local_info(bucket, now)
+    
+    def _lease(
+        self, identifier: str, tokens: int, refund: int = 0, leased_at: float = 0.0
+    ) -> Tuple[int, Dict]:
+        """
+        Pide hasta `tokens` fichas; devuelve las concedidas y la información del límite
+
+        `refund` son fichas sin usar de un préstamo hecho en `leased_at` que
+        se devuelven en el mismo viaje.
+        """
+        conn = _redis()
+        if conn is not None:
+            try:
+                return self._lease_redis(conn, identifier, tokens, refund)
+            except Exception:
+                # Sin Redis disponible se sigue con el cache configurado
+                pass
+        return self._lease_cache(identifier, tokens, refund, leased_at)
+    
+    def _lease_redis(self, conn, identifier: str, tokens: int, refund: int = 0) -> Tuple[int, Dict]:
+        granted, remaining, reset_after, retry_after = self._gcra(conn, identifier, tokens, refund)
+        return granted, self._info(bool(granted), remaining, reset_after, retry_after)
+    
+    def _gcra(self, conn, identifier: str, tokens: int, refund: int = 0):
+        global _gcra_script
+        if _gcra_script is None:
+            _gcra_script = conn.register_script(GCRA_SCRIPT)
+        return _gcra_script(
+            keys=[f"{self.key_prefix}:{identifier}"],
+            args=[self.max_requests, self.window_seconds, tokens, refund],
+            client=conn,
+        )
+    
+    def _peek(self, identifier: str) -> Dict:
+        """Estado actual del límite sin contar una petición"""
+        conn = _redis()
+        if conn is not None:
+            try:
+                _, remaining, reset_after, retry_after = self._gcra(conn, identifier, 0)
+                return self._info(remaining > 0, remaining, reset_after, retry_after)
+            except Exception:
+                pass
+        current_count = cache.get(self._get_cache_key(identifier), 0)
+        current_time = time.time()
+        window_start = (current_time // self.window_seconds) * self.window_seconds
+        time_remaining = int(window_start + self.window_seconds - current_time)
+        remaining = max(0, self.max_requests - current_count)
+        return self._info(remaining > 0, remaining, time_remaining, time_remaining)
+    
+    def _lease_cache(
+        self, identifier: str, tokens: int, refund: int = 0, leased_at: float = 0.0
+    ) -> Tuple[int, Dict]:
+        cache_key = self._get_cache_key(identifier)
+        if refund and int(leased_at // self.window_seconds) == int(time.time() // self.window_seconds):
+            # Solo se devuelven fichas de la ventana en curso
+            try:
+                cache.decr(cache_key, refund)
+            except ValueError:
+                pass
+        cache.add(cache_key, 0, self.window_seconds)
+        try:
+            current_count = cache.incr(cache_key, tokens)
+        except ValueError:
+            # La clave expiró entre add e incr
+            cache.add(cache_key, 0, self.window_seconds)
+            current_count = cache.incr(cache_key, tokens)
         
-        return True, {
-            'limit_exceeded': False,
-            'current_count': current_count + 1,
+        current_time = time.time()
+        window_start = (current_time // self.window_seconds) * self.window_seconds
+        time_remaining = int(window_start + self.window_seconds - current_time)
+        granted = max(0, min(tokens, self.max_requests - (current_count - tokens)))
+        return granted, self._info(
+            bool(granted),
+            max(0, self.max_requests - current_count),
+            time_remaining,
+            0 if granted else time_remaining,
+        )
+    
+    def _info(self, allowed: bool, remaining: int, reset_after: int, retry_after: int) -> Dict:
+        info = {
+            'limit_exceeded': not allowed,
+            'current_count': self.max_requests - remaining,
             'max_requests': self.max_requests,
             'window_seconds': self.window_seconds,
-            'remaining_requests': (
-                self.max_requests - (current_count + 1)
-            )
+            'remaining_requests': remaining,
+            'reset_time': int(time.time()) + reset_after,
+            'time_remaining': reset_after,
+        }
+        if not allowed:
+            info['retry_after'] = retry_after
+        return info
+    
+    def _local_info(self, bucket: _LocalBucket, now: float, allowed: bool = True) -> Dict:
+        """Información aproximada a partir del último préstamo"""
+        remaining = bucket.remaining + bucket.tokens
+        info = {
+            'limit_exceeded': not allowed,
+            'current_count': self.max_requests - remaining,
+            'max_requests': self.max_requests,
+            'window_seconds': self.window_seconds,
+            'remaining_requests': remaining,
+            'reset_time': bucket.reset_time,
+            'time_remaining': max(0, int(bucket.reset_time - now)),
         }
+        if not allowed:
+            info['retry_after'] = max(0, int(bucket.retry_at - now))
+        return info
     
     def get_headers(self, identifier: str) -> Dict[str, str]:
-        """Genera headers de rate limiting para la respuesta"""
-        cache_key = self._get_cache_key(identifier)
-        current_count = cache.get(cache_key, 0)
-        
-        current_time = time.time()
-        window_start = (
-            current_time // self.window_seconds
-        ) * self.window_seconds
-        reset_time = window_start + self.window_seconds
-        
+        """Genera headers de rate limiting para la respuesta (consulta el estado actual)"""
+        return self.headers_for(self._peek(identifier))
+    
+    def headers_for(self, info: Dict) -> Dict[str, str]:
+        """Genera headers de rate limiting a partir del resultado de is_allowed, sin consultar"""
         headers = {
             'X-RateLimit-Limit': str(self.max_requests),
-            'X-RateLimit-Remaining': str(
-                max(0, self.max_requests - current_count)
-            ),
-            'X-RateLimit-Reset': str(reset_time)
+            'X-RateLimit-Remaining': str(info['remaining_requests']),
+            'X-RateLimit-Reset': str(info['reset_time'])
         }
+        if info['limit_exceeded']:
+            headers['Retry-After'] = str(max(1, info['retry_after']))
         
         return headers
 
 
+def _redis():
+    """Conexión de django-redis, o None si el cache no es Redis"""
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection('default')
+    except Exception:
+        return None
+
+
 class RateLimitMiddleware:
     """
     Middleware para aplicar rate limiting automáticamente
+
+    La regla de cada petición sale de RATE_LIMITING compilado una sola vez
+    (ver core.rate_limit_rules).
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
-        self.rate_limiters = {
-            'default': RateLimiter(max_requests=100, window_seconds=3600),
-            'auth': RateLimiter(max_requests=5, window_seconds=300),
-            'reports': RateLimiter(max_requests=20, window_seconds=3600),
-            'api': RateLimiter(max_requests=1000, window_seconds=3600),
-        }
     
     def __call__(self, request):
+        rules = get_rules()
         # Global disable or whitelists
-        rl_settings = getattr(settings, 'RATE_LIMITING', {})
-        if not rl_settings.get('ENABLED', True) or self._is_whitelisted(request, rl_settings):
+        if not rules.enabled or rules.is_whitelisted(request):
             return self.get_response(request)
-        # Aplicar rate limiting basado en el tipo de endpoint
-        limiter_key = self._get_limiter_key(request)
-        identifier = self._get_identifier(request)
+        rule = rules.match(request.path, request.method)
+        if rule is None:
+            return self.get_response(request)
+
+        limiter = rule.limiter
+        is_allowed, info = limiter.is_allowed(rules.identify(rule, request))
         
-        if limiter_key and identifier:
-            limiter = self.rate_limiters[limiter_key]
-            is_allowed, info = limiter.is_allowed(identifier)
+        if not is_allowed:
+            response = JsonResponse(
+                {
+                    'error': 'Rate limit exceeded',
+                    'message': 'Has excedido el límite de peticiones',
+                    'details': info
+                },
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
             
-            if not is_allowed:
-                response = JsonResponse(
-                    {
-                        'error': 'Rate limit exceeded',
-                        'message': 'Has excedido el límite de peticiones',
-                        'details': info
-                    },
-                    status=status.HTTP_429_TOO_MANY_REQUESTS
-                )
-                
-                # Agregar headers de rate limiting
-                for key, value in limiter.get_headers(identifier).items():
-                    response[key] = value
-                
-                return response
+            # Agregar headers de rate limiting
+            for key, value in limiter.headers_for(info).items():
+                response[key] = value
+            
+            return response
         
         response = self.get_response(request)
         
         # Agregar headers de rate limiting a todas las respuestas
-        if limiter_key and identifier:
-            limiter = self.rate_limiters[limiter_key]
-            for key, value in limiter.get_headers(identifier).items():
-                response[key] = value
+        for key, value in limiter.headers_for(info).items():
+            response[key] = value
         
         return response
 
-    def _is_whitelisted(self, request: HttpRequest, rl_settings: dict) -> bool:
-        # IP whitelist
-        xff = request.META.get('HTTP_X_FORWARDED_FOR')
-        ip = xff.split(',')[0] if xff else request.META.get('REMOTE_ADDR')
-        if ip and ip in set(rl_settings.get('WHITELIST_IPS', [])):
-            return True
-        # Host whitelist
-        host = request.get_host().split(':')[0]
-        if host and host in set(rl_settings.get('WHITELIST_HOSTS', [])):
-            return True
-        return False
-    
-    def _get_limiter_key(self, request: HttpRequest) -> Optional[str]:
-        """Determina qué rate limiter usar basado en la petición"""
-        path = request.path
-        
-        if '/auth/' in path or '/login/' in path:
-            return 'auth'
-        elif '/reports/' in path or '/export/' in path:
-            return 'reports'
-        elif '/api/' in path:
-            return 'api'
-        else:
-            return 'default'
-    
-    def _get_identifier(self, request: HttpRequest) -> Optional[str]:
-        """Obtiene el identificador único para rate limiting"""
-        # Prioridad: IP, User ID, o User Agent
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            return f"user_{request.user.id}"
-        else:
-            # Usar IP del cliente
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(',')[0]
-            else:
-                ip = request.META.get('REMOTE_ADDR')
-            return f"ip_{ip}"
-
 
 def rate_limit(
     max_requests: int = 100,
@@ -220,7 +408,7 @@ def rate_limit(
             is_allowed, info = limiter.is_allowed(identifier)
             
             if not is_allowed:
-                return JsonResponse(
+                response = JsonResponse(
                     {
                         'error': 'Rate limit exceeded',
                         'message': 'Has excedido el límite de peticiones',
@@ -228,12 +416,15 @@ def rate_limit(
                     },
                     status=status.HTTP_429_TOO_MANY_REQUESTS
                 )
+                for key, value in limiter.headers_for(info).items():
+                    response[key] = value
+                return response
             
             # Ejecutar vista
             response = view_func(request, *args, **kwargs)
             
             # Agregar headers de rate limiting
-            for key, value in limiter.get_headers(identifier).items():
+            for key, value in limiter.headers_for(info).items():
                 response[key] = value
             
             return response
@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -6,6 +8,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "unsafe-secret")
 DEBUG = os.getenv("DEBUG", "0") == "1"
+# Corrida de tests (manage.py test o pytest)
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in os.path.basename(sys.argv[0])
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "*").split(",")
 
 INSTALLED_APPS = [
@@ -143,7 +147,71 @@ CACHES = {
 REPORTS_CACHE_TIMEOUT = 600  # 10 minutos para reportes
 DAILY_REPORTS_CACHE_TIMEOUT = 3600  # 1 hora para reportes diarios
 
-# Logging Configuration
+# Snapshot del catálogo en memoria: cada cuántos segundos se revisa la versión en Redis
+CATALOG_SNAPSHOT_CHECK_SECONDS = 1
+
+# Emisión de tickets por lotes (POST /api/sales/tickets/batch/)
+SALES_BATCH_MAX_TICKETS = 100
+
+# Exportaciones asíncronas (POST /api/sales/tickets/reports/export/)
+# Cola: 'local' (pool de procesos dentro del servidor, solo desarrollo),
+# 'redis' (consumida por `manage.py run_export_worker`) o 'sync' (tests)
+EXPORT_JOBS_BACKEND = os.getenv('EXPORT_JOBS_BACKEND') or ('sync' if TESTING else 'local' if DEBUG else 'redis')
+EXPORT_JOBS_WORKERS = int(os.getenv('EXPORT_JOBS_WORKERS', '2'))
+EXPORT_JOBS_QUEUE_KEY = 'export_jobs:queue'
+# Un trabajo en curso actualiza heartbeat_at cada EXPORT_JOBS_HEARTBEAT_SECONDS;
+# sin latido durante EXPORT_JOBS_STALE_SECONDS se marca como fallido (worker caído)
+EXPORT_JOBS_HEARTBEAT_SECONDS = 30
+EXPORT_JOBS_STALE_SECONDS = 300
+
+# Cache en disco de PDFs de tickets (por defecto MEDIA_ROOT/ticket_pdfs)
+TICKET_PDF_CACHE_DIR = os.getenv('TICKET_PDF_CACHE_DIR') or None
+TICKET_PDF_CACHE_MAX_BYTES = int(os.getenv('TICKET_PDF_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# Renderizar el PDF en segundo plano al crear el ticket
+TICKET_PDF_PREWARM = True
+# Renderizador por defecto: 'html' (xhtml2pdf), 'thermal' (PDF de recibo) o 'escpos'
+TICKET_PDF_RENDERER = os.getenv('TICKET_PDF_RENDERER', 'html')
+# Ancho del papel de la impresora térmica: 58 u 80 mm
+TICKET_THERMAL_WIDTH_MM = int(os.getenv('TICKET_THERMAL_WIDTH_MM', '80'))
+
+# Reimpresión por lotes (GET /api/sales/tickets/pdf-batch/)
+SALES_PDF_BATCH_MAX_TICKETS = 2000
+# Procesos para renderizar (None = uno por núcleo)
+SALES_PDF_BATCH_PROCESSES = None
+
+# Tablero de exposición en Redis (GET /api/sales/exposure/): cada cuántos segundos
+# se descarta y se recalcula desde el acumulado de la base
+EXPOSURE_BOARD_TTL = 300
+# Exposición en vivo (ws/exposure/<zona>/<sorteo>/): intervalo de envío de los
+# cambios acumulados y umbrales (% del tope) que generan avisos
+EXPOSURE_STREAM_INTERVAL = 0.25
+EXPOSURE_WARNING_THRESHOLDS = (80, 100)
+
+# Archivo frío de tickets (manage.py archive_tickets), por defecto MEDIA_ROOT/ticket_archive
+TICKET_ARCHIVE_DIR = os.getenv('TICKET_ARCHIVE_DIR') or None
+# Se archivan los días cerrados con más de N días de antigüedad
+TICKET_ARCHIVE_AFTER_DAYS = int(os.getenv('TICKET_ARCHIVE_AFTER_DAYS', '90'))
+TICKET_ARCHIVE_COMPRESSION = 'zstd'
+
+# Auditoría de peticiones (core.audit.AuditMiddleware): las entradas se encolan en
+# memoria y un hilo las guarda con bulk_create por lotes o cada N milisegundos.
+# En tests se guardan en la petición: el hilo usa otra conexión y no ve los
+# datos sin confirmar de cada test
+AUDIT_LOG_ASYNC = os.getenv('AUDIT_LOG_ASYNC', '0' if TESTING else '1') == '1'
+AUDIT_LOG_QUEUE_SIZE = 10000
+AUDIT_LOG_BATCH_SIZE = 500
+AUDIT_LOG_FLUSH_INTERVAL_MS = 200
+# Eventos que no entraron en la cola o no se pudieron guardar; se reintentan solos
+AUDIT_LOG_SPILL_FILE = Path(
+    os.getenv('AUDIT_LOG_SPILL_FILE')
+    or (Path(tempfile.gettempdir()) / f'audit_spill_{os.getpid()}' if TESTING else BASE_DIR / 'logs')
+    / 'audit_spill.jsonl'
+)
+# Meses de auditoría que se conservan en la tabla particionada (manage.py manage_audit_partitions)
+AUDIT_LOG_RETENTION_MONTHS = int(os.getenv('AUDIT_LOG_RETENTION_MONTHS', '12'))
+
+# Logging Configuration (archivos en logs/, fuera del control de versiones)
+(BASE_DIR / 'logs').mkdir(exist_ok=True)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -213,8 +281,24 @@ LOGGING = {
 # Rate Limiting Configuration
 RATE_LIMITING = {
     'ENABLED': False,  # Activar rate limiting
-    'WHITELIST_IPS': ["127.0.0.1", "10.0.0.5"],  # e.g. ["127.0.0.1", "10.0.0.5"]
+    'WHITELIST_IPS': ["127.0.0.1", "10.0.0.5"],  # IPs o rangos CIDR, e.g. ["127.0.0.1", "10.0.0.0/8"]
     'WHITELIST_HOSTS': [],  # e.g. ["mi-dominio.com"]
+    # Fracción del límite que cada proceso toma prestada de Redis por vez (0 = consultar siempre)
+    'LOCAL_LEASE_FRACTION': 0.1,
+    # Límites por endpoint. 'paths' son prefijos por segmento ('*' = un segmento
+    # cualquiera); gana la ruta más específica. 'methods' es opcional e
+    # 'identifier' es 'user_or_ip' (por defecto), 'ip' o 'global'.
+    'RULES': [
+        {
+            'name': 'tickets_batch',
+            'paths': ['/api/sales/tickets/batch/'],
+            'methods': ['POST'],
+            'max_requests': 30,
+            'window_seconds': 60,
+        },
+    ],
+    # Bloques generales; 'paths' opcional (por defecto AUTH=/api/auth/ y
+    # /admin/login/, REPORTS=/api/sales/tickets/reports/, API=/api/, DEFAULT=/)
     'DEFAULT': {
         'max_requests': 100,
         'window_seconds': 3600,
@@ -0,0 +1,262 @@
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from . import rate_limiting
+from .audit import AuditLog, AuditLogWriter, _exclusive
+from .partitioning import AuditPartitionService, month_start, next_month, previous_month
+from .rate_limit_rules import RateLimitRules
+from .rate_limiting import RateLimiter
+
+
+class AuditLogWriterTests(TestCase):
+    """Auditoría encolada y guardada por lotes fuera de la petición"""
+
+    def setUp(self):
+        spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spill_dir, ignore_errors=True)
+        self.spill_file = os.path.join(spill_dir, 'audit_spill.jsonl')
+        self.writer = AuditLogWriter()
+        # Escritura en la petición y desborde en un directorio temporal
+        settings_override = override_settings(AUDIT_LOG_ASYNC=False, AUDIT_LOG_SPILL_FILE=self.spill_file)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patcher in (
+            mock.patch('core.audit.audit_writer', self.writer),
+            mock.patch.object(AuditLogWriter, '_ensure_thread'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(username='audited', password='pass', role='SELLER')
+
+    def test_request_is_audited_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            client.post('/api/sales/tickets/', {'items': []}, format='json')
+        self.assertFalse(AuditLog.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        entry = AuditLog.objects.get()
+        self.assertEqual(entry.user, self.user)
+        self.assertEqual(entry.action, 'POST')
+        self.assertEqual(entry.metadata['path'], '/api/sales/tickets/')
+
+    def test_queued_entries_are_written_in_one_batch(self):
+        with override_settings(AUDIT_LOG_ASYNC=True):
+            for index in range(3):
+                self.writer.enqueue(AuditLog(user=self.user, action='SYSTEM', description=f'evento {index}'))
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(self.writer.stats['flushes'], 1)
+
+    def test_full_queue_spills_to_disk_and_is_replayed(self):
+        with override_settings(AUDIT_LOG_ASYNC=True, AUDIT_LOG_QUEUE_SIZE=1):
+            for index in range(3):
+                self.writer.enqueue(AuditLog(user=self.user, action='SYSTEM', description=f'evento {index}'))
+        self.assertEqual(self.writer.stats['queued'], 1)
+        self.assertEqual(self.writer.stats['spilled'], 2)
+        with open(self.spill_file) as spill:
+            self.assertEqual(len(spill.readlines()), 2)
+
+        self.writer.flush()
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('description', flat=True)),
+            ['evento 0', 'evento 1', 'evento 2'],
+        )
+        self.assertFalse(os.path.exists(self.spill_file))
+        self.assertFalse(os.path.exists(self.spill_file + '.replay'))
+        self.assertEqual(self.writer.stats['written'], 3)
+
+    def test_bad_rows_are_quarantined_without_blocking_replay(self):
+        good = {'timestamp': '2026-01-05 10:00:00+00:00', 'user_id': self.user.id, 'action': 'SYSTEM',
+                'resource_type': '', 'resource_id': '', 'description': 'bueno', 'ip_address': None,
+                'user_agent': '', 'metadata': {}}
+        with open(self.spill_file, 'w') as spill:
+            spill.write(json.dumps(good) + '\n')
+            spill.write(json.dumps({**good, 'description': None}) + '\n')
+            spill.write('{no es json\n')
+
+        self.writer.flush()
+        self.assertEqual(list(AuditLog.objects.values_list('description', flat=True)), ['bueno'])
+        self.assertFalse(os.path.exists(self.spill_file + '.replay'))
+        with open(self.spill_file + '.quarantine') as quarantine:
+            self.assertEqual(len(quarantine.readlines()), 2)
+        self.assertEqual(self.writer.stats['quarantined'], 2)
+
+    def test_replay_has_a_single_owner(self):
+        self.writer._spill([AuditLog(user=self.user, action='SYSTEM', description='desbordado')])
+        with _exclusive(Path(self.spill_file + '.lock')) as owner:
+            self.assertTrue(owner)
+            # Otro proceso tiene el lock: no se reintenta ni se duplica
+            self.writer.flush()
+            self.assertFalse(AuditLog.objects.exists())
+        self.writer.flush()
+        self.writer.flush()
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+
+class AuditPartitioningTests(TestCase):
+    """Particiones mensuales y retención de la auditoría"""
+
+    def test_month_helpers(self):
+        self.assertEqual(month_start(date(2024, 2, 29)), date(2024, 2, 1))
+        self.assertEqual(next_month(date(2024, 12, 31)), date(2025, 1, 1))
+        self.assertEqual(previous_month(date(2024, 3, 31)), date(2024, 2, 1))
+        self.assertEqual(previous_month(date(2024, 1, 15)), date(2023, 12, 1))
+
+    def test_command_requires_partitioned_table(self):
+        if AuditPartitionService.is_supported():
+            self.skipTest('Solo aplica a bases sin particiones')
+        with self.assertRaises(CommandError):
+            call_command('manage_audit_partitions')
+
+
+class RateLimiterAtomicityTests(TestCase):
+    """El rate limiter decide y cuenta en una sola operación atómica"""
+
+    def test_limit_is_exact_under_concurrency(self):
+        """Con 40 peticiones simultáneas pasan exactamente max_requests"""
+        limiter = RateLimiter(key_prefix='atomic_test', max_requests=10, window_seconds=60)
+
+        def check(_):
+            return limiter.is_allowed('user_1')
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(check, range(40)))
+
+        allowed = [info for ok, info in results if ok]
+        denied = [info for ok, info in results if not ok]
+        self.assertEqual(len(allowed), 10)
+        self.assertEqual(sorted(info['remaining_requests'] for info in allowed), list(range(10)))
+        headers = limiter.headers_for(denied[0])
+        self.assertEqual(headers['X-RateLimit-Remaining'], '0')
+        self.assertIn('Retry-After', headers)
+
+    @override_settings(RATE_LIMITING={'LOCAL_LEASE_FRACTION': 0})
+    def test_get_headers_reads_current_state_without_counting(self):
+        """get_headers(identifier) conserva su firma y no consume fichas"""
+        limiter = RateLimiter(key_prefix='headers_test', max_requests=5, window_seconds=60)
+        limiter.is_allowed('user_1')
+        limiter.is_allowed('user_1')
+        headers = limiter.get_headers('user_1')
+        self.assertEqual(headers['X-RateLimit-Limit'], '5')
+        self.assertEqual(headers['X-RateLimit-Remaining'], '3')
+        self.assertEqual(limiter.get_headers('user_1')['X-RateLimit-Remaining'], '3')
+        self.assertNotIn('Retry-After', headers)
+
+    def test_local_bucket_leases_tokens_and_keeps_global_limit(self):
+        """Cada proceso decide localmente con fichas prestadas sin superar el límite global"""
+        limiter = RateLimiter(key_prefix='lease_test', max_requests=100, window_seconds=60)
+        shared_key = limiter._get_cache_key('user_1')
+
+        with mock.patch.object(limiter, '_lease', wraps=limiter._lease) as lease:
+            first_worker = [limiter.is_allowed('user_1')[0] for _ in range(25)]
+        self.assertTrue(all(first_worker))
+        # Préstamos de 1, 2, 4, 8 y 10 fichas en lugar de 25 consultas
+        self.assertEqual([c.args[1] for c in lease.call_args_list], [1, 2, 4, 8, 10])
+        self.assertEqual(cache.get(shared_key), 25)
+
+        # Otro proceso: sin baldes locales, comparte el presupuesto global
+        rate_limiting._local_buckets.clear()
+        second_worker = [limiter.is_allowed('user_1')[0] for _ in range(100)]
+        self.assertEqual(sum(second_worker), 75)
+        self.assertLessEqual(sum(first_worker) + sum(second_worker), 100)
+
+        # Los rechazos siguientes se deciden sin consultar el cache
+        counted = cache.get(shared_key)
+        allowed, info = limiter.is_allowed('user_1')
+        self.assertFalse(allowed)
+        self.assertEqual(cache.get(shared_key), counted)
+        self.assertIn('Retry-After', limiter.headers_for(info))
+
+    def test_traffic_below_limit_spread_over_workers_is_never_rejected(self):
+        """Un cliente al 10% de su límite repartido en 10 procesos nunca recibe 429"""
+        cache.clear()
+        limiter = RateLimiter(key_prefix='spread_test', max_requests=1000, window_seconds=3600)
+        workers = [OrderedDict() for _ in range(10)]
+        clock = [3600.0 * 500000]
+        rejected = 0
+        # Dos horas a 100 peticiones por hora, en ráfagas de 5 contra el mismo proceso
+        with mock.patch('time.time', lambda: clock[0]):
+            for request in range(200):
+                with mock.patch.object(rate_limiting, '_local_buckets', workers[(request // 5) % 10]):
+                    rejected += not limiter.is_allowed('user_1')[0]
+                clock[0] += 36
+        self.assertEqual(rejected, 0)
+        # Sin préstamos perdidos: el contador global refleja las peticiones de la ventana
+        self.assertLessEqual(cache.get(limiter._get_cache_key('user_1'), 0), 100 + 10 * 2)
+
+
+class RateLimitRulesTests(TestCase):
+    """Reglas de rate limiting compiladas desde settings"""
+
+    RULES = {
+        'ENABLED': True,
+        'WHITELIST_IPS': ['10.1.0.0/16'],
+        'LOCAL_LEASE_FRACTION': 0,
+        'RULES': [
+            {
+                'name': 'tickets_batch',
+                'paths': ['/api/sales/tickets/batch/'],
+                'methods': ['post'],
+                'max_requests': 2,
+                'window_seconds': 60,
+                'identifier': 'ip',
+            },
+            {
+                'name': 'ticket_pdf',
+                'paths': ['/api/sales/tickets/*/pdf/'],
+                'max_requests': 10,
+                'window_seconds': 60,
+            },
+        ],
+    }
+
+    def test_most_specific_rule_wins(self):
+        rules = RateLimitRules(self.RULES)
+
+        def name(path, method='GET'):
+            return rules.match(path, method).name
+
+        self.assertEqual(name('/api/sales/tickets/batch/', 'POST'), 'tickets_batch')
+        self.assertEqual(name('/api/sales/tickets/batch/'), 'api')
+        self.assertEqual(name('/api/sales/tickets/15/pdf/'), 'ticket_pdf')
+        self.assertEqual(name('/api/sales/tickets/reports/export/'), 'reports')
+        self.assertEqual(name('/api/auth/token/', 'POST'), 'auth')
+        self.assertEqual(name('/api/catalog/zones/'), 'api')
+        self.assertEqual(name('/admin/'), 'default')
+        self.assertEqual(name('/'), 'default')
+
+    @override_settings(RATE_LIMITING=RULES)
+    def test_endpoint_rule_limits_only_its_endpoint(self):
+        cache.clear()
+        client = APIClient()
+        statuses = [
+            client.post('/api/sales/tickets/batch/', {}, format='json', REMOTE_ADDR='10.2.0.1').status_code
+            for _ in range(3)
+        ]
+        self.assertNotEqual(statuses[1], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(statuses[2], status.HTTP_429_TOO_MANY_REQUESTS)
+        # Otros endpoints y las IPs del rango en lista blanca no se ven afectados
+        response = client.get('/api/sales/tickets/', REMOTE_ADDR='10.2.0.1')
+        self.assertNotEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['X-RateLimit-Limit'], '1000')
+        response = client.post('/api/sales/tickets/batch/', {}, format='json', REMOTE_ADDR='10.1.3.4')
+        self.assertNotEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotIn('X-RateLimit-Limit', response)
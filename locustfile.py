@@ -94,7 +94,7 @@ class ReportUser(HttpUser):
     def export_report(self):
         """Exportar reporte"""
         format_type = random.choice(["csv", "xlsx"])
-        self.client.get(f"/api/sales/reports/export/?format={format_type}")
+        self.client.post(f"/api/sales/tickets/reports/export/?format={format_type}")
 
 
 class AdminUser(HttpUser):
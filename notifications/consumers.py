@@ -1,13 +1,19 @@
+import asyncio
 import json
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
 from rest_framework_simplejwt.tokens import AccessToken
 
 User = get_user_model()
 
+# Secuencias recibidas que ExposureConsumer recuerda para descartar repetidos
+EXPOSURE_SEEN_SEQS = 1024
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     """Consumidor WebSocket para notificaciones en tiempo real"""
@@ -220,3 +226,166 @@ class BroadcastConsumer(AsyncWebsocketConsumer):
             'level': event['level'],
             'sender': event['sender']
         }))
+
+
+class ExposureConsumer(AsyncWebsocketConsumer):
+    """
+    Tablero de exposición en vivo de una zona y sorteo (supervisores)
+
+    Al conectar envía el tablero completo y luego solo los cambios: los
+    pedazos vendidos por número se acumulan y se envían juntos cada
+    EXPOSURE_STREAM_INTERVAL segundos, con los avisos de números que
+    cruzaron el 80% o el 100% de su tope. Es la única etapa que agrupa
+    cambios. Cada cambio trae la secuencia del tablero en Redis y se
+    descarta si el snapshot enviado ya lo incluye (seq menor o igual) o si
+    ya se recibió; los que llegan desordenados se aplican igual. El
+    cliente puede enviar {"type": "snapshot"} para resincronizar.
+    """
+    
+    async def connect(self):
+        """Conectar al tablero de la zona y sorteo de la URL"""
+        
+        kwargs = self.scope['url_route']['kwargs']
+        token = kwargs.get('token')
+        self.user = await self.get_user_from_token(token) if token else self.scope['user']
+        
+        if not self.user.is_authenticated or not (
+            self.user.is_superuser or getattr(self.user, 'role', None) in {'ADMIN', 'SUPERVISOR'}
+        ):
+            await self.close()
+            return
+        
+        from sales.exposure_stream import group_name
+        
+        self.zone_id = int(kwargs['zone_id'])
+        self.draw_type_id = int(kwargs['draw_type_id'])
+        self.pending = {}
+        self.pending_warnings = []
+        self.flush_task = None
+        self.seq = None
+        self.snapshot_seq = None
+        self.seen_seqs = set()
+        
+        self.group_name = group_name(self.zone_id, self.draw_type_id)
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        
+        await self.accept()
+        await self.send_snapshot()
+    
+    async def disconnect(self, close_code):
+        """Desconectar del WebSocket"""
+        
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+    
+    async def receive(self, text_data):
+        """Recibir mensaje del cliente"""
+        
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Formato JSON inválido'
+            }))
+            return
+        
+        message_type = data.get('type')
+        if message_type == 'ping':
+            await self.send(text_data=json.dumps({
+                'type': 'pong',
+                'timestamp': data.get('timestamp')
+            }))
+        elif message_type == 'snapshot':
+            # Resincronizar, p.ej. tras perder mensajes o al cambiar el día
+            await self.send_snapshot()
+    
+    async def exposure_delta(self, event):
+        """Acumular cambios publicados por los procesos web hasta el próximo envío"""
+        
+        if event['date'] != self.sale_date:
+            # Cambio de día: el tablero anterior ya no aplica
+            await self.send_snapshot()
+            return
+        seq = event.get('seq')
+        if seq is not None and self.snapshot_seq is not None:
+            if seq <= self.snapshot_seq or seq in self.seen_seqs:
+                # Ya incluido en el snapshot o recibido antes
+                return
+            self.seen_seqs.add(seq)
+            if len(self.seen_seqs) > EXPOSURE_SEEN_SEQS:
+                # Lo más viejo pasa a contar como incluido en el snapshot
+                self.snapshot_seq = min(self.seen_seqs)
+                self.seen_seqs.discard(self.snapshot_seq)
+            self.seq = max(self.seq, seq)
+        for number, pieces in event['deltas'].items():
+            self.pending[number] = self.pending.get(number, 0) + pieces
+        self.pending_warnings.extend(event.get('warnings', []))
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+    
+    async def flush_later(self):
+        """Enviar en un solo mensaje lo acumulado durante el intervalo"""
+        
+        await asyncio.sleep(getattr(settings, 'EXPOSURE_STREAM_INTERVAL', 0.25))
+        pending, warnings = self.pending, self.pending_warnings
+        self.pending, self.pending_warnings, self.flush_task = {}, [], None
+        deltas = {number: pieces for number, pieces in pending.items() if pieces}
+        if deltas or warnings:
+            await self.send(text_data=json.dumps({
+                'type': 'exposure.delta',
+                'zone': self.zone_id,
+                'draw_type': self.draw_type_id,
+                'date': self.sale_date,
+                'seq': self.seq,
+                'deltas': deltas,
+                'warnings': warnings,
+            }))
+    
+    async def send_snapshot(self):
+        """Enviar el tablero completo (100 números) con los topes"""
+        
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.pending, self.pending_warnings = {}, []
+        self.sale_date = str(timezone.localdate())
+        sold, self.seq, limits = await self.get_board()
+        self.snapshot_seq, self.seen_seqs = self.seq, set()
+        await self.send(text_data=json.dumps({
+            'type': 'exposure.snapshot',
+            'zone': self.zone_id,
+            'draw_type': self.draw_type_id,
+            'date': self.sale_date,
+            'seq': self.seq,
+            'sold': sold,
+            'limits': limits,
+        }))
+    
+    @database_sync_to_async
+    def get_board(self):
+        """Tablero y su secuencia desde Redis (o el acumulado de la base) y topes del catálogo"""
+        
+        from catalog.cache_service import CatalogCacheService
+        from sales.exposure_board import ExposureBoardService
+        
+        sold, seq = ExposureBoardService.snapshot(self.zone_id, self.draw_type_id, timezone.localdate())
+        return sold, seq, CatalogCacheService.get_snapshot().get_limits(self.zone_id, self.draw_type_id)
+    
+    @database_sync_to_async
+    def get_user_from_token(self, token):
+        """Obtener usuario desde token JWT"""
+        
+        try:
+            access_token = AccessToken(token)
+            return User.objects.get(id=access_token['user_id'])
+        except Exception:
+            return AnonymousUser()
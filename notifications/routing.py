@@ -15,6 +15,16 @@ websocket_urlpatterns = [
         consumers.NotificationConsumer.as_asgi()
     ),
     
+    # Tablero de exposición en vivo por zona y sorteo (supervisores)
+    re_path(
+        r'ws/exposure/(?P<zone_id>\d+)/(?P<draw_type_id>\d+)/(?P<token>[^/]+)/$',
+        consumers.ExposureConsumer.as_asgi()
+    ),
+    re_path(
+        r'ws/exposure/(?P<zone_id>\d+)/(?P<draw_type_id>\d+)/$',
+        consumers.ExposureConsumer.as_asgi()
+    ),
+    
     # Broadcast para administradores
     re_path(
         r'ws/broadcast/$',
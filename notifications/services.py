@@ -237,6 +237,13 @@ class NotificationService:
                 'notification_type': 'report_generated',
                 'priority': 'low'
             },
+            {
+                'name': 'report_export',
+                'title_template': 'Exportación {{ data.status }}',
+                'message_template': 'Exportación {{ data.level }} ({{ data.format }}): {{ data.status }}, {{ data.rows_written }} filas',
+                'notification_type': 'report_generated',
+                'priority': 'low'
+            },
             {
                 'name': 'system_alert',
                 'title_template': 'Alerta del Sistema',
@@ -0,0 +1,223 @@
+import os
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, QuerySet, Sum
+
+from .models import ArchivedSalesDay, DailySalesRollup, Ticket, TicketItem
+
+TICKET_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('created_at', pa.timestamp('us', tz='UTC')),
+    ('zone_id', pa.int64()),
+    ('draw_type_id', pa.int64()),
+    ('user_id', pa.int64()),
+    ('total_pieces', pa.int64()),
+])
+ITEM_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('ticket_id', pa.int64()),
+    ('number', pa.string()),
+    ('pieces', pa.int64()),
+])
+TOTALS_SCHEMA = pa.schema([
+    ('zone_id', pa.int64()),
+    ('draw_type_id', pa.int64()),
+    ('user_id', pa.int64()),
+    ('total_tickets', pa.int64()),
+    ('total_pieces', pa.int64()),
+])
+# Directorios sale_date=YYYY-MM-DD (particionado estilo Hive)
+PARTITIONING = ds.partitioning(pa.schema([('sale_date', pa.date32())]), flavor='hive')
+
+# Filas por row group y por viaje a la base de datos
+BATCH_SIZE = 10000
+# Tickets por DELETE
+DELETE_CHUNK_SIZE = 2000
+
+
+class TicketArchiveService:
+    """
+    Archivo frío de días cerrados en archivos Parquet comprimidos
+
+    Cada día archivado deja en <dir>/{tickets,items,totals}/sale_date=<fecha>/
+    un archivo por corrida, y sus filas se eliminan de Ticket, TicketItem y
+    DailySalesRollup. Los totales archivados tienen la misma forma que el
+    rollup, de modo que ReportCacheService los suma a los datos vivos.
+    """
+
+    @staticmethod
+    def root() -> Path:
+        return Path(getattr(settings, 'TICKET_ARCHIVE_DIR', None) or Path(settings.MEDIA_ROOT) / 'ticket_archive')
+
+    @staticmethod
+    def pending_days(before: date) -> List[date]:
+        """Días con tickets en las tablas calientes anteriores a `before`"""
+        return list(
+            Ticket.objects.filter(sale_date__lt=before)
+            .values_list('sale_date', flat=True)
+            .distinct()
+            .order_by('sale_date')
+        )
+
+    @staticmethod
+    def archive_day(sale_date: date) -> Optional[ArchivedSalesDay]:
+        """
+        Escribe los tickets, items y totales de un día y los borra de la base
+
+        Devuelve None si el día no tiene tickets en las tablas calientes.
+
+        Solo se borran los tickets e items cuyos ids se releen de los
+        archivos, después de verificar la cantidad de filas; si el borrado no
+        coincide con lo archivado se revierte. Los archivos se escriben con
+        nombre temporal (ignorado al leer) y se publican al final de la
+        transacción del borrado, así una corrida interrumpida no deja totales
+        contados dos veces.
+        """
+        max_id = Ticket.objects.filter(sale_date=sale_date).order_by('-id').values_list('id', flat=True).first()
+        if max_id is None:
+            return None
+
+        tickets = Ticket.objects.filter(sale_date=sale_date, id__lte=max_id)
+        items = TicketItem.objects.filter(sale_date=sale_date, ticket_id__lte=max_id)
+        run = uuid.uuid4().hex
+        written: List[Path] = []
+        try:
+            for kind, schema, rows in (
+                ('tickets', TICKET_SCHEMA, tickets.order_by('id').values_list(*TICKET_SCHEMA.names)),
+                ('items', ITEM_SCHEMA, items.order_by('id').values_list(*ITEM_SCHEMA.names)),
+                (
+                    'totals', TOTALS_SCHEMA,
+                    tickets.values_list('zone_id', 'draw_type_id', 'user_id')
+                    .annotate(total_tickets=Count('id'), total_pieces=Sum('total_pieces'))
+                    .order_by('zone_id', 'draw_type_id', 'user_id'),
+                ),
+            ):
+                written.append(TicketArchiveService._write(kind, sale_date, run, schema, rows))
+            ticket_path, item_path, totals_path = written
+
+            ticket_ids = pq.read_table(ticket_path, columns=['id']).column(0).to_pylist()
+            item_ids = pq.read_table(item_path, columns=['id']).column(0).to_pylist()
+            ticket_count, item_count = len(ticket_ids), len(item_ids)
+            total_pieces = sum(pq.read_table(totals_path, columns=['total_pieces']).column(0).to_pylist())
+            if ticket_count != tickets.count() or item_count != items.count():
+                raise RuntimeError(f'El archivo de {sale_date} no coincide con la base de datos')
+
+            with transaction.atomic():
+                # Solo las filas que quedaron en los archivos, sin volver a consultar el día
+                deleted_items = deleted_tickets = cascaded = 0
+                for start in range(0, len(item_ids), DELETE_CHUNK_SIZE):
+                    deleted_items += TicketItem.objects.filter(
+                        sale_date=sale_date, id__in=item_ids[start:start + DELETE_CHUNK_SIZE]
+                    ).delete()[0]
+                for start in range(0, len(ticket_ids), DELETE_CHUNK_SIZE):
+                    _, deleted = Ticket.objects.filter(
+                        sale_date=sale_date, id__in=ticket_ids[start:start + DELETE_CHUNK_SIZE]
+                    ).delete()
+                    deleted_tickets += deleted.get(Ticket._meta.label, 0)
+                    # Items no archivados de esos tickets: se perderían en cascada
+                    cascaded += deleted.get(TicketItem._meta.label, 0)
+                if (deleted_tickets, deleted_items, cascaded) != (ticket_count, item_count, 0):
+                    raise RuntimeError(f'El borrado de {sale_date} no coincide con el archivo')
+                DailySalesRollup.objects.filter(sale_date=sale_date).delete()
+                archived, created = ArchivedSalesDay.objects.get_or_create(
+                    sale_date=sale_date,
+                    defaults={'tickets': ticket_count, 'items': item_count, 'total_pieces': total_pieces},
+                )
+                if not created:
+                    ArchivedSalesDay.objects.filter(pk=archived.pk).update(
+                        tickets=F('tickets') + ticket_count,
+                        items=F('items') + item_count,
+                        total_pieces=F('total_pieces') + total_pieces,
+                    )
+                    archived.refresh_from_db()
+                for index, path in enumerate(written):
+                    written[index] = path.with_name(path.name.lstrip('.'))
+                    os.replace(path, written[index])
+        except BaseException:
+            for path in written:
+                path.unlink(missing_ok=True)
+            raise
+        return archived
+
+    @staticmethod
+    def archived_days(start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[date]:
+        qs = ArchivedSalesDay.objects.all()
+        if start_date:
+            qs = qs.filter(sale_date__gte=start_date)
+        if end_date:
+            qs = qs.filter(sale_date__lte=end_date)
+        return list(qs.order_by('sale_date').values_list('sale_date', flat=True))
+
+    @staticmethod
+    def load_totals(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        zone_ids: Optional[Sequence[int]] = None,
+        draw_type_ids: Optional[Sequence[int]] = None,
+        user_ids: Optional[Sequence[int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Totales archivados con la forma de DailySalesRollup
+
+        Solo se leen los directorios de las fechas pedidas y las columnas
+        necesarias; los filtros por zona, sorteo y vendedor se aplican al leer.
+        """
+        path = TicketArchiveService.root() / 'totals'
+        if not path.is_dir():
+            return []
+        condition = None
+        for expression in (
+            ds.field('sale_date') >= start_date if start_date else None,
+            ds.field('sale_date') <= end_date if end_date else None,
+            ds.field('zone_id').isin(list(zone_ids)) if zone_ids else None,
+            ds.field('draw_type_id').isin(list(draw_type_ids)) if draw_type_ids else None,
+            ds.field('user_id').isin(list(user_ids)) if user_ids else None,
+        ):
+            if expression is not None:
+                condition = expression if condition is None else condition & expression
+        dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+        return dataset.to_table(filter=condition).to_pylist()
+
+    @staticmethod
+    def _write(kind: str, sale_date: date, run: str, schema: pa.Schema, rows: QuerySet) -> Path:
+        """Escribe un archivo temporal (.part-*.parquet) y devuelve su ruta"""
+        directory = TicketArchiveService.root() / kind / f'sale_date={sale_date.isoformat()}'
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'.part-{run}.parquet'
+        compression = getattr(settings, 'TICKET_ARCHIVE_COMPRESSION', 'zstd')
+        try:
+            with pq.ParquetWriter(path, schema, compression=compression) as writer:
+                for batch in _batches(rows, schema):
+                    writer.write_batch(batch, row_group_size=BATCH_SIZE)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        return path
+
+
+def _batches(rows: QuerySet, schema: pa.Schema) -> Iterator[pa.RecordBatch]:
+    """Agrupa filas de values_list en RecordBatch sin cargar el día completo"""
+    chunk = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        chunk.append(row)
+        if len(chunk) >= BATCH_SIZE:
+            yield _to_batch(chunk, schema)
+            chunk = []
+    if chunk:
+        yield _to_batch(chunk, schema)
+
+
+def _to_batch(chunk: List[Sequence[Any]], schema: pa.Schema) -> pa.RecordBatch:
+    columns = list(zip(*chunk))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
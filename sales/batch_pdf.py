@@ -0,0 +1,121 @@
+import tempfile
+import zipfile
+from io import BytesIO
+from typing import IO, Any, Dict, List, Optional, Sequence
+
+from pypdf import PdfReader, PdfWriter
+
+from .models import Ticket
+from .process_pool import shared_process_pool
+from .renderers import TicketRenderer, get_renderer
+
+# Por debajo de esta cantidad no compensa enviar el lote al pool de procesos
+PARALLEL_MIN_TICKETS = 32
+# Tickets por envío a cada proceso
+RENDER_CHUNK_SIZE = 16
+# Tickets por viaje a la base de datos (items incluidos)
+FETCH_CHUNK_SIZE = 500
+
+
+class TicketData:
+    """Copia de un ticket con sus items, liviana y serializable para los procesos"""
+
+    __slots__ = ('id', 'created_at', 'zone', 'draw_type', 'user', 'total_pieces', 'items')
+
+    def __init__(self, ticket: Ticket):
+        self.id = ticket.id
+        self.created_at = ticket.created_at
+        self.zone = _Named(name=ticket.zone.name)
+        self.draw_type = _Named(name=ticket.draw_type.name)
+        self.user = _Named(username=ticket.user.username)
+        self.total_pieces = ticket.total_pieces
+        self.items = _Items(_Named(number=item.number, pieces=item.pieces) for item in ticket.items.all())
+
+
+class _Named:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class _Items(list):
+    # La plantilla y los renderizadores recorren ticket.items.all()
+    def all(self):
+        return self
+
+
+class TicketBatchRenderer:
+    """Renderiza muchos tickets en un único PDF de varias páginas o en un ZIP"""
+
+    @staticmethod
+    def load(filters: Dict[str, Any], max_tickets: Optional[int] = None) -> List[TicketData]:
+        """
+        Trae los tickets y sus items en bloques (dos consultas por bloque)
+
+        Raises:
+            ValueError: si el rango supera max_tickets
+        """
+        qs = (
+            Ticket.objects.filter(**filters)
+            .select_related('zone', 'draw_type', 'user')
+            .prefetch_related('items')
+            .order_by('id')
+        )
+        tickets = []
+        for ticket in qs.iterator(chunk_size=FETCH_CHUNK_SIZE):
+            tickets.append(TicketData(ticket))
+            if max_tickets is not None and len(tickets) > max_tickets:
+                raise ValueError(f'Máximo {max_tickets} tickets por lote.')
+        return tickets
+
+    @staticmethod
+    def render(
+        tickets: Sequence[TicketData],
+        renderer: TicketRenderer,
+        output: str = 'pdf',
+        processes: Optional[int] = None,
+    ) -> IO[bytes]:
+        """
+        Renderiza los tickets en paralelo y arma el archivo final
+
+        Args:
+            output: 'pdf' (un documento, una página por ticket) o 'zip'
+                (un archivo por ticket)
+            processes: procesos del pool; 1 renderiza en el proceso actual
+
+        Returns:
+            Archivo temporal posicionado al inicio; se elimina al cerrarlo
+
+        Raises:
+            ValueError: si la salida no es válida para el renderizador
+        """
+        if output not in {'pdf', 'zip'}:
+            raise ValueError('output debe ser pdf o zip')
+        if output == 'pdf' and renderer.extension != 'pdf':
+            raise ValueError(f'El renderer {renderer.name} solo admite output=zip')
+
+        documents = TicketBatchRenderer._render_all(tickets, renderer.name, processes)
+        out = tempfile.TemporaryFile()
+        if output == 'zip':
+            with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                for ticket, content in zip(tickets, documents):
+                    zf.writestr(f'ticket-{ticket.id}.{renderer.extension}', content)
+        else:
+            writer = PdfWriter()
+            for content in documents:
+                writer.append(PdfReader(BytesIO(content)))
+            writer.write(out)
+        out.seek(0)
+        return out
+
+    @staticmethod
+    def _render_all(tickets: Sequence[TicketData], renderer_name: str, processes: Optional[int]) -> List[bytes]:
+        if processes == 1 or len(tickets) < PARALLEL_MIN_TICKETS:
+            return [_render_one(renderer_name, ticket) for ticket in tickets]
+        # Pool compartido entre peticiones: no se levantan procesos por cada lote
+        pool = shared_process_pool('pdf_batch', processes)
+        return list(pool.map(_render_one, [renderer_name] * len(tickets), tickets, chunksize=RENDER_CHUNK_SIZE))
+
+
+def _render_one(renderer_name: str, ticket: TicketData) -> bytes:
+    """Función de módulo para que el pool pueda serializarla"""
+    return get_renderer(renderer_name).render(ticket)
@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .exposure_service import ExposureLimitExceeded, ExposureService
+from .models import Ticket, TicketItem
+from .rollup_service import SalesRollupService
+from .serializers import TicketSerializer
+
+
+class TicketBatchService:
+    """Servicio para emitir varios tickets en una sola petición"""
+
+    @staticmethod
+    def issue(tickets_data: List[Dict[str, Any]], user, context: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Valida y persiste un lote de tickets
+
+        Cada ticket se valida por separado (horario y topes salen del snapshot
+        del catálogo), los topes acumulados de todos los números del lote se
+        verifican con un único bloqueo del acumulado y los tickets aceptados
+        se insertan con bulk_create en una sola transacción. Un ticket
+        rechazado no impide la emisión del resto.
+
+        Returns:
+            Lista de resultados en el mismo orden del lote, con 'status' 201
+            y 'ticket', o 'status' 400 y 'errors'
+        """
+        context = dict(context or {}, defer_exposure_check=True)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tickets_data)
+        candidates = []
+        for index, ticket_data in enumerate(tickets_data):
+            serializer = TicketSerializer(data=ticket_data, context=context)
+            if serializer.is_valid():
+                candidates.append((index, serializer.validated_data, serializer._number_limits))
+            else:
+                results[index] = TicketBatchService._rejected(index, ticket_data, serializer.errors)
+
+        created = []
+        if candidates:
+            with transaction.atomic():
+                sale_date = timezone.localdate()
+                sold = ExposureService.lock_many(sale_date, [
+                    (data['zone'].id, data['draw_type'].id, item['number'])
+                    for _, data, _ in candidates
+                    for item in data['items']
+                ])
+                pieces_by_key: Dict[tuple, int] = {}
+                for index, data, limits in candidates:
+                    error = TicketBatchService._check_limits(data, limits, sold, pieces_by_key)
+                    if error:
+                        results[index] = TicketBatchService._rejected(
+                            index, tickets_data[index], {'non_field_errors': [error]}
+                        )
+                        continue
+                    for item in data['items']:
+                        key = (data['zone'].id, data['draw_type'].id, item['number'])
+                        pieces_by_key[key] = pieces_by_key.get(key, 0) + item['pieces']
+                    created.append((index, data))
+
+                tickets = Ticket.objects.bulk_create([
+                    Ticket(
+                        zone=data['zone'],
+                        draw_type=data['draw_type'],
+                        user=user,
+                        total_pieces=sum(item['pieces'] for item in data['items']),
+                        sale_date=sale_date,
+                    )
+                    for _, data in created
+                ])
+                TicketItem.objects.bulk_create([
+                    TicketItem(ticket=ticket, sale_date=ticket.sale_date, **item)
+                    for ticket, (_, data) in zip(tickets, created)
+                    for item in data['items']
+                ])
+                ExposureService.increment_many(sale_date, pieces_by_key, sold)
+                SalesRollupService.record(tickets)
+
+        if created:
+            ids = [ticket.id for ticket in tickets]
+            saved = {
+                ticket.id: ticket
+                for ticket in Ticket.objects.filter(id__in=ids).prefetch_related('items')
+            }
+            for ticket_id, (index, _) in zip(ids, created):
+                result = {'index': index, 'status': 201, 'ticket': TicketSerializer(saved[ticket_id]).data}
+                if 'client_ref' in tickets_data[index]:
+                    result['client_ref'] = tickets_data[index]['client_ref']
+                results[index] = result
+        return results
+
+    @staticmethod
+    def _check_limits(data, limits, sold, pending) -> Optional[str]:
+        """Verifica los topes de un ticket contra lo vendido más lo ya aceptado en el lote"""
+        for item in data['items']:
+            number = item['number']
+            max_allowed = limits.get(number)
+            if max_allowed is None:
+                continue
+            key = (data['zone'].id, data['draw_type'].id, number)
+            current = sold.get(key, 0) + pending.get(key, 0)
+            if current + item['pieces'] > max_allowed:
+                return str(ExposureLimitExceeded(number, current, item['pieces'], max_allowed))
+        return None
+
+    @staticmethod
+    def _rejected(index: int, ticket_data, errors) -> Dict[str, Any]:
+        result = {'index': index, 'status': 400, 'errors': errors}
+        if isinstance(ticket_data, dict) and 'client_ref' in ticket_data:
+            result['client_ref'] = ticket_data['client_ref']
+        return result
@@ -1,14 +1,25 @@
 import hashlib
 import json
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.db.models import Count, Sum
+from django.db.models import Count, Func, Sum, Window
 from django.utils import timezone
 
-from .models import Ticket
+from catalog.models import DrawType, Zone
+
+from .archive import TicketArchiveService
+from .models import DailySalesRollup
+
+
+class _SumOfAggregate(Func):
+    """SUM sobre un agregado, para usar en ventanas: SUM(SUM(x)) OVER ()"""
+    function = 'SUM'
+    window_compatible = True
 
 
 class ReportCacheService:
@@ -106,13 +117,13 @@ class ReportCacheService:
         page_size: int,
         include_daily: bool
     ) -> Dict[str, Any]:
-        """Genera el reporte de resumen sin cache"""
+        """Genera el reporte de resumen sin cache, a partir del rollup diario"""
         # Construir filtros
         filters = {}
         if start_date:
-            filters['created_at__date__gte'] = start_date
+            filters['sale_date__gte'] = start_date
         if end_date:
-            filters['created_at__date__lte'] = end_date
+            filters['sale_date__lte'] = end_date
         if zone:
             filters['zone_id__in'] = [z.strip() for z in zone.split(',') if z.strip()]
         if draw_type:
@@ -124,8 +135,8 @@ class ReportCacheService:
         if group_by not in {'zone', 'draw_type', 'user'}:
             return {'error': 'group_by inválido'}
         
-        # Query base
-        qs = Ticket.objects.filter(**filters)
+        # Query base: una fila por día/zona/sorteo/vendedor en lugar de un ticket
+        qs = DailySalesRollup.objects.filter(**filters)
         
         # Configurar campos según group_by
         if group_by == 'zone':
@@ -138,53 +149,72 @@ class ReportCacheService:
             values = ('user__username',)
             label_field = 'user__username'
         
-        # Generar datos agrupados
-        data = (
-            qs.values(*values)
-            .annotate(total_tickets=Count('id'), total_pieces=Sum('total_pieces'))
-            .order_by()
-        )
-        
-        result = [
-            {
-                'group': row[label_field] or '',
-                'total_tickets': row['total_tickets'] or 0,
-                'total_pieces': row['total_pieces'] or 0,
-            }
-            for row in data
-        ]
-        
-        # Paginación
-        total_items = len(result)
-        total_pages = (total_items + page_size - 1) // page_size if page_size else 1
-        start = (page - 1) * page_size
-        end = start + page_size
-        paged = result[start:end]
-        
-        # Totales generales
-        totals = qs.aggregate(
-            total_tickets=Count('id'),
-            total_pieces=Sum('total_pieces')
-        )
-        totals = {k: totals.get(k) or 0 for k in ['total_tickets', 'total_pieces']}
-        
-        # Datos diarios opcionales
-        daily = None
-        if include_daily:
-            daily_qs = (
-                qs.values('created_at__date')
-                .annotate(total_tickets=Count('id'), total_pieces=Sum('total_pieces'))
-                .order_by('created_at__date')
+        # Días archivados en frío: sus totales están en Parquet y no en el rollup
+        archived = ReportCacheService._archived_totals(start_date, end_date, zone, draw_type, user)
+        if archived:
+            paged, totals, total_items, daily = ReportCacheService._merge_archived(
+                qs, archived, group_by, label_field, page, page_size, include_daily
             )
-            daily = [
+        else:
+            # Página solicitada, número de grupos y totales generales en una sola consulta:
+            # COUNT(*) OVER () y SUM(SUM(x)) OVER () se calculan sobre todos los grupos
+            # antes de aplicar LIMIT/OFFSET, así el worker solo materializa la página.
+            start = (page - 1) * page_size
+            end = start + page_size
+            data = list(
+                qs.values(*values)
+                .annotate(
+                    tickets=Sum('total_tickets'),
+                    pieces=Sum('total_pieces'),
+                    group_count=Window(Count('*')),
+                    grand_tickets=Window(_SumOfAggregate(Sum('total_tickets'))),
+                    grand_pieces=Window(_SumOfAggregate(Sum('total_pieces'))),
+                )
+                .order_by(label_field)[start:end]
+            )
+        
+            paged = [
                 {
-                    'date': str(row['created_at__date']),
-                    'total_tickets': row['total_tickets'] or 0,
-                    'total_pieces': row['total_pieces'] or 0,
+                    'group': row[label_field] or '',
+                    'total_tickets': row['tickets'] or 0,
+                    'total_pieces': row['pieces'] or 0,
                 }
-                for row in daily_qs
+                for row in data
             ]
         
+            if data:
+                total_items = data[0]['group_count']
+                totals = {'total_tickets': data[0]['grand_tickets'], 'total_pieces': data[0]['grand_pieces']}
+            elif page == 1:
+                total_items = 0
+                totals = {}
+            else:
+                # Página fuera de rango: las ventanas no devuelven filas
+                total_items = qs.values(*values).distinct().count()
+                totals = qs.aggregate(
+                    total_tickets=Sum('total_tickets'),
+                    total_pieces=Sum('total_pieces')
+                )
+            totals = {k: totals.get(k) or 0 for k in ['total_tickets', 'total_pieces']}
+        
+            # Datos diarios opcionales
+            daily = None
+            if include_daily:
+                daily_qs = (
+                    qs.values('sale_date')
+                    .annotate(total_tickets=Sum('total_tickets'), total_pieces=Sum('total_pieces'))
+                    .order_by('sale_date')
+                )
+                daily = [
+                    {
+                        'date': str(row['sale_date']),
+                        'total_tickets': row['total_tickets'] or 0,
+                        'total_pieces': row['total_pieces'] or 0,
+                    }
+                    for row in daily_qs
+                ]
+        total_pages = (total_items + page_size - 1) // page_size if page_size else 1
+        
         # Construir respuesta
         payload = {
             'summary': paged,
@@ -216,6 +246,90 @@ class ReportCacheService:
             
         return payload
     
+    @staticmethod
+    def _archived_totals(
+        start_date: Optional[str],
+        end_date: Optional[str],
+        zone: Optional[str],
+        draw_type: Optional[str],
+        user: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        """Totales archivados que caen en el rango (vacío si no hay días archivados)"""
+        start = date.fromisoformat(start_date) if start_date else None
+        end = date.fromisoformat(end_date) if end_date else None
+        if not TicketArchiveService.archived_days(start, end):
+            return []
+
+        def ids(value):
+            return [int(v) for v in value.split(',') if v.strip()] if value else None
+
+        return TicketArchiveService.load_totals(start, end, ids(zone), ids(draw_type), ids(user))
+
+    @staticmethod
+    def _merge_archived(
+        qs,
+        archived: List[Dict[str, Any]],
+        group_by: str,
+        label_field: str,
+        page: int,
+        page_size: int,
+        include_daily: bool,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int], int, Optional[List[Dict[str, Any]]]]:
+        """
+        Suma los totales archivados a los del rollup y pagina en memoria
+
+        Los grupos son pocos (zonas, sorteos o vendedores), así que se agrupan
+        todos y luego se corta la página pedida.
+        """
+        model, name_field = {
+            'zone': (Zone, 'name'),
+            'draw_type': (DrawType, 'name'),
+            'user': (get_user_model(), 'username'),
+        }[group_by]
+        id_field = f'{group_by}_id'
+        names = dict(
+            model.objects.filter(id__in={row[id_field] for row in archived}).values_list('id', name_field)
+        )
+
+        groups: Dict[str, List[int]] = {}
+        live = qs.values(label_field).annotate(tickets=Sum('total_tickets'), pieces=Sum('total_pieces')).order_by()
+        for row in live:
+            totals = groups.setdefault(row[label_field] or '', [0, 0])
+            totals[0] += row['tickets'] or 0
+            totals[1] += row['pieces'] or 0
+        for row in archived:
+            totals = groups.setdefault(names.get(row[id_field]) or '', [0, 0])
+            totals[0] += row['total_tickets']
+            totals[1] += row['total_pieces']
+
+        start = (page - 1) * page_size
+        paged = [
+            {'group': group, 'total_tickets': tickets, 'total_pieces': pieces}
+            for group, (tickets, pieces) in sorted(groups.items())[start:start + page_size]
+        ]
+        totals = {
+            'total_tickets': sum(tickets for tickets, _ in groups.values()),
+            'total_pieces': sum(pieces for _, pieces in groups.values()),
+        }
+
+        daily = None
+        if include_daily:
+            days: Dict[date, List[int]] = {}
+            live_daily = (
+                qs.values('sale_date')
+                .annotate(total_tickets=Sum('total_tickets'), total_pieces=Sum('total_pieces'))
+                .order_by()
+            )
+            for row in chain(live_daily, archived):
+                totals_day = days.setdefault(row['sale_date'], [0, 0])
+                totals_day[0] += row['total_tickets'] or 0
+                totals_day[1] += row['total_pieces'] or 0
+            daily = [
+                {'date': str(day), 'total_tickets': tickets, 'total_pieces': pieces}
+                for day, (tickets, pieces) in sorted(days.items())
+            ]
+        return paged, totals, len(groups), daily
+
     @staticmethod
     def invalidate_cache(pattern: str = "report_*") -> int:
         """
@@ -0,0 +1,255 @@
+import logging
+import os
+import shutil
+import threading
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Sequence
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from .cache_service import ReportCacheService
+from .exports import detail_export, stream_csv, summary_sheets, write_summary_csv, write_xlsx
+from .models import ExportJob
+from .process_pool import shared_process_pool
+
+logger = logging.getLogger(__name__)
+
+# Subcarpeta de MEDIA_ROOT donde quedan los archivos generados
+EXPORT_DIR = 'exports'
+# El resumen exportado incluye todos los grupos en una sola página
+SUMMARY_EXPORT_PAGE_SIZE = 100000
+# Cada cuántas filas se guarda y publica el avance
+PROGRESS_EVERY_ROWS = 50000
+
+PARAM_NAMES = ('start', 'end', 'zone', 'draw_type', 'user', 'group_by', 'daily')
+
+class ExportJobService:
+    """Servicio para encolar y ejecutar exportaciones fuera del request"""
+
+    @staticmethod
+    def create(user, level: str, fmt: str, params: Dict[str, Any]) -> ExportJob:
+        """
+        Registra un trabajo de exportación y lo encola al confirmar la transacción
+
+        Raises:
+            ValueError: si el tipo o el formato no son válidos
+        """
+        if level not in dict(ExportJob.LEVEL_CHOICES):
+            raise ValueError('level debe ser summary, tickets o items')
+        if fmt not in dict(ExportJob.FORMAT_CHOICES):
+            raise ValueError('Formato no soportado')
+        if fmt == 'pdf' and level != 'summary':
+            raise ValueError('El formato pdf solo está disponible para el resumen')
+        params = {name: params[name] for name in PARAM_NAMES if params.get(name)}
+        job = ExportJob.objects.create(user=user, level=level, format=fmt, params=params)
+        transaction.on_commit(lambda: ExportJobService.enqueue(job.pk))
+        return job
+
+    @staticmethod
+    def enqueue(job_id) -> None:
+        """Envía el trabajo al backend configurado en EXPORT_JOBS_BACKEND"""
+        backend = getattr(settings, 'EXPORT_JOBS_BACKEND', 'local')
+        job_id = str(job_id)
+        if backend == 'sync':
+            ExportJobService.run(job_id)
+        elif backend == 'redis':
+            from django_redis import get_redis_connection
+
+            get_redis_connection('default').rpush(settings.EXPORT_JOBS_QUEUE_KEY, job_id)
+        else:
+            get_process_pool().submit(run_export_job, job_id)
+
+    @staticmethod
+    def run(job_id: str) -> None:
+        """
+        Genera el archivo de un trabajo pendiente
+
+        El paso a 'running' es un UPDATE condicionado al estado, por lo que un
+        trabajo encolado dos veces solo lo procesa un worker.
+        """
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_PENDING).update(
+            status=ExportJob.STATUS_RUNNING, started_at=now, heartbeat_at=now
+        )
+        if not claimed:
+            return
+        job = ExportJob.objects.get(pk=job_id)
+        ExportJobService._publish(job)
+        path = os.path.join(settings.MEDIA_ROOT, EXPORT_DIR, f'{job.pk}.{job.format}')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with _Heartbeat(job.pk):
+                if job.level == 'summary':
+                    ExportJobService._write_summary(job, path)
+                else:
+                    ExportJobService._write_detail(job, path)
+        except Exception as e:
+            logger.exception('Error generando exportación %s', job.pk)
+            if os.path.exists(path):
+                os.remove(path)
+            job.status = ExportJob.STATUS_FAILED
+            job.error = str(e)
+        else:
+            job.status = ExportJob.STATUS_DONE
+            job.file.name = f'{EXPORT_DIR}/{job.pk}.{job.format}'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'file', 'rows_written', 'finished_at'])
+        ExportJobService._publish(job)
+
+    @staticmethod
+    def reap_stale(job_id=None) -> int:
+        """
+        Marca como fallidos los trabajos en curso sin latido reciente
+
+        Un worker que muere a mitad de un trabajo (OOM, reinicio) lo deja en
+        'running' para siempre; pasado EXPORT_JOBS_STALE_SECONDS sin latido se
+        cierra con error para que el usuario pueda pedirlo de nuevo.
+
+        Returns:
+            Número de trabajos marcados como fallidos
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.EXPORT_JOBS_STALE_SECONDS)
+        stale = ExportJob.objects.filter(status=ExportJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+        if job_id is not None:
+            stale = stale.filter(pk=job_id)
+        reaped = 0
+        for job in stale:
+            # Condicionado al estado: si el worker termina justo ahora, gana él
+            updated = ExportJob.objects.filter(
+                pk=job.pk, status=ExportJob.STATUS_RUNNING, heartbeat_at=job.heartbeat_at
+            ).update(
+                status=ExportJob.STATUS_FAILED,
+                error='El worker dejó de responder; vuelve a solicitar la exportación',
+                finished_at=timezone.now(),
+            )
+            if updated:
+                job.refresh_from_db()
+                ExportJobService._publish(job)
+                reaped += 1
+        return reaped
+
+    @staticmethod
+    def _write_summary(job: ExportJob, path: str) -> None:
+        params = job.params
+        payload = ReportCacheService.get_summary_report(
+            start_date=params.get('start'),
+            end_date=params.get('end'),
+            zone=params.get('zone'),
+            draw_type=params.get('draw_type'),
+            user=params.get('user'),
+            group_by=params.get('group_by', 'zone'),
+            page=1,
+            page_size=SUMMARY_EXPORT_PAGE_SIZE,
+            include_daily=params.get('daily') in {'1', 'true', 'True'},
+        )
+        if job.format == 'csv':
+            with open(path, 'w', newline='', encoding='utf-8') as out:
+                write_summary_csv(payload, out)
+        elif job.format == 'xlsx':
+            ExportJobService._save_xlsx(summary_sheets(payload), path)
+        else:
+            html = render_to_string(
+                'reports/summary.html',
+                {'payload': payload, 'params': params, 'generated_at': timezone.localtime()},
+            )
+            with open(path, 'wb') as out:
+                result = pisa.CreatePDF(src=html, dest=out)
+            if result.err:
+                raise RuntimeError('Error generando el PDF del reporte')
+        job.rows_written = len(payload['summary'])
+
+    @staticmethod
+    def _write_detail(job: ExportJob, path: str) -> None:
+        header, rows = detail_export(job.level, job.params)
+        rows = ExportJobService._track_progress(job, rows)
+        if job.format == 'csv':
+            with open(path, 'w', newline='', encoding='utf-8') as out:
+                for chunk in stream_csv(header, rows):
+                    out.write(chunk)
+        else:
+            ExportJobService._save_xlsx([(job.level.capitalize(), header, rows)], path)
+
+    @staticmethod
+    def _save_xlsx(sheets, path: str) -> None:
+        with write_xlsx(sheets) as tmp, open(path, 'wb') as out:
+            shutil.copyfileobj(tmp, out)
+
+    @staticmethod
+    def _track_progress(job: ExportJob, rows: Iterable[Sequence[Any]]) -> Iterator[Sequence[Any]]:
+        """Cuenta las filas escritas y publica el avance cada PROGRESS_EVERY_ROWS"""
+        for row in rows:
+            yield row
+            job.rows_written += 1
+            if job.rows_written % PROGRESS_EVERY_ROWS == 0:
+                ExportJob.objects.filter(pk=job.pk).update(rows_written=job.rows_written)
+                ExportJobService._publish(job)
+
+    @staticmethod
+    def _publish(job: ExportJob) -> None:
+        """Publica el estado del trabajo como notificación de reporte al usuario"""
+        data = {
+            'job_id': str(job.pk),
+            'level': job.level,
+            'format': job.format,
+            'status': job.status,
+            'rows_written': job.rows_written,
+        }
+        if job.status == ExportJob.STATUS_DONE:
+            data['download_url'] = f'/api/sales/export-jobs/{job.pk}/download/'
+        if job.error:
+            data['error'] = job.error
+        try:
+            # Importación diferida: la app de notificaciones es opcional para los workers
+            from notifications.services import NotificationService
+
+            NotificationService.send_report_notification('export', job.user_id, data=data)
+        except Exception as e:
+            logger.warning('No se pudo notificar la exportación %s: %s', job.pk, e)
+
+
+class _Heartbeat:
+    """Actualiza heartbeat_at del trabajo desde un hilo mientras se genera el archivo"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'export-heartbeat-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self) -> None:
+        try:
+            while not self.stopped.wait(settings.EXPORT_JOBS_HEARTBEAT_SECONDS):
+                ExportJob.objects.filter(pk=self.job_id, status=ExportJob.STATUS_RUNNING).update(
+                    heartbeat_at=timezone.now()
+                )
+        except Exception as e:
+            logger.warning('No se pudo registrar el latido de la exportación %s: %s', self.job_id, e)
+        finally:
+            # Conexión propia del hilo
+            connection.close()
+
+
+def run_export_job(job_id: str) -> None:
+    """Punto de entrada de los workers (función de módulo para poder serializarla)"""
+    close_old_connections()
+    try:
+        ExportJobService.run(job_id)
+    finally:
+        close_old_connections()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido por el servidor (backend 'local')"""
+    return shared_process_pool('export_jobs', settings.EXPORT_JOBS_WORKERS)
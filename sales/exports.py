@@ -0,0 +1,204 @@
+import csv
+import tempfile
+from datetime import date, datetime, time, timedelta
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Ticket, TicketItem
+
+# Filas por viaje al cursor del servidor
+EXPORT_CHUNK_SIZE = 2000
+
+TICKET_HEADER = ['Ticket', 'Fecha', 'Zona', 'Sorteo', 'Vendedor', 'Total Pedazos']
+ITEM_HEADER = ['Ticket', 'Fecha', 'Zona', 'Sorteo', 'Vendedor', 'Número', 'Pedazos']
+SUMMARY_HEADER = ['Grupo', 'Total Tickets', 'Total Pedazos']
+DAILY_HEADER = ['Fecha', 'Total Tickets', 'Total Pedazos']
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Filas por hoja que admite Excel (encabezado incluido)
+XLSX_MAX_ROWS = 1048576
+
+
+def build_ticket_filters(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    zone: Optional[str] = None,
+    draw_type: Optional[str] = None,
+    user: Optional[str] = None,
+    prefix: str = '',
+) -> Dict[str, Any]:
+    """
+    Construye filtros de tickets con rango semiabierto sobre created_at
+
+    El mismo rango se aplica sobre sale_date (clave de partición) para que
+    PostgreSQL descarte las particiones de otras fechas.
+
+    Raises:
+        ValueError: si alguna fecha no tiene formato YYYY-MM-DD
+    """
+    filters: Dict[str, Any] = {}
+    if start_date:
+        start = date.fromisoformat(start_date)
+        filters[f'{prefix}created_at__gte'] = _start_of_day(start)
+        filters[f'{prefix}sale_date__gte'] = start
+    if end_date:
+        end = date.fromisoformat(end_date)
+        filters[f'{prefix}created_at__lt'] = _start_of_day(end + timedelta(days=1))
+        filters[f'{prefix}sale_date__lte'] = end
+    if zone:
+        filters[f'{prefix}zone_id__in'] = [z.strip() for z in zone.split(',') if z.strip()]
+    if draw_type:
+        filters[f'{prefix}draw_type_id__in'] = [d.strip() for d in draw_type.split(',') if d.strip()]
+    if user:
+        filters[f'{prefix}user_id__in'] = [u.strip() for u in user.split(',') if u.strip()]
+    return filters
+
+
+def ticket_rows(filters: Dict[str, Any]) -> Iterator[Sequence[Any]]:
+    """Filas a nivel de ticket, leídas con cursor del servidor"""
+    rows = (
+        Ticket.objects.filter(**filters)
+        .order_by('id')
+        .values_list('id', 'created_at', 'zone__name', 'draw_type__name', 'user__username', 'total_pieces')
+    )
+    for ticket_id, created_at, zone, draw_type, username, total_pieces in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield ticket_id, _format_datetime(created_at), zone, draw_type, username, total_pieces
+
+
+def item_rows(filters: Dict[str, Any]) -> Iterator[Sequence[Any]]:
+    """Filas a nivel de número jugado, leídas con cursor del servidor"""
+    rows = (
+        TicketItem.objects.filter(**filters)
+        .order_by('ticket_id', 'number')
+        .values_list(
+            'ticket_id', 'ticket__created_at', 'ticket__zone__name', 'ticket__draw_type__name',
+            'ticket__user__username', 'number', 'pieces',
+        )
+    )
+    for ticket_id, created_at, zone, draw_type, username, number, pieces in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield ticket_id, _format_datetime(created_at), zone, draw_type, username, number, pieces
+
+
+def detail_export(level: str, params: Dict[str, Optional[str]]):
+    """
+    Encabezado y generador de filas para la exportación detallada
+
+    Args:
+        level: 'tickets' o 'items'
+        params: start, end, zone, draw_type, user tal como llegan en la petición
+
+    Raises:
+        ValueError: si el nivel o las fechas no son válidos
+    """
+    if level not in {'tickets', 'items'}:
+        raise ValueError('level debe ser tickets o items')
+    prefix = 'ticket__' if level == 'items' else ''
+    filters = build_ticket_filters(
+        params.get('start'), params.get('end'), params.get('zone'),
+        params.get('draw_type'), params.get('user'), prefix=prefix,
+    )
+    if level == 'items':
+        # Los items tienen su propia copia de sale_date: poda también sus particiones
+        for lookup in ('sale_date__gte', 'sale_date__lte'):
+            if f'ticket__{lookup}' in filters:
+                filters[lookup] = filters[f'ticket__{lookup}']
+        return ITEM_HEADER, item_rows(filters)
+    return TICKET_HEADER, ticket_rows(filters)
+
+
+def summary_rows(payload: Dict[str, Any]) -> Iterator[Sequence[Any]]:
+    """Filas del resumen agrupado seguidas de la línea de totales"""
+    for row in payload['summary']:
+        yield [row['group'], row['total_tickets'], row['total_pieces']]
+    yield []
+    yield ['Totales', payload['totals']['total_tickets'], payload['totals']['total_pieces']]
+
+
+def daily_rows(payload: Dict[str, Any]) -> Iterator[Sequence[Any]]:
+    for row in payload.get('daily') or []:
+        yield [row['date'], row['total_tickets'], row['total_pieces']]
+
+
+def summary_sheets(payload: Dict[str, Any]):
+    """Hojas (título, encabezado, filas) del reporte resumen para write_xlsx"""
+    sheets = [('Resumen', SUMMARY_HEADER, summary_rows(payload))]
+    if payload.get('daily'):
+        sheets.append(('Diario', DAILY_HEADER, daily_rows(payload)))
+    return sheets
+
+
+def write_summary_csv(payload: Dict[str, Any], out: IO[str]) -> None:
+    """Escribe el reporte resumen como CSV: grupos, totales y, si hay, el diario"""
+    writer = csv.writer(out)
+    writer.writerow(SUMMARY_HEADER)
+    writer.writerows(summary_rows(payload))
+    if payload.get('daily'):
+        writer.writerow([])
+        writer.writerow(DAILY_HEADER)
+        writer.writerows(daily_rows(payload))
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header: Sequence[str], rows: Iterable[Sequence[Any]], lines_per_chunk: int = 1000) -> Iterator[str]:
+    """Genera el CSV por bloques de líneas, sin acumular el archivo en memoria"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= lines_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def write_xlsx(sheets: Iterable[Tuple[str, Sequence[str], Iterable[Sequence[Any]]]]) -> IO[bytes]:
+    """
+    Escribe un libro XLSX en modo write-only sobre un archivo temporal
+
+    Las filas se consumen de los generadores y openpyxl las vuelca a disco
+    sin mantener objetos por celda, así la memoria no depende del tamaño.
+
+    Una hoja admite XLSX_MAX_ROWS filas (límite de Excel); al llenarse se
+    sigue en otra con el mismo encabezado ('Items 2', 'Items 3', ...).
+
+    Args:
+        sheets: tuplas (título, encabezado, filas), una por hoja
+
+    Returns:
+        Archivo temporal posicionado al inicio; se elimina al cerrarlo
+    """
+    wb = Workbook(write_only=True)
+    for title, header, rows in sheets:
+        ws = wb.create_sheet(title)
+        ws.append(list(header))
+        used, part = 1, 1
+        for row in rows:
+            if used >= XLSX_MAX_ROWS:
+                part += 1
+                ws = wb.create_sheet(f'{title} {part}')
+                ws.append(list(header))
+                used = 1
+            ws.append(list(row))
+            used += 1
+    out = tempfile.TemporaryFile(suffix='.xlsx')
+    wb.save(out)
+    out.seek(0)
+    return out
+
+
+def _start_of_day(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _format_datetime(value: datetime) -> str:
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,214 @@
+import logging
+import struct
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import NumberExposure
+
+logger = logging.getLogger(__name__)
+
+# Un contador por número 00-99
+BOARD_SLOTS = 100
+# Enteros sin signo de 32 bits big-endian, el formato de BITFIELD u32
+BOARD_FORMAT = f'>{BOARD_SLOTS}I'
+BOARD_KEY = 'exposure_board:{zone_id}:{draw_type_id}:{sale_date}'
+# Número de secuencia del tablero: sube con cada cambio y no expira con el
+# tablero (dura el día), así un tablero reconstruido conserva la numeración
+SEQ_KEY = 'exposure_board_seq:{zone_id}:{draw_type_id}:{sale_date}'
+SEQ_TTL = 2 * 24 * 3600
+
+# Numera el cambio y lo suma a los casilleros en una sola operación atómica,
+# solo si el tablero existe: uno ausente se reconstruye completo desde la base
+# al leerlo. OVERFLOW SAT evita bajar de cero al descontar.
+APPLY_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+if seq == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return seq
+end
+local args = {'OVERFLOW', 'SAT'}
+for i = 2, #ARGV, 2 do
+    args[#args + 1] = 'INCRBY'
+    args[#args + 1] = 'u32'
+    args[#args + 1] = '#' .. ARGV[i]
+    args[#args + 1] = ARGV[i + 1]
+end
+redis.call('BITFIELD', KEYS[1], unpack(args))
+return seq
+"""
+
+# (zone_id, draw_type_id)
+BoardKey = Tuple[int, int]
+
+_apply_script = None
+
+
+class ExposureBoardService:
+    """
+    Tablero de pedazos vendidos por número, precalculado en Redis
+
+    Cada (zona, sorteo, fecha) es un arreglo fijo de 100 contadores de 32
+    bits (400 bytes) que se incrementa al confirmar cada venta, así el
+    tablero de supervisión se lee con un MGET sin tocar la base. Un
+    tablero ausente se reconstruye desde el acumulado NumberExposure
+    (a lo sumo 100 filas) y expira cada EXPOSURE_BOARD_TTL segundos, lo que
+    acota cualquier desfase con la base. Es solo de consulta: los topes se
+    siguen verificando contra el acumulado bajo bloqueo.
+    """
+
+    @staticmethod
+    def apply(sale_date: date, pieces_by_key: Dict[Tuple[int, int, str], int]) -> Dict[BoardKey, int]:
+        """
+        Suma pedazos (negativos al liberar) a los tableros que estén en Redis
+
+        Returns:
+            Número de secuencia asignado al cambio en cada tablero (vacío sin Redis)
+        """
+        conn = ExposureBoardService._redis()
+        if conn is None or not pieces_by_key:
+            return {}
+        args_by_board: Dict[BoardKey, List] = {}
+        for (zone_id, draw_type_id, number), pieces in pieces_by_key.items():
+            args_by_board.setdefault((zone_id, draw_type_id), [SEQ_TTL]).extend([int(number), pieces])
+        try:
+            script = ExposureBoardService._script(conn)
+            pipe = conn.pipeline(transaction=False)
+            for (zone_id, draw_type_id), args in args_by_board.items():
+                keys = [
+                    ExposureBoardService._key(zone_id, draw_type_id, sale_date),
+                    ExposureBoardService._seq_key(zone_id, draw_type_id, sale_date),
+                ]
+                script(keys=keys, args=args, client=pipe)
+            return dict(zip(args_by_board, pipe.execute()))
+        except Exception:
+            # Un tablero desactualizado se corrige al expirar; la venta ya está confirmada
+            logger.warning('No se pudo actualizar el tablero de exposición', exc_info=True)
+            return {}
+
+    @staticmethod
+    def snapshot(zone_id: int, draw_type_id: int, sale_date: date) -> Tuple[List[int], Optional[int]]:
+        """
+        Tablero de una zona+sorteo junto con su número de secuencia
+
+        El tablero incluye exactamente los cambios con secuencia <= la
+        devuelta (se leen juntos con MGET), así quien lo muestra puede
+        descartar los cambios publicados que ya contiene. Si el tablero se
+        reconstruye desde la base, un cambio confirmado en ese mismo instante
+        puede quedar contado dos veces hasta el siguiente snapshot. Sin
+        Redis la secuencia es None.
+        """
+        pair = (zone_id, draw_type_id)
+        conn = ExposureBoardService._redis()
+        if conn is None:
+            return ExposureBoardService._load([pair], sale_date)[pair], None
+        seq_key = ExposureBoardService._seq_key(zone_id, draw_type_id, sale_date)
+        try:
+            packed, seq = conn.mget([ExposureBoardService._key(zone_id, draw_type_id, sale_date), seq_key])
+            if packed is None:
+                board = ExposureBoardService._load([pair], sale_date)
+                ExposureBoardService._store(conn, board, sale_date, only_missing=True)
+                return board[pair], int(conn.get(seq_key) or 0)
+        except Exception:
+            logger.warning('Tablero de exposición sin Redis, leyendo desde la base', exc_info=True)
+            return ExposureBoardService._load([pair], sale_date)[pair], None
+        return list(struct.unpack(BOARD_FORMAT, packed)), int(seq or 0)
+
+    @staticmethod
+    def get_boards(pairs: Iterable[BoardKey], sale_date: date) -> Dict[BoardKey, List[int]]:
+        """
+        Pedazos vendidos de los números 00-99 para varias zona+sorteo
+
+        Returns:
+            Dict (zone_id, draw_type_id) -> lista de 100 enteros (índice = número)
+        """
+        pairs = sorted(set(pairs))
+        if not pairs:
+            return {}
+        conn = ExposureBoardService._redis()
+        if conn is None:
+            return ExposureBoardService._load(pairs, sale_date)
+
+        keys = [ExposureBoardService._key(zone_id, draw_type_id, sale_date) for zone_id, draw_type_id in pairs]
+        try:
+            packed = conn.mget(keys)
+        except Exception:
+            logger.warning('Tablero de exposición sin Redis, leyendo desde la base', exc_info=True)
+            return ExposureBoardService._load(pairs, sale_date)
+
+        boards = {pair: list(struct.unpack(BOARD_FORMAT, value)) for pair, value in zip(pairs, packed) if value}
+        missing = [pair for pair in pairs if pair not in boards]
+        if missing:
+            rebuilt = ExposureBoardService._load(missing, sale_date)
+            ExposureBoardService._store(conn, rebuilt, sale_date, only_missing=True)
+            boards.update(rebuilt)
+        return boards
+
+    @staticmethod
+    def rebuild(pairs: Iterable[BoardKey], sale_date: date) -> Dict[BoardKey, List[int]]:
+        """Recalcula los tableros desde la base y los reemplaza en Redis"""
+        pairs = sorted(set(pairs))
+        boards = ExposureBoardService._load(pairs, sale_date)
+        conn = ExposureBoardService._redis()
+        if conn is not None and boards:
+            ExposureBoardService._store(conn, boards, sale_date, only_missing=False)
+        return boards
+
+    @staticmethod
+    def _load(pairs: List[BoardKey], sale_date: date) -> Dict[BoardKey, List[int]]:
+        """Arma los tableros desde el acumulado diario con una sola consulta"""
+        boards = {pair: [0] * BOARD_SLOTS for pair in pairs}
+        condition = Q()
+        for zone_id, draw_type_id in pairs:
+            condition |= Q(zone_id=zone_id, draw_type_id=draw_type_id)
+        rows = NumberExposure.objects.filter(condition, sale_date=sale_date).values_list(
+            'zone_id', 'draw_type_id', 'number', 'sold_pieces'
+        )
+        for zone_id, draw_type_id, number, sold in rows:
+            boards[(zone_id, draw_type_id)][int(number)] = sold
+        return boards
+
+    @staticmethod
+    def _store(conn, boards: Dict[BoardKey, List[int]], sale_date: date, only_missing: bool) -> None:
+        ttl = getattr(settings, 'EXPOSURE_BOARD_TTL', 300)
+        try:
+            pipe = conn.pipeline(transaction=False)
+            for (zone_id, draw_type_id), sold in boards.items():
+                pipe.set(
+                    ExposureBoardService._key(zone_id, draw_type_id, sale_date),
+                    struct.pack(BOARD_FORMAT, *sold),
+                    ex=ttl,
+                    nx=only_missing,
+                )
+            pipe.execute()
+        except Exception:
+            logger.warning('No se pudo guardar el tablero de exposición', exc_info=True)
+
+    @staticmethod
+    def _key(zone_id: int, draw_type_id: int, sale_date: date) -> str:
+        return BOARD_KEY.format(zone_id=zone_id, draw_type_id=draw_type_id, sale_date=sale_date.isoformat())
+
+    @staticmethod
+    def _seq_key(zone_id: int, draw_type_id: int, sale_date: date) -> str:
+        return SEQ_KEY.format(zone_id=zone_id, draw_type_id=draw_type_id, sale_date=sale_date.isoformat())
+
+    @staticmethod
+    def _redis():
+        """Conexión de django-redis, o None si el cache no es Redis (tests, desarrollo)"""
+        try:
+            from django_redis import get_redis_connection
+
+            return get_redis_connection('default')
+        except Exception:
+            return None
+
+    @staticmethod
+    def _script(conn):
+        global _apply_script
+        if _apply_script is None:
+            _apply_script = conn.register_script(APPLY_SCRIPT)
+        return _apply_script
@@ -0,0 +1,197 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .exposure_board import ExposureBoardService
+from .exposure_stream import ExposureStream
+from .models import NumberExposure
+
+# (zone_id, draw_type_id, número)
+ExposureKey = Tuple[int, int, str]
+
+
+class ExposureLimitExceeded(Exception):
+    """Se lanza cuando una venta supera el tope acumulado de un número"""
+
+    def __init__(self, number: str, sold: int, pieces: int, max_allowed: int):
+        self.number = number
+        self.sold = sold
+        self.pieces = pieces
+        self.max_allowed = max_allowed
+        super().__init__(
+            f'Tope acumulado excedido para el número {number}: {sold}+{pieces} > {max_allowed}.'
+        )
+
+
+class ExposureService:
+    """Servicio para el acumulado diario de pedazos vendidos por número"""
+
+    @staticmethod
+    def get_sold_pieces(zone_id: int, draw_type_id: int, sale_date: date, numbers: Iterable[str]) -> Dict[str, int]:
+        """
+        Obtiene en una sola consulta los pedazos vendidos de varios números
+
+        Returns:
+            Dict número -> pedazos vendidos (los números sin ventas no aparecen)
+        """
+        numbers = list(numbers)
+        if not numbers:
+            return {}
+        rows = ExposureService._filter(zone_id, draw_type_id, sale_date, numbers)
+        return dict(rows.values_list('number', 'sold_pieces'))
+
+    @staticmethod
+    def reserve(
+        zone_id: int,
+        draw_type_id: int,
+        sale_date: date,
+        pieces_by_number: Dict[str, int],
+        limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """
+        Reserva pedazos en el acumulado verificando los topes bajo bloqueo
+
+        Las filas del acumulado se bloquean con SELECT ... FOR UPDATE (ver
+        lock_many) y los topes se comprueban contra los valores bloqueados,
+        por lo que dos ventas simultáneas del mismo número no pueden exceder
+        el tope. Solo se serializan las ventas que comparten números, no la
+        zona completa.
+
+        Debe llamarse dentro de la misma transacción que crea el ticket.
+
+        Raises:
+            ExposureLimitExceeded: si algún número supera su tope
+        """
+        if not pieces_by_number:
+            return
+        limits = limits or {}
+        pieces_by_key = {(zone_id, draw_type_id, number): pieces for number, pieces in pieces_by_number.items()}
+        locked = ExposureService.lock_many(sale_date, pieces_by_key)
+        for key in sorted(pieces_by_key):
+            number = key[2]
+            max_allowed = limits.get(number)
+            sold = locked.get(key, 0)
+            pieces = pieces_by_key[key]
+            if max_allowed is not None and sold + pieces > max_allowed:
+                raise ExposureLimitExceeded(number, sold, pieces, max_allowed)
+        ExposureService.increment_many(sale_date, pieces_by_key, locked)
+
+    @staticmethod
+    def lock_many(sale_date: date, keys: Iterable[ExposureKey]) -> Dict[ExposureKey, int]:
+        """
+        Crea las filas que falten y bloquea las de varios pares zona+sorteo
+
+        El bloqueo se toma en orden (zona, sorteo, número) para que ventas
+        concurrentes con números cruzados no provoquen deadlocks.
+
+        Returns:
+            Dict (zone_id, draw_type_id, número) -> pedazos vendidos bloqueados
+        """
+        keys = sorted(set(keys))
+        if not keys:
+            return {}
+        NumberExposure.objects.bulk_create(
+            [
+                NumberExposure(zone_id=zone_id, draw_type_id=draw_type_id, sale_date=sale_date, number=number)
+                for zone_id, draw_type_id, number in keys
+            ],
+            ignore_conflicts=True,
+        )
+        rows = (
+            ExposureService._filter_many(sale_date, keys)
+            .select_for_update()
+            .order_by('zone_id', 'draw_type_id', 'number')
+            .values_list('zone_id', 'draw_type_id', 'number', 'sold_pieces')
+        )
+        return {(zone_id, draw_type_id, number): sold for zone_id, draw_type_id, number, sold in rows}
+
+    @staticmethod
+    def increment_many(
+        sale_date: date,
+        pieces_by_key: Dict[ExposureKey, int],
+        sold: Optional[Dict[ExposureKey, int]] = None,
+    ) -> None:
+        """
+        Suma pedazos a filas ya existentes del acumulado con un único UPDATE
+
+        Al confirmar la transacción se reflejan en el tablero de Redis y se
+        publican en vivo; `sold` (lo bloqueado por lock_many) permite avisar
+        de los números que cruzan un umbral de su tope.
+        """
+        if not pieces_by_key:
+            return
+        ExposureService._filter_many(sale_date, pieces_by_key).update(
+            sold_pieces=F('sold_pieces') + ExposureService._delta_many(pieces_by_key)
+        )
+        transaction.on_commit(lambda: ExposureService._on_change(sale_date, pieces_by_key, sold))
+
+    @staticmethod
+    def release(zone_id: int, draw_type_id: int, sale_date: date, pieces_by_number: Dict[str, int]) -> None:
+        """
+        Descuenta pedazos del acumulado (p.ej. al eliminar un ticket)
+
+        Las filas se bloquean primero en el mismo orden que reserve (número
+        dentro de zona+sorteo), así una eliminación y una venta simultáneas
+        con números cruzados no se bloquean mutuamente.
+        """
+        if not pieces_by_number:
+            return
+        rows = ExposureService._filter(zone_id, draw_type_id, sale_date, pieces_by_number)
+        with transaction.atomic():
+            list(rows.select_for_update().order_by('number').values_list('id', flat=True))
+            rows.update(
+                sold_pieces=Greatest(F('sold_pieces') - ExposureService._delta(pieces_by_number), Value(0))
+            )
+        pieces_by_key = {(zone_id, draw_type_id, number): -pieces for number, pieces in pieces_by_number.items()}
+        transaction.on_commit(lambda: ExposureService._on_change(sale_date, pieces_by_key))
+
+    @staticmethod
+    def _on_change(
+        sale_date: date,
+        pieces_by_key: Dict[ExposureKey, int],
+        sold: Optional[Dict[ExposureKey, int]] = None,
+    ) -> None:
+        seqs = ExposureBoardService.apply(sale_date, pieces_by_key)
+        ExposureStream.publish(sale_date, pieces_by_key, sold, seqs)
+
+    @staticmethod
+    def _filter(zone_id: int, draw_type_id: int, sale_date: date, numbers: Iterable[str]):
+        return NumberExposure.objects.filter(
+            zone_id=zone_id,
+            draw_type_id=draw_type_id,
+            sale_date=sale_date,
+            number__in=list(numbers),
+        )
+
+    @staticmethod
+    def _filter_many(sale_date: date, keys: Iterable[ExposureKey]):
+        numbers_by_pair: Dict[Tuple[int, int], List[str]] = {}
+        for zone_id, draw_type_id, number in keys:
+            numbers_by_pair.setdefault((zone_id, draw_type_id), []).append(number)
+        condition = Q()
+        for (zone_id, draw_type_id), numbers in numbers_by_pair.items():
+            condition |= Q(zone_id=zone_id, draw_type_id=draw_type_id, number__in=numbers)
+        return NumberExposure.objects.filter(condition, sale_date=sale_date)
+
+    @staticmethod
+    def _delta_many(pieces_by_key: Dict[ExposureKey, int]) -> Case:
+        return Case(
+            *[
+                When(zone_id=zone_id, draw_type_id=draw_type_id, number=number, then=Value(pieces))
+                for (zone_id, draw_type_id, number), pieces in pieces_by_key.items()
+            ],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    @staticmethod
+    def _delta(pieces_by_number: Dict[str, int]) -> Case:
+        """Expresión CASE con los pedazos de cada número, para un único UPDATE"""
+        return Case(
+            *[When(number=number, then=Value(pieces)) for number, pieces in pieces_by_number.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
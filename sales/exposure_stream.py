@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from catalog.cache_service import CatalogCacheService
+
+logger = logging.getLogger(__name__)
+
+# (zone_id, draw_type_id, número)
+ExposureKey = Tuple[int, int, str]
+
+# Mensajes confirmados a la espera del hilo que los envía, en orden
+_pending: List[Tuple[str, Dict[str, Any]]] = []
+_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+
+def group_name(zone_id: int, draw_type_id: int) -> str:
+    """Grupo de Channels al que se suscriben los tableros de una zona+sorteo"""
+    return f'exposure_{zone_id}_{draw_type_id}'
+
+
+class ExposureStream:
+    """
+    Publicación en vivo de los pedazos vendidos por número
+
+    Cada cambio confirmado se publica en el grupo de su zona+sorteo con el
+    número de secuencia que le asignó el tablero en Redis; un hilo los envía
+    cada EXPOSURE_STREAM_INTERVAL segundos para no esperar al channel layer
+    dentro de la petición. Aquí no se acumulan: cada conexión
+    (notifications.consumers.ExposureConsumer) descarta los cambios que su
+    snapshot ya incluye y agrupa el resto antes de enviarlo al navegador.
+    """
+
+    @staticmethod
+    def publish(
+        sale_date: date,
+        pieces_by_key: Dict[ExposureKey, int],
+        sold: Optional[Dict[ExposureKey, int]] = None,
+        seqs: Optional[Dict[Tuple[int, int], int]] = None,
+    ) -> None:
+        """
+        Encola un cambio de pedazos vendidos (negativos al liberar) para el próximo envío
+
+        Args:
+            sold: pedazos vendidos antes de esta venta; con ellos se detecta
+                si algún número cruzó un umbral de su tope
+            seqs: secuencia del cambio por (zone_id, draw_type_id), de
+                ExposureBoardService.apply
+        """
+        if not pieces_by_key:
+            return
+        try:
+            warnings = ExposureStream._warnings_for(pieces_by_key, sold) if sold is not None else []
+        except Exception:
+            # La venta ya está confirmada: sin catálogo se publican solo los pedazos
+            logger.warning('No se pudieron calcular los avisos de tope', exc_info=True)
+            warnings = []
+        seqs = seqs or {}
+        messages: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for (zone_id, draw_type_id, number), pieces in pieces_by_key.items():
+            message = messages.setdefault((zone_id, draw_type_id), {
+                'type': 'exposure.delta',
+                'zone': zone_id,
+                'draw_type': draw_type_id,
+                'date': str(sale_date),
+                'seq': seqs.get((zone_id, draw_type_id)),
+                'deltas': {},
+                'warnings': [],
+            })
+            message['deltas'][number] = message['deltas'].get(number, 0) + pieces
+        for zone_id, draw_type_id, warning in warnings:
+            messages[(zone_id, draw_type_id)]['warnings'].append(warning)
+        with _lock:
+            _pending.extend(
+                (group_name(zone_id, draw_type_id), message) for (zone_id, draw_type_id), message in messages.items()
+            )
+        ExposureStream._ensure_flusher()
+
+    @staticmethod
+    def flush() -> int:
+        """Envía los cambios encolados a los grupos; devuelve la cantidad de mensajes"""
+        global _pending
+        with _lock:
+            messages, _pending = _pending, []
+        if messages:
+            channel_layer = get_channel_layer()
+            if channel_layer is None:
+                return 0
+            async_to_sync(_send_all)(channel_layer, messages)
+        return len(messages)
+
+    @staticmethod
+    def _warnings_for(
+        pieces_by_key: Dict[ExposureKey, int], sold: Dict[ExposureKey, int]
+    ) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """Números que con esta venta cruzaron un umbral (el más alto) de su tope"""
+        thresholds = sorted(getattr(settings, 'EXPOSURE_WARNING_THRESHOLDS', (80, 100)), reverse=True)
+        catalog = CatalogCacheService.get_snapshot()
+        warnings = []
+        for (zone_id, draw_type_id, number), pieces in pieces_by_key.items():
+            limit = catalog.get_limits(zone_id, draw_type_id).get(number)
+            if not limit or pieces <= 0:
+                continue
+            before = sold.get((zone_id, draw_type_id, number), 0)
+            after = before + pieces
+            for threshold in thresholds:
+                # Comparación entera: before < limit * threshold / 100 <= after
+                if before * 100 < limit * threshold <= after * 100:
+                    warnings.append((zone_id, draw_type_id, {
+                        'number': number, 'threshold': threshold, 'sold': after, 'limit': limit,
+                    }))
+                    break
+        return warnings
+
+    @staticmethod
+    def _ensure_flusher() -> None:
+        global _flusher
+        if _flusher is not None and _flusher.is_alive():
+            return
+        with _lock:
+            if _flusher is None or not _flusher.is_alive():
+                _flusher = threading.Thread(target=_flush_loop, name='exposure-stream', daemon=True)
+                _flusher.start()
+
+
+async def _send_all(channel_layer, messages) -> None:
+    for group, message in messages:
+        await channel_layer.group_send(group, message)
+
+
+def _flush_loop() -> None:
+    interval = getattr(settings, 'EXPOSURE_STREAM_INTERVAL', 0.25)
+    while True:
+        time.sleep(interval)
+        try:
+            ExposureStream.flush()
+        except Exception:
+            logger.warning('No se pudo publicar la exposición en vivo', exc_info=True)
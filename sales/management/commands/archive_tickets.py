@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.archive import TicketArchiveService
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los días cerrados de tickets e items a archivos Parquet bajo MEDIA_ROOT '
+        'y los elimina de la base (correr a diario)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            help='Archivar los días con más de N días de antigüedad (por defecto TICKET_ARCHIVE_AFTER_DAYS)',
+        )
+        parser.add_argument('--day', help='Archivar solo esta fecha YYYY-MM-DD')
+        parser.add_argument('--dry-run', action='store_true', help='Solo listar los días a archivar')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        older_than = options['older_than']
+        if older_than is None:
+            older_than = getattr(settings, 'TICKET_ARCHIVE_AFTER_DAYS', 90)
+        if older_than < 0:
+            raise CommandError('--older-than debe ser mayor o igual que 0')
+
+        if options['day']:
+            try:
+                day = date.fromisoformat(options['day'])
+            except ValueError as exc:
+                raise CommandError(f'Fecha inválida: {exc}')
+            if day >= today:
+                raise CommandError('Solo se pueden archivar días cerrados (anteriores a hoy)')
+            days = [day]
+        else:
+            days = TicketArchiveService.pending_days(today - timedelta(days=older_than))
+
+        if not days:
+            self.stdout.write('No hay días para archivar')
+            return
+        for day in days:
+            if options['dry_run']:
+                self.stdout.write(f'{day}: pendiente')
+                continue
+            archived = TicketArchiveService.archive_day(day)
+            if archived is None:
+                self.stdout.write(f'{day}: sin tickets')
+                continue
+            self.stdout.write(f'{day}: {archived.tickets} tickets, {archived.items} items archivados')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Días archivados: {len(days)} en {TicketArchiveService.root()}'))
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.partitioning import TicketPartitionService
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea por adelantado las particiones diarias de tickets e items y separa las antiguas '
+        '(PostgreSQL; correr a diario)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=14, help='Días a futuro a crear (por defecto 14)')
+        parser.add_argument(
+            '--retain-days', type=int,
+            help='Separar las particiones que terminan antes de hoy menos N días',
+        )
+        parser.add_argument('--drop', action='store_true', help='Eliminar las particiones separadas')
+
+    def handle(self, *args, **options):
+        if not TicketPartitionService.is_supported():
+            raise CommandError('Las tablas de tickets no están particionadas (requiere PostgreSQL y la migración 0007)')
+        if options['ahead'] < 0:
+            raise CommandError('--ahead debe ser mayor o igual que 0')
+
+        today = timezone.localdate()
+        created = TicketPartitionService.ensure_daily(today, today + timedelta(days=options['ahead']))
+        self.stdout.write(self.style.SUCCESS(f'Particiones creadas: {len(created)}'))
+        for name in created:
+            self.stdout.write(f'  + {name}')
+
+        if options['retain_days'] is not None:
+            if options['retain_days'] < 1:
+                raise CommandError('--retain-days debe ser mayor que 0')
+            cutoff = today - timedelta(days=options['retain_days'])
+            detached = TicketPartitionService.detach_before(cutoff, drop=options['drop'])
+            action = 'eliminadas' if options['drop'] else 'separadas'
+            self.stdout.write(self.style.SUCCESS(f'Particiones {action} (anteriores a {cutoff}): {len(detached)}'))
+            for name in detached:
+                self.stdout.write(f'  - {name}')
+
+        pending = TicketPartitionService.default_rows()
+        if pending:
+            self.stdout.write(self.style.WARNING(
+                f'La partición DEFAULT tiene {pending} tickets: faltaban particiones para esas fechas'
+            ))
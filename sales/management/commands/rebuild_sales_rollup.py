@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sales.rollup_service import SalesRollupService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales diarios de ventas (rollup de reportes) para un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Fecha inicial YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument('--end', help='Fecha final YYYY-MM-DD, inclusive (por defecto igual a --start)')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else timezone.localdate()
+            end = date.fromisoformat(options['end']) if options['end'] else start
+        except ValueError as exc:
+            raise CommandError(f'Fecha inválida: {exc}')
+        if end < start:
+            raise CommandError('--end debe ser mayor o igual que --start')
+
+        rows = SalesRollupService.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rollup recalculado del {start} al {end}: {rows} filas'))
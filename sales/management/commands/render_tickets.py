@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.batch_pdf import TicketBatchRenderer
+from sales.exports import build_ticket_filters
+from sales.renderers import get_renderer
+
+
+class Command(BaseCommand):
+    help = 'Renderiza un rango de tickets en un PDF de varias páginas o en un ZIP (reimpresión de cierre)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Archivo de salida (.pdf o .zip)')
+        parser.add_argument('--start', help='Fecha inicial YYYY-MM-DD')
+        parser.add_argument('--end', help='Fecha final YYYY-MM-DD, inclusive')
+        parser.add_argument('--zone', help='IDs de zona separados por coma')
+        parser.add_argument('--draw-type', help='IDs de sorteo separados por coma')
+        parser.add_argument('--user', help='IDs de vendedor separados por coma')
+        parser.add_argument('--renderer', help='html, thermal o escpos (por defecto TICKET_PDF_RENDERER)')
+        parser.add_argument('--processes', type=int, help='Procesos del pool (por defecto uno por núcleo)')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        output = 'zip' if path.lower().endswith('.zip') else 'pdf'
+        try:
+            renderer = get_renderer(options['renderer'])
+            filters = build_ticket_filters(
+                options['start'], options['end'], options['zone'], options['draw_type'], options['user'],
+            )
+            tickets = TicketBatchRenderer.load(filters)
+            if not tickets:
+                raise CommandError('No hay tickets para los filtros indicados')
+            out = TicketBatchRenderer.render(tickets, renderer, output, options['processes'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        with out, open(path, 'wb') as f:
+            for chunk in iter(lambda: out.read(1024 * 1024), b''):
+                f.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f'{len(tickets)} tickets escritos en {path}'))
@@ -0,0 +1,48 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from sales.export_jobs import ExportJobService, run_export_job
+from sales.process_pool import new_process_pool
+
+
+class Command(BaseCommand):
+    help = 'Procesa las exportaciones encoladas en Redis con un pool de procesos (EXPORT_JOBS_BACKEND=redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Procesos del pool (por defecto EXPORT_JOBS_WORKERS)')
+        parser.add_argument('--poll-timeout', type=int, default=5, help='Segundos de espera en BLPOP')
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or settings.EXPORT_JOBS_WORKERS
+        queue_key = settings.EXPORT_JOBS_QUEUE_KEY
+        conn = get_redis_connection('default')
+        # Solo se saca un trabajo de la cola cuando hay un proceso libre,
+        # así los pendientes quedan en Redis para otros workers
+        free = threading.BoundedSemaphore(processes)
+
+        self.stdout.write(f'Worker de exportaciones: {processes} procesos, cola {queue_key}')
+        next_reap = 0.0
+        with new_process_pool(processes) as pool:
+            try:
+                while True:
+                    if time.monotonic() >= next_reap:
+                        # Trabajos que quedaron en curso por un worker caído
+                        reaped = ExportJobService.reap_stale()
+                        if reaped:
+                            self.stdout.write(f'{reaped} exportaciones sin latido marcadas como fallidas')
+                        next_reap = time.monotonic() + settings.EXPORT_JOBS_HEARTBEAT_SECONDS
+                    free.acquire()
+                    item = conn.blpop(queue_key, timeout=options['poll_timeout'])
+                    if item is None:
+                        free.release()
+                        continue
+                    job_id = item[1].decode()
+                    future = pool.submit(run_export_job, job_id)
+                    future.add_done_callback(lambda f: free.release())
+            except KeyboardInterrupt:
+                self.stdout.write('Deteniendo worker; esperando los trabajos en curso...')
+        self.stdout.write(self.style.SUCCESS('Worker detenido'))
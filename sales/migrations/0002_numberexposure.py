@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-17 22:53
+
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def backfill_today(apps, schema_editor):
+    """Carga el acumulado del día en curso; los días cerrados no se consultan para topes."""
+    TicketItem = apps.get_model('sales', 'TicketItem')
+    NumberExposure = apps.get_model('sales', 'NumberExposure')
+    today = timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today, time.min))
+    rows = (
+        TicketItem.objects
+        .filter(ticket__created_at__gte=start, ticket__created_at__lt=start + timedelta(days=1))
+        .values('ticket__zone_id', 'ticket__draw_type_id', 'number')
+        .annotate(total=Sum('pieces'))
+        .order_by()
+    )
+    NumberExposure.objects.bulk_create([
+        NumberExposure(
+            zone_id=row['ticket__zone_id'],
+            draw_type_id=row['ticket__draw_type_id'],
+            sale_date=today,
+            number=row['number'],
+            sold_pieces=row['total'] or 0,
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('catalog', '0002_zone_description'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberExposure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_date', models.DateField()),
+                ('number', models.CharField(max_length=2)),
+                ('sold_pieces', models.PositiveIntegerField(default=0)),
+                ('draw_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.drawtype')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.zone')),
+            ],
+            options={
+                'unique_together': {('zone', 'draw_type', 'sale_date', 'number')},
+            },
+        ),
+        migrations.RunPython(backfill_today, migrations.RunPython.noop),
+    ]
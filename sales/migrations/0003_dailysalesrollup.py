@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    """Carga el rollup con todo el histórico en una sola pasada agrupada."""
+    Ticket = apps.get_model('sales', 'Ticket')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+    rows = (
+        Ticket.objects
+        .annotate(sale_date=TruncDate('created_at'))
+        .values('sale_date', 'zone_id', 'draw_type_id', 'user_id')
+        .annotate(tickets=Count('id'), pieces=Sum('total_pieces'))
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        (
+            DailySalesRollup(
+                sale_date=row['sale_date'],
+                zone_id=row['zone_id'],
+                draw_type_id=row['draw_type_id'],
+                user_id=row['user_id'],
+                total_tickets=row['tickets'],
+                total_pieces=row['pieces'] or 0,
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('catalog', '0002_zone_description'),
+        ('sales', '0002_numberexposure'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_date', models.DateField()),
+                ('total_tickets', models.PositiveIntegerField(default=0)),
+                ('total_pieces', models.PositiveBigIntegerField(default=0)),
+                ('draw_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.drawtype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.zone')),
+            ],
+            options={
+                'unique_together': {('sale_date', 'zone', 'draw_type', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
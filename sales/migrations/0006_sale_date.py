@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import TruncDate
+
+
+def backfill_sale_date(apps, schema_editor):
+    """Fecha local de venta de los tickets existentes, copiada luego a sus items."""
+    Ticket = apps.get_model('sales', 'Ticket')
+    TicketItem = apps.get_model('sales', 'TicketItem')
+    Ticket.objects.update(sale_date=TruncDate('created_at'))
+    TicketItem.objects.update(
+        sale_date=Subquery(Ticket.objects.filter(pk=OuterRef('ticket_id')).values('sale_date')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_ticket_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='ticketitem',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='sale_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticketitem',
+            name='sale_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.RunPython(backfill_sale_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ticketitem',
+            name='ticket',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='sales.ticket'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ticketitem',
+            unique_together={('ticket', 'number', 'sale_date')},
+        ),
+    ]
@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+# Días a futuro que se crean de antemano (luego: manage.py manage_ticket_partitions)
+DAYS_AHEAD = 7
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _ranges(first_day, today):
+    """Histórico en particiones mensuales; desde el mes actual, diarias."""
+    ranges = []
+    current_month = _month_start(today)
+    if first_day is not None:
+        month = _month_start(first_day)
+        while month < current_month:
+            ranges.append((f'p{month:%Y%m}', month, _next_month(month)))
+            month = _next_month(month)
+    day = current_month
+    while day <= today + timedelta(days=DAYS_AHEAD):
+        ranges.append((f'p{day:%Y%m%d}', day, day + timedelta(days=1)))
+        day += timedelta(days=1)
+    return ranges
+
+
+def partition_tables(apps, schema_editor):
+    """
+    Convierte sales_ticket y sales_ticketitem en tablas particionadas por sale_date.
+
+    Solo PostgreSQL; en otros motores no hace nada. Copia los datos en la
+    misma transacción, así que en tablas grandes conviene correrla en una
+    ventana de mantenimiento.
+
+    La clave primaria pasa a ser (id, sale_date), pero el estado de Django
+    sigue declarando pk=id (no hay claves compuestas en los modelos): una
+    búsqueda solo por id revisa todas las particiones, por eso las consultas
+    que conocen la fecha filtran también por sale_date. Las filas con fecha
+    sin partición caen en <tabla>_default; manage_ticket_partitions las mueve
+    al crear la partición del día.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    user_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(sale_date) FROM sales_ticket')
+        first_day = cursor.fetchone()[0]
+        ranges = _ranges(first_day, timezone.localdate())
+
+        for table in ('sales_ticket', 'sales_ticketitem'):
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+            # Los nombres de índices son globales: liberar <tabla>_pkey para la tabla nueva
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                [f'{table}_legacy'],
+            )
+            pkey = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE {table}_legacy RENAME CONSTRAINT {pkey} TO {table}_legacy_pkey')
+            cursor.execute(
+                f'CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE (sale_date)'
+            )
+            cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, sale_date)')
+            for suffix, start, end in ranges:
+                cursor.execute(
+                    f'CREATE TABLE {table}_{suffix} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                    [start.isoformat(), end.isoformat()],
+                )
+            cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+            cursor.execute(f'INSERT INTO {table} SELECT * FROM {table}_legacy')
+
+        cursor.execute('DROP TABLE sales_ticketitem_legacy, sales_ticket_legacy CASCADE')
+
+        # Secuencias de id (las identity de las tablas anteriores se fueron con ellas)
+        for table in ('sales_ticket', 'sales_ticketitem'):
+            cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+            cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+            cursor.execute(
+                f"SELECT setval('{table}_id_seq', COALESCE(max(id), 1), max(id) IS NOT NULL) FROM {table}"
+            )
+
+        # Todos los índices del estado de migraciones (Meta.indexes y los db_index
+        # de las FK), con los nombres de Django; se propagan a cada partición
+        for model_name in ('Ticket', 'TicketItem'):
+            for statement in schema_editor._model_indexes_sql(apps.get_model('sales', model_name)):
+                cursor.execute(str(statement))
+
+        # Claves foráneas
+        for column, target in (
+            ('zone_id', 'catalog_zone'),
+            ('draw_type_id', 'catalog_drawtype'),
+            ('user_id', user_table),
+        ):
+            cursor.execute(
+                f'ALTER TABLE sales_ticket ADD CONSTRAINT sales_ticket_{column}_fk '
+                f'FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED'
+            )
+        cursor.execute(
+            'ALTER TABLE sales_ticketitem ADD CONSTRAINT sales_ticketitem_ticket_number_sale_date_uniq '
+            'UNIQUE (ticket_id, number, sale_date)'
+        )
+        cursor.execute(
+            'ALTER TABLE sales_ticketitem ADD CONSTRAINT sales_ticketitem_ticket_fk '
+            'FOREIGN KEY (ticket_id, sale_date) REFERENCES sales_ticket (id, sale_date) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_sale_date'),
+        ('catalog', '0002_zone_description'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-17 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_partition_tickets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_date', models.DateField(unique=True)),
+                ('tickets', models.PositiveIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('total_pieces', models.PositiveBigIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_archivedsalesday'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticketitem',
+            name='sale_date',
+            field=models.DateField(editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_ticketitem_sale_date_from_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='exportjob',
+            index=models.Index(fields=['status', 'heartbeat_at'], name='sales_expor_status_a8c608_idx'),
+        ),
+    ]
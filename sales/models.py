@@ -1,28 +1,154 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class Ticket(models.Model):
+    # En PostgreSQL la clave primaria real es (id, sale_date) (migración 0007);
+    # Django solo ve id. Una búsqueda únicamente por pk revisa cada partición:
+    # cuando se conoce la fecha conviene filtrar también por sale_date.
     created_at = models.DateTimeField(auto_now_add=True)
     zone = models.ForeignKey('catalog.Zone', on_delete=models.PROTECT)
     draw_type = models.ForeignKey('catalog.DrawType', on_delete=models.PROTECT)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     total_pieces = models.PositiveIntegerField(default=0)
+    # Fecha local de venta: clave de partición (ver migración 0007)
+    sale_date = models.DateField(default=timezone.localdate, editable=False)
+
+    class Meta:
+        # Reportes, exportaciones y reimpresiones filtran por rango semiabierto
+        # de created_at, solo o junto a zona+sorteo o vendedor
+        indexes = [
+            models.Index(fields=['created_at'], name='ticket_created_idx'),
+            models.Index(fields=['zone', 'draw_type', 'created_at'], name='ticket_zone_draw_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='ticket_user_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"Ticket #{self.pk} - {self.zone} - {self.draw_type}"
 
 
+class TicketItemQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create no pasa por save(): copiar aquí la fecha del ticket
+        objs = list(objs)
+        for item in objs:
+            item.sale_date = item.ticket.sale_date
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class TicketItem(models.Model):
-    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='items')
+    # En PostgreSQL la integridad la garantiza la FK compuesta (ticket_id, sale_date)
+    # de la tabla particionada; Django solo ve la relación por ticket_id
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='items', db_constraint=False)
     number = models.CharField(max_length=2)
     pieces = models.PositiveIntegerField(default=1)
+    # Copia de ticket.sale_date para particionar igual que Ticket (ver save)
+    sale_date = models.DateField(editable=False)
+
+    objects = TicketItemQuerySet.as_manager()
 
     class Meta:
-        unique_together = ('ticket', 'number')
+        unique_together = ('ticket', 'number', 'sale_date')
 
     def __str__(self) -> str:
         return f"{self.number} x {self.pieces}"
 
+    def save(self, *args, **kwargs):
+        # Siempre la fecha del ticket: la FK compuesta (ticket_id, sale_date) lo exige
+        self.sale_date = self.ticket.sale_date
+        super().save(*args, **kwargs)
 
 
+class NumberExposure(models.Model):
+    # Acumulado diario de pedazos vendidos por zona + sorteo + número
+    zone = models.ForeignKey('catalog.Zone', on_delete=models.CASCADE)
+    draw_type = models.ForeignKey('catalog.DrawType', on_delete=models.CASCADE)
+    sale_date = models.DateField()
+    number = models.CharField(max_length=2)
+    sold_pieces = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('zone', 'draw_type', 'sale_date', 'number')
+
+    def __str__(self) -> str:
+        return f"{self.zone}-{self.draw_type} {self.sale_date} #{self.number}: {self.sold_pieces}"
+
+
+class DailySalesRollup(models.Model):
+    # Totales diarios por zona + sorteo + vendedor, mantenidos al emitir tickets
+    sale_date = models.DateField()
+    zone = models.ForeignKey('catalog.Zone', on_delete=models.CASCADE)
+    draw_type = models.ForeignKey('catalog.DrawType', on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    total_tickets = models.PositiveIntegerField(default=0)
+    total_pieces = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('sale_date', 'zone', 'draw_type', 'user')
+
+    def __str__(self) -> str:
+        return f"{self.sale_date} {self.zone}-{self.draw_type} {self.user}: {self.total_tickets}/{self.total_pieces}"
+
+
+class ArchivedSalesDay(models.Model):
+    # Día cerrado cuyos tickets, items y totales se movieron a archivos Parquet (ver archive.py)
+    sale_date = models.DateField(unique=True)
+    tickets = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    total_pieces = models.PositiveBigIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.sale_date}: {self.tickets} tickets archivados"
+
+
+class ExportJob(models.Model):
+    # Exportación generada fuera del request por el pool de workers
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_RUNNING, 'En proceso'),
+        (STATUS_DONE, 'Completado'),
+        (STATUS_FAILED, 'Fallido'),
+    ]
+    LEVEL_CHOICES = [
+        ('summary', 'Resumen'),
+        ('tickets', 'Detalle de tickets'),
+        ('items', 'Detalle de números'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='export_jobs')
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='summary')
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES, default='csv')
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows_written = models.PositiveBigIntegerField(default=0)
+    file = models.FileField(upload_to='exports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Último latido del worker mientras el trabajo está en curso
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['status', 'heartbeat_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"Export {self.pk} {self.level}.{self.format} ({self.status})"
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TicketCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre -id
+
+    Cada página es un rango `id < cursor` resuelto con el índice de la clave
+    primaria, así el costo no crece con la posición como con OFFSET.
+    """
+
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
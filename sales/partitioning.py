@@ -0,0 +1,169 @@
+import re
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional
+
+from django.db import connection, transaction
+
+# Orden de creación; al separar particiones se recorre al revés (items primero,
+# por la FK compuesta hacia sales_ticket)
+PARTITIONED_TABLES = ('sales_ticket', 'sales_ticketitem')
+
+_BOUND_RE = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    # Rango semiabierto [start, end); None en la partición DEFAULT
+    start: Optional[date]
+    end: Optional[date]
+
+
+class TicketPartitionService:
+    """
+    Particiones por fecha de venta (sale_date) de tickets e items
+
+    Solo aplica en PostgreSQL con las tablas ya particionadas por la
+    migración 0007. Las particiones nuevas son diarias: así las consultas del
+    día y el vacuum solo tocan los datos de un día.
+    """
+
+    @staticmethod
+    def is_supported() -> bool:
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('sales_ticket')")
+            row = cursor.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    @staticmethod
+    def list_partitions(table: str) -> List[Partition]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                ORDER BY c.relname
+                """,
+                [table],
+            )
+            rows = cursor.fetchall()
+        partitions = []
+        for name, bound in rows:
+            match = _BOUND_RE.search(bound)
+            if match:
+                partitions.append(Partition(name, date.fromisoformat(match[1]), date.fromisoformat(match[2])))
+            else:
+                partitions.append(Partition(name, None, None))
+        return partitions
+
+    @staticmethod
+    def ensure_daily(start: date, end: date) -> List[str]:
+        """
+        Crea las particiones diarias que falten entre start y end (inclusive)
+
+        Si la partición DEFAULT ya tiene filas de alguno de esos días (se
+        vendió antes de crear su partición), se mueven a la partición nueva
+        en la misma transacción; PostgreSQL no permite crearla mientras
+        DEFAULT tenga filas de su rango. Los items se mueven primero a una
+        tabla aún sin adjuntar: así el ON DELETE CASCADE de la FK compuesta
+        (migración 0007) no los alcanza al mover sus tickets, y la FK no se
+        quita. Al adjuntar, PostgreSQL valida la FK solo en la partición nueva.
+
+        Returns:
+            Nombres de las particiones creadas
+        """
+        created = []
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT sale_date FROM sales_ticket_default WHERE sale_date BETWEEN %s AND %s '
+                    'UNION SELECT sale_date FROM sales_ticketitem_default WHERE sale_date BETWEEN %s AND %s',
+                    [start, end, start, end],
+                )
+                stray = {row[0] for row in cursor.fetchall()}
+            missing = {
+                table: TicketPartitionService._missing_days(table, start, end) for table in PARTITIONED_TABLES
+            }
+
+            # Items con fecha sin partición: a su tabla nueva antes de mover los tickets
+            moved = {
+                TicketPartitionService._move_default_rows('sales_ticketitem', day)
+                for day in missing['sales_ticketitem'] if day in stray
+            }
+            for table in PARTITIONED_TABLES:
+                for day in missing[table]:
+                    name = f'{table}_p{day:%Y%m%d}'
+                    bounds = [day.isoformat(), (day + timedelta(days=1)).isoformat()]
+                    with connection.cursor() as cursor:
+                        if day in stray:
+                            if name not in moved:
+                                TicketPartitionService._move_default_rows(table, day)
+                            cursor.execute(
+                                f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                                bounds,
+                            )
+                        else:
+                            cursor.execute(
+                                f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                                bounds,
+                            )
+                    created.append(name)
+        return created
+
+    @staticmethod
+    def _missing_days(table: str, start: date, end: date) -> List[date]:
+        covered = [p for p in TicketPartitionService.list_partitions(table) if p.start is not None]
+        days = []
+        day = start
+        while day <= end:
+            if not any(p.start <= day < p.end for p in covered):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    @staticmethod
+    def _move_default_rows(table: str, day: date) -> str:
+        """Crea la tabla de la partición del día (sin adjuntar) con las filas que cayeron en DEFAULT"""
+        name = f'{table}_p{day:%Y%m%d}'
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {table}_default WHERE sale_date = %s RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved',
+                [day],
+            )
+        return name
+
+    @staticmethod
+    def detach_before(cutoff: date, drop: bool = False) -> List[str]:
+        """
+        Separa (y opcionalmente elimina) las particiones que terminan antes de cutoff
+
+        Las particiones separadas quedan como tablas sueltas con sus datos,
+        fuera de las consultas sobre sales_ticket. Los reportes no cambian:
+        se leen del rollup diario.
+
+        Returns:
+            Nombres de las particiones separadas
+        """
+        detached = []
+        with transaction.atomic():
+            for table in reversed(PARTITIONED_TABLES):
+                for partition in TicketPartitionService.list_partitions(table):
+                    if partition.end is None or partition.end > cutoff:
+                        continue
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {partition.name}')
+                        if drop:
+                            cursor.execute(f'DROP TABLE {partition.name}')
+                    detached.append(partition.name)
+        return detached
+
+    @staticmethod
+    def default_rows() -> int:
+        """Filas que cayeron en la partición DEFAULT (falta crear particiones)"""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM sales_ticket_default')
+            return cursor.fetchone()[0]
@@ -0,0 +1,207 @@
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Ticket
+from .renderers import RENDERERS, TicketRenderer, get_renderer
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas escrituras se revisa el tamaño total del cache
+EVICT_EVERY_WRITES = 50
+# Lotes de pre-renderizado en espera; con la cola llena se descartan (el PDF
+# se genera igual en la primera impresión)
+PREWARM_MAX_PENDING = 64
+
+_writes = 0
+_writes_lock = threading.Lock()
+_prewarm_pool: Optional[ThreadPoolExecutor] = None
+_prewarm_pending = 0
+_evict_pool: Optional[ThreadPoolExecutor] = None
+_evicting: Optional[Future] = None
+
+
+class TicketPdfCache:
+    """
+    Cache en disco de los PDF de tickets
+
+    Un ticket vendido no cambia, así que su PDF queda identificado por el id
+    del ticket, el renderizador y su versión (hash de la plantilla o del
+    diseño). Los archivos se guardan en <dir>/<renderizador>-<versión>/<id>.<ext>;
+    cada lectura actualiza el mtime y, al superar TICKET_PDF_CACHE_MAX_BYTES,
+    un hilo aparte elimina los menos usados (LRU).
+    """
+
+    @staticmethod
+    def etag(ticket_id: int, renderer: Optional[TicketRenderer] = None) -> str:
+        renderer = renderer or get_renderer()
+        return f'"{renderer.name}-{renderer.version()}-{ticket_id}"'
+
+    @staticmethod
+    def get_path(ticket: Ticket, renderer: Optional[TicketRenderer] = None) -> str:
+        """Ruta del documento cacheado, renderizándolo si aún no existe"""
+        renderer = renderer or get_renderer()
+        path = TicketPdfCache._path(ticket.pk, renderer)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        TicketPdfCache._store(path, renderer.render(ticket))
+        return path
+
+    @staticmethod
+    def prewarm(ticket_ids: Iterable[int]) -> bool:
+        """
+        Renderiza en segundo plano los PDF de tickets recién creados
+
+        Returns:
+            False si no se encoló (desactivado o con PREWARM_MAX_PENDING lotes en espera)
+        """
+        global _prewarm_pending
+        ticket_ids = list(ticket_ids)
+        if not ticket_ids or not getattr(settings, 'TICKET_PDF_PREWARM', True):
+            return False
+        with _writes_lock:
+            if _prewarm_pending >= PREWARM_MAX_PENDING:
+                logger.debug('Cola de pre-renderizado llena, se descartan los tickets %s', ticket_ids)
+                return False
+            _prewarm_pending += 1
+        TicketPdfCache._get_prewarm_pool().submit(_prewarm, ticket_ids).add_done_callback(_prewarm_done)
+        return True
+
+    @staticmethod
+    def warm(ticket_ids: Iterable[int], renderer: Optional[TicketRenderer] = None) -> int:
+        """Renderiza los documentos que falten; devuelve cuántos se generaron"""
+        renderer = renderer or get_renderer()
+        missing = [pk for pk in ticket_ids if not os.path.exists(TicketPdfCache._path(pk, renderer))]
+        if not missing:
+            return 0
+        tickets = (
+            Ticket.objects.filter(pk__in=missing)
+            .select_related('zone', 'draw_type', 'user')
+            .prefetch_related('items')
+        )
+        count = 0
+        for ticket in tickets:
+            TicketPdfCache._store(TicketPdfCache._path(ticket.pk, renderer), renderer.render(ticket))
+            count += 1
+        return count
+
+    @staticmethod
+    def discard(ticket_id: int) -> None:
+        for renderer in RENDERERS.values():
+            try:
+                os.remove(TicketPdfCache._path(ticket_id, renderer))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def evict(max_bytes: Optional[int] = None) -> int:
+        """
+        Elimina los PDF menos usados hasta dejar el cache bajo el 90% del límite
+
+        Returns:
+            Número de archivos eliminados
+        """
+        if max_bytes is None:
+            max_bytes = settings.TICKET_PDF_CACHE_MAX_BYTES
+        entries: List[tuple] = []
+        total = 0
+        for root, _dirs, files in os.walk(TicketPdfCache._root()):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= max_bytes:
+            return 0
+        target = int(max_bytes * 0.9)
+        removed = 0
+        for _mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _root() -> str:
+        return getattr(settings, 'TICKET_PDF_CACHE_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'ticket_pdfs')
+
+    @staticmethod
+    def _path(ticket_id: int, renderer: Optional[TicketRenderer] = None) -> str:
+        renderer = renderer or get_renderer()
+        return os.path.join(
+            TicketPdfCache._root(), f'{renderer.name}-{renderer.version()}', f'{ticket_id}.{renderer.extension}'
+        )
+
+    @staticmethod
+    def _store(path: str, content: bytes) -> None:
+        """Escritura atómica (archivo temporal + rename) para no servir PDFs a medias"""
+        global _writes
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        with _writes_lock:
+            _writes += 1
+            should_evict = _writes % EVICT_EVERY_WRITES == 0
+        if should_evict:
+            TicketPdfCache._evict_in_background()
+
+    @staticmethod
+    def _evict_in_background() -> None:
+        """Recorre el directorio fuera de la petición, una revisión a la vez"""
+        global _evict_pool, _evicting
+        with _writes_lock:
+            if _evicting is not None and not _evicting.done():
+                return
+            if _evict_pool is None:
+                _evict_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ticket-pdf-evict')
+            _evicting = _evict_pool.submit(_evict)
+
+    @staticmethod
+    def _get_prewarm_pool() -> ThreadPoolExecutor:
+        global _prewarm_pool
+        with _writes_lock:
+            if _prewarm_pool is None:
+                _prewarm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ticket-pdf')
+            return _prewarm_pool
+
+
+def _prewarm_done(_future: Future) -> None:
+    global _prewarm_pending
+    with _writes_lock:
+        _prewarm_pending -= 1
+
+
+def _evict() -> None:
+    try:
+        TicketPdfCache.evict()
+    except Exception:
+        logger.exception('Error liberando espacio del cache de PDFs')
+
+
+def _prewarm(ticket_ids: List[int]) -> None:
+    try:
+        TicketPdfCache.warm(ticket_ids)
+    except Exception:
+        logger.exception('Error pre-renderizando PDFs de tickets %s', ticket_ids)
+    finally:
+        close_old_connections()
@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# Pools reutilizados por el servidor, por nombre y cantidad de procesos
+_shared_pools: Dict[Tuple[str, Optional[int]], ProcessPoolExecutor] = {}
+_shared_pools_lock = threading.Lock()
+
+
+def new_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Pool de procesos con Django inicializado en cada hijo
+
+    Usa 'spawn' para que los hijos no hereden las conexiones abiertas del
+    proceso padre. Sin max_workers se usa un proceso por núcleo.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
+
+
+def shared_process_pool(name: str, max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Pool de procesos del servidor, creado la primera vez y reutilizado
+
+    Levantar los hijos (spawn + django.setup()) cuesta más que renderizar un
+    lote chico, así que cada proceso del servidor mantiene un pool por
+    nombre. Si un hijo murió y el pool quedó roto se reemplaza por uno nuevo.
+    """
+    key = (name, max_workers)
+    with _shared_pools_lock:
+        pool = _shared_pools.get(key)
+        # ProcessPoolExecutor no expone otra forma de saber si quedó roto
+        if pool is None or getattr(pool, '_broken', False):
+            pool = _shared_pools[key] = new_process_pool(max_workers)
+        return pool
+
+
+def _forget_shared_pools() -> None:
+    # Un proceso hijo creado con fork (p.ej. workers de gunicorn con --preload)
+    # no puede usar los pools del padre
+    _shared_pools.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_shared_pools)
+
+
+def _init_worker() -> None:
+    import django
+
+    django.setup()
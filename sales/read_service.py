@@ -0,0 +1,57 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+from rest_framework import serializers
+
+from .models import TicketItem
+
+# Mismo formato de fecha que TicketSerializer (DATETIME_FORMAT y zona horaria de DRF)
+_DATETIME = serializers.DateTimeField()
+
+
+class TicketReadService:
+    """
+    Lectura de tickets para list y retrieve sin pasar por ModelSerializer
+
+    Arma los dicts de respuesta directamente desde filas .values(), con la
+    misma forma JSON que TicketSerializer. Los items de todos los tickets se
+    leen en una consulta y se agrupan por ticket en una sola pasada.
+    """
+
+    FIELDS = ('id', 'created_at', 'zone_id', 'draw_type_id', 'user_id', 'total_pieces', 'sale_date')
+
+    @staticmethod
+    def rows(queryset):
+        """Filas dict del queryset de tickets, aptas para la paginación por cursor"""
+        return queryset.values(*TicketReadService.FIELDS)
+
+    @staticmethod
+    def to_representation(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows = list(rows)
+        if not rows:
+            return []
+        items_by_ticket: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        items = (
+            TicketItem.objects.filter(
+                ticket_id__in=[row['id'] for row in rows],
+                # Poda de particiones: solo las fechas de la página
+                sale_date__in={row['sale_date'] for row in rows},
+            )
+            .order_by('ticket_id', 'id')
+            .values_list('ticket_id', 'number', 'pieces')
+        )
+        for ticket_id, number, pieces in items:
+            items_by_ticket[ticket_id].append({'number': number, 'pieces': pieces})
+        format_datetime = _DATETIME.to_representation
+        return [
+            {
+                'id': row['id'],
+                'created_at': format_datetime(row['created_at']),
+                'zone': row['zone_id'],
+                'draw_type': row['draw_type_id'],
+                'user': row['user_id'],
+                'total_pieces': row['total_pieces'],
+                'items': items_by_ticket.get(row['id'], []),
+            }
+            for row in rows
+        ]
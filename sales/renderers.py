@@ -0,0 +1,209 @@
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+TICKET_TEMPLATE = 'tickets/ticket.html'
+
+# (negrita, centrado, texto)
+ReceiptLine = Tuple[bool, bool, str]
+
+
+class TicketRenderer:
+    """
+    Renderizador de tickets
+
+    Recibe un Ticket (o un objeto con la misma forma, como el de preview) y
+    devuelve el documento listo para enviar. `version()` forma parte de la
+    clave del cache, así que debe cambiar cuando cambia el formato.
+    """
+
+    name = ''
+    content_type = 'application/pdf'
+    extension = 'pdf'
+
+    def version(self) -> str:
+        raise NotImplementedError
+
+    def render(self, ticket) -> bytes:
+        raise NotImplementedError
+
+
+class HtmlPdfRenderer(TicketRenderer):
+    """Plantilla tickets/ticket.html convertida con xhtml2pdf (formato A4)"""
+
+    name = 'html'
+
+    def version(self) -> str:
+        return _template_version()
+
+    def render(self, ticket) -> bytes:
+        html = _compiled_template().render({'ticket': ticket})
+        result = BytesIO()
+        pisa.CreatePDF(src=html, dest=result)
+        return result.getvalue()
+
+
+class ThermalPdfRenderer(TicketRenderer):
+    """
+    Recibo para impresora térmica (58/80 mm) escrito directamente como PDF
+
+    El diseño del ticket es fijo, así que se arma el PDF a mano con una
+    fuente estándar (Courier) sin pasar por HTML ni CSS. La altura de la
+    página se ajusta a la cantidad de líneas.
+    """
+
+    name = 'thermal'
+    # Subir al cambiar el diseño del recibo
+    LAYOUT_VERSION = '1'
+    FONT_SIZE = 8
+    MARGIN = 8
+
+    def version(self) -> str:
+        return f'{self.LAYOUT_VERSION}-{_paper_width_mm()}mm'
+
+    def render(self, ticket) -> bytes:
+        width = _paper_width_mm() * 72 / 25.4
+        # Courier: cada carácter mide 0.6 del tamaño de fuente
+        columns = int((width - 2 * self.MARGIN) / (0.6 * self.FONT_SIZE))
+        return _build_pdf(receipt_lines(ticket, columns), width, self.FONT_SIZE, self.MARGIN)
+
+
+class EscPosRenderer(TicketRenderer):
+    """Comandos ESC/POS para enviar el recibo directo a la impresora térmica"""
+
+    name = 'escpos'
+    content_type = 'application/octet-stream'
+    extension = 'bin'
+    LAYOUT_VERSION = '1'
+
+    INIT = b'\x1b@'
+    CODEPAGE_PC858 = b'\x1bt\x13'
+    CUT = b'\x1dVB\x00'
+
+    def version(self) -> str:
+        return f'{self.LAYOUT_VERSION}-{_paper_width_mm()}mm'
+
+    def render(self, ticket) -> bytes:
+        # Fuente A: 48 columnas en 80 mm, 32 en 58 mm
+        columns = 48 if _paper_width_mm() >= 80 else 32
+        out = bytearray(self.INIT + self.CODEPAGE_PC858)
+        for bold, center, text in receipt_lines(ticket, columns):
+            out += b'\x1ba' + (b'\x01' if center else b'\x00')
+            out += b'\x1bE' + (b'\x01' if bold else b'\x00')
+            out += text.encode('cp858', 'replace') + b'\n'
+        out += b'\n\n\n' + self.CUT
+        return bytes(out)
+
+
+RENDERERS: Dict[str, TicketRenderer] = {
+    renderer.name: renderer for renderer in (HtmlPdfRenderer(), ThermalPdfRenderer(), EscPosRenderer())
+}
+
+
+def get_renderer(name: Optional[str] = None) -> TicketRenderer:
+    """
+    Renderizador por nombre; sin nombre se usa TICKET_PDF_RENDERER
+
+    Raises:
+        ValueError: si el nombre no corresponde a ningún renderizador
+    """
+    name = name or getattr(settings, 'TICKET_PDF_RENDERER', HtmlPdfRenderer.name)
+    try:
+        return RENDERERS[name]
+    except KeyError:
+        raise ValueError(f'renderer debe ser uno de: {", ".join(sorted(RENDERERS))}')
+
+
+def receipt_lines(ticket, columns: int) -> List[ReceiptLine]:
+    """Líneas del recibo con el mismo contenido que la plantilla HTML"""
+    created_at = ticket.created_at
+    if isinstance(created_at, datetime):
+        created_at = timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M:%S')
+    rule = '-' * columns
+    lines: List[ReceiptLine] = [
+        (True, True, f'Ticket #{ticket.id}'),
+        (False, False, f'Fecha/Hora: {created_at}'[:columns]),
+        (False, False, f'Zona: {ticket.zone.name}'[:columns]),
+        (False, False, f'Sorteo: {ticket.draw_type.name}'[:columns]),
+        (False, False, f'Usuario: {ticket.user.username}'[:columns]),
+        (False, False, rule),
+        (True, False, _two_columns('Número', 'Pedazos', columns)),
+    ]
+    for item in ticket.items.all():
+        lines.append((False, False, _two_columns(str(item.number), str(item.pieces), columns)))
+    lines.append((False, False, rule))
+    lines.append((True, False, _two_columns('Total pedazos', str(ticket.total_pieces), columns)))
+    return lines
+
+
+def _two_columns(left: str, right: str, columns: int) -> str:
+    return left + right.rjust(max(columns - len(left), len(right) + 1))
+
+
+def _build_pdf(lines: List[ReceiptLine], width: float, font_size: int, margin: int) -> bytes:
+    """PDF de una página con fuentes estándar (sin incrustar) y codificación WinAnsi"""
+    leading = font_size * 1.3
+    height = 2 * margin + leading * len(lines)
+    char_width = 0.6 * font_size
+    ops = []
+    y = height - margin - font_size
+    for bold, center, text in lines:
+        x = margin
+        if center:
+            x = max(margin, (width - len(text) * char_width) / 2)
+        font = '/F2' if bold else '/F1'
+        ops.append(f'BT {font} {font_size} Tf {x:.2f} {y:.2f} Td ({_pdf_escape(text)}) Tj ET')
+        y -= leading
+    stream = '\n'.join(ops).encode('cp1252', 'replace')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] '
+            f'/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> /Contents 4 0 R >>'
+        ).encode(),
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _paper_width_mm() -> int:
+    return int(getattr(settings, 'TICKET_THERMAL_WIDTH_MM', 80))
+
+
+@lru_cache(maxsize=None)
+def _compiled_template():
+    """Plantilla del ticket compilada una sola vez por proceso"""
+    return get_template(TICKET_TEMPLATE)
+
+
+@lru_cache(maxsize=None)
+def _template_version() -> str:
+    """Hash del fuente de la plantilla: si cambia, cambian las claves del cache"""
+    origin = _compiled_template().origin
+    with open(origin.name, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import ArchivedSalesDay, DailySalesRollup, Ticket
+
+# (sale_date, zone_id, draw_type_id, user_id)
+RollupKey = Tuple[date, int, int, int]
+
+
+class SalesRollupService:
+    """Servicio para mantener la tabla de totales diarios usada por los reportes"""
+
+    @staticmethod
+    def record(tickets: Iterable[Ticket]) -> None:
+        """
+        Suma tickets recién emitidos a sus filas del rollup
+
+        Debe llamarse dentro de la misma transacción que crea los tickets.
+        """
+        totals = SalesRollupService._group(tickets)
+        if not totals:
+            return
+        DailySalesRollup.objects.bulk_create(
+            [
+                DailySalesRollup(sale_date=sale_date, zone_id=zone_id, draw_type_id=draw_type_id, user_id=user_id)
+                for sale_date, zone_id, draw_type_id, user_id in sorted(totals)
+            ],
+            ignore_conflicts=True,
+        )
+        tickets_delta, pieces_delta = SalesRollupService._deltas(totals)
+        SalesRollupService._filter(totals).update(
+            total_tickets=F('total_tickets') + tickets_delta,
+            total_pieces=F('total_pieces') + pieces_delta,
+        )
+
+    @staticmethod
+    def remove(tickets: Iterable[Ticket]) -> None:
+        """Descuenta tickets eliminados de sus filas del rollup"""
+        totals = SalesRollupService._group(tickets)
+        if not totals:
+            return
+        tickets_delta, pieces_delta = SalesRollupService._deltas(totals)
+        SalesRollupService._filter(totals).update(
+            total_tickets=Greatest(F('total_tickets') - tickets_delta, Value(0)),
+            total_pieces=Greatest(F('total_pieces') - pieces_delta, Value(0)),
+        )
+
+    @staticmethod
+    def rebuild(start_date: date, end_date: date) -> int:
+        """
+        Recalcula el rollup de un rango de fechas (inclusive) desde los tickets
+
+        Se procesa un día por transacción para acotar bloqueos y memoria. Los
+        días archivados se saltan: sus tickets ya no están en la base y sus
+        totales viven en el archivo frío.
+
+        Returns:
+            Número de filas generadas
+        """
+        archived = set(
+            ArchivedSalesDay.objects.filter(sale_date__range=(start_date, end_date)).values_list('sale_date', flat=True)
+        )
+        created = 0
+        day = start_date
+        while day <= end_date:
+            if day in archived:
+                day += timedelta(days=1)
+                continue
+            rows = (
+                Ticket.objects
+                .filter(sale_date=day)
+                .values('zone_id', 'draw_type_id', 'user_id')
+                .annotate(tickets=Count('id'), pieces=Sum('total_pieces'))
+                .order_by()
+            )
+            with transaction.atomic():
+                DailySalesRollup.objects.filter(sale_date=day).delete()
+                created += len(DailySalesRollup.objects.bulk_create([
+                    DailySalesRollup(
+                        sale_date=day,
+                        zone_id=row['zone_id'],
+                        draw_type_id=row['draw_type_id'],
+                        user_id=row['user_id'],
+                        total_tickets=row['tickets'],
+                        total_pieces=row['pieces'] or 0,
+                    )
+                    for row in rows
+                ]))
+            day += timedelta(days=1)
+        return created
+
+    @staticmethod
+    def _group(tickets: Iterable[Ticket]) -> Dict[RollupKey, Tuple[int, int]]:
+        totals: Dict[RollupKey, Tuple[int, int]] = {}
+        for ticket in tickets:
+            key = (ticket.sale_date, ticket.zone_id, ticket.draw_type_id, ticket.user_id)
+            count, pieces = totals.get(key, (0, 0))
+            totals[key] = (count + 1, pieces + ticket.total_pieces)
+        return totals
+
+    @staticmethod
+    def _filter(totals: Dict[RollupKey, Tuple[int, int]]):
+        condition = Q()
+        for sale_date, zone_id, draw_type_id, user_id in totals:
+            condition |= Q(sale_date=sale_date, zone_id=zone_id, draw_type_id=draw_type_id, user_id=user_id)
+        return DailySalesRollup.objects.filter(condition)
+
+    @staticmethod
+    def _deltas(totals: Dict[RollupKey, Tuple[int, int]]) -> Tuple[Case, Case]:
+        """Expresiones CASE con los incrementos de cada fila, para un único UPDATE"""
+        def case(position):
+            return Case(
+                *[
+                    When(
+                        sale_date=sale_date, zone_id=zone_id, draw_type_id=draw_type_id, user_id=user_id,
+                        then=Value(values[position]),
+                    )
+                    for (sale_date, zone_id, draw_type_id, user_id), values in totals.items()
+                ],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        return case(0), case(1)
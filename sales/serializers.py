@@ -1,10 +1,14 @@
-from django.db.models import Sum
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 
-from catalog.models import DrawSchedule, NumberLimit
+from catalog.cache_service import CatalogCacheService
+from catalog.models import DrawType, Zone
+from catalog.serializers import CatalogSnapshotRelatedField
 
-from .models import Ticket, TicketItem
+from .exposure_service import ExposureLimitExceeded, ExposureService
+from .models import ExportJob, Ticket, TicketItem
+from .rollup_service import SalesRollupService
 
 
 class TicketItemSerializer(serializers.ModelSerializer):
@@ -14,6 +18,8 @@ class TicketItemSerializer(serializers.ModelSerializer):
 
 
 class TicketSerializer(serializers.ModelSerializer):
+    zone = CatalogSnapshotRelatedField('zones', queryset=Zone.objects.all())
+    draw_type = CatalogSnapshotRelatedField('draw_types', queryset=DrawType.objects.all())
     items = TicketItemSerializer(many=True)
 
     class Meta:
@@ -26,50 +32,81 @@ class TicketSerializer(serializers.ModelSerializer):
         draw_type = data['draw_type']
         items_data = self.initial_data.get('items', [])
 
+        catalog = CatalogCacheService.get_snapshot()
         now = timezone.localtime().time()
-        try:
-            schedule = DrawSchedule.objects.get(zone=zone, draw_type=draw_type, is_active=True)
-        except DrawSchedule.DoesNotExist:
+        schedule = catalog.get_schedule(zone.id, draw_type.id)
+        if schedule is None:
             raise serializers.ValidationError('No hay horario configurado para esta zona y sorteo.')
         if now >= schedule.cutoff_time:
             raise serializers.ValidationError('Cerrado para este sorteo según el horario configurado.')
 
-        limits = {l.number: l.max_pieces for l in NumberLimit.objects.filter(zone=zone, draw_type=draw_type)}
-        # Validación de entrada básica y topes acumulados diarios por zona+sorteo+número
-        today = timezone.localdate()
+        # Validación de entrada básica
+        pieces_by_number = {}
         for item in items_data:
             number = item.get('number')
             pieces = int(item.get('pieces', 0))
             if not number or len(number) != 2 or not number.isdigit():
                 raise serializers.ValidationError('Número inválido, debe ser 00-99.')
-            max_allowed = limits.get(number, None)
-            if max_allowed is not None:
-                sold = (
-                    TicketItem.objects
-                    .filter(
-                        ticket__zone=zone,
-                        ticket__draw_type=draw_type,
-                        ticket__created_at__date=today,
-                        number=number,
-                    )
-                    .aggregate(total=Sum('pieces'))
-                    .get('total') or 0
+            # Cada número va en una sola línea: (ticket, number) es único en TicketItem
+            if number in pieces_by_number:
+                raise serializers.ValidationError(f'Número repetido en el ticket: {number}.')
+            pieces_by_number[number] = pieces
+
+        # Topes acumulados diarios por zona+sorteo+número, en una sola consulta al acumulado
+        limits = catalog.get_limits(zone.id, draw_type.id)
+        self._number_limits = limits
+        if self.context.get('defer_exposure_check'):
+            # La emisión por lotes verifica los topes de todos los tickets a la vez
+            return data
+        limited = [number for number in pieces_by_number if number in limits]
+        sold_by_number = ExposureService.get_sold_pieces(zone.id, draw_type.id, timezone.localdate(), limited)
+        for number in limited:
+            sold = sold_by_number.get(number, 0)
+            pieces = pieces_by_number[number]
+            max_allowed = limits[number]
+            if sold + pieces > max_allowed:
+                raise serializers.ValidationError(
+                    f'Tope acumulado excedido para el número {number}: {sold}+{pieces} > {max_allowed}.'
                 )
-                if sold + pieces > max_allowed:
-                    raise serializers.ValidationError(
-                        f'Tope acumulado excedido para el número {number}: {sold}+{pieces} > {max_allowed}.'
-                    )
+        # La verificación definitiva se repite bajo bloqueo al crear el ticket
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        ticket = Ticket.objects.create(**validated_data)
-        total = 0
-        for item in items_data:
-            obj = TicketItem.objects.create(ticket=ticket, **item)
-            total += obj.pieces
-        ticket.total_pieces = total
-        ticket.save(update_fields=['total_pieces'])
+        sale_date = timezone.localdate()
+        pieces_by_number = {item['number']: item['pieces'] for item in items_data}
+        try:
+            ExposureService.reserve(
+                validated_data['zone'].id,
+                validated_data['draw_type'].id,
+                sale_date,
+                pieces_by_number,
+                getattr(self, '_number_limits', None),
+            )
+        except ExposureLimitExceeded as exc:
+            raise serializers.ValidationError(str(exc))
+        total = sum(item['pieces'] for item in items_data)
+        ticket = Ticket.objects.create(total_pieces=total, sale_date=sale_date, **validated_data)
+        TicketItem.objects.bulk_create([
+            TicketItem(ticket=ticket, sale_date=sale_date, **item) for item in items_data
+        ])
+        SalesRollupService.record([ticket])
         return ticket
 
 
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = (
+            'id', 'level', 'format', 'params', 'status', 'rows_written', 'error',
+            'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'download_url',
+        )
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.STATUS_DONE:
+            return None
+        return f'/api/sales/export-jobs/{obj.pk}/download/'
@@ -1,11 +1,18 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from rest_framework.test import APIClient
 
 from catalog.models import DrawSchedule, DrawType, NumberLimit, Zone
 
-from .models import Ticket, TicketItem
+from .models import DailySalesRollup, ExportJob, NumberExposure, Ticket, TicketItem
+from .pdf_cache import TicketPdfCache
 
 
 class TicketRulesTests(TestCase):
@@ -87,3 +94,1027 @@ class ReportsTests(TestCase):
         self.assertEqual(data['totals']['total_tickets'], 3)
 
 
+
+
+class ExposureLedgerTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='LedgerZone')
+        self.draw = DrawType.objects.create(code='ledger', name='LedgerDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        for n in range(30):
+            NumberLimit.objects.create(zone=self.zone, draw_type=self.draw, number=f'{n:02d}', max_pieces=10)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='ledger', password='p', role='SELLER')
+        self.client = APIClient()
+        from rest_framework_simplejwt.tokens import RefreshToken
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(token)}')
+
+    def _sell(self, items):
+        return self.client.post('/api/sales/tickets/', {
+            'zone': self.zone.id,
+            'draw_type': self.draw.id,
+            'items': items,
+        }, format='json')
+
+    def test_ledger_accumulates_per_number(self):
+        self._sell([{'number': '12', 'pieces': 3}, {'number': '50', 'pieces': 2}])
+        self._sell([{'number': '12', 'pieces': 4}])
+        sold = dict(NumberExposure.objects.filter(
+            zone=self.zone, draw_type=self.draw, sale_date=timezone.localdate()
+        ).values_list('number', 'sold_pieces'))
+        self.assertEqual(sold, {'12': 7, '50': 2})
+
+    def test_limit_check_uses_ledger(self):
+        res = self._sell([{'number': '07', 'pieces': 8}])
+        self.assertEqual(res.status_code, 201, res.content)
+        res = self._sell([{'number': '07', 'pieces': 3}])
+        self.assertEqual(res.status_code, 400)
+
+    def test_validation_queries_do_not_grow_with_items(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def count_queries(items):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self._sell(items)
+            self.assertEqual(res.status_code, 201, res.content)
+            return len([q for q in ctx.captured_queries if 'sales_numberexposure' in q['sql'] and q['sql'].startswith('SELECT')])
+
+        single = count_queries([{'number': '01', 'pieces': 1}])
+        self.assertEqual(count_queries([{'number': f'{n:02d}', 'pieces': 1} for n in range(30)]), single)
+
+    def test_sale_path_does_not_query_catalog(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self._sell([{'number': '01', 'pieces': 1}])
+        with CaptureQueriesContext(connection) as ctx:
+            res = self._sell([{'number': '02', 'pieces': 1}])
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertFalse([q for q in ctx.captured_queries if 'catalog_' in q['sql'] and q['sql'].startswith('SELECT')])
+
+    def test_delete_releases_exposure(self):
+        res = self._sell([{'number': '12', 'pieces': 5}])
+        self.client.delete(f"/api/sales/tickets/{res.data['id']}/")
+        exposure = NumberExposure.objects.get(zone=self.zone, draw_type=self.draw, number='12')
+        self.assertEqual(exposure.sold_pieces, 0)
+
+    def test_limit_rechecked_under_lock_on_create(self):
+        from rest_framework.exceptions import ValidationError
+
+        from .serializers import TicketSerializer
+
+        # Ambas ventas pasan la validación antes de que cualquiera se guarde
+        data = {'zone': self.zone.id, 'draw_type': self.draw.id, 'items': [{'number': '12', 'pieces': 6}]}
+        first = TicketSerializer(data=data)
+        second = TicketSerializer(data=data)
+        self.assertTrue(first.is_valid(), first.errors)
+        self.assertTrue(second.is_valid(), second.errors)
+        first.save(user=self.user)
+        with self.assertRaises(ValidationError):
+            second.save(user=self.user)
+        self.assertEqual(Ticket.objects.filter(zone=self.zone).count(), 1)
+        exposure = NumberExposure.objects.get(zone=self.zone, draw_type=self.draw, number='12')
+        self.assertEqual(exposure.sold_pieces, 6)
+
+
+class TicketBulkCreateTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='BulkZone')
+        self.draw = DrawType.objects.create(code='bulk', name='BulkDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        User = get_user_model()
+        self.user = User.objects.create_user(username='bulk', password='p', role='SELLER')
+
+    def test_items_inserted_in_one_statement(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .serializers import TicketSerializer
+
+        items = [{'number': f'{n:02d}', 'pieces': 2} for n in range(100)]
+        serializer = TicketSerializer(data={'zone': self.zone.id, 'draw_type': self.draw.id, 'items': items})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connection) as ctx:
+            ticket = serializer.save(user=self.user)
+        ticket_writes = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT INTO "sales_ticket', 'UPDATE "sales_ticket'))
+        ]
+        self.assertEqual(len(ticket_writes), 2)
+        self.assertEqual(ticket.total_pieces, 200)
+        self.assertEqual(ticket.items.count(), 100)
+
+
+class TicketBatchTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='BatchZone')
+        self.draw = DrawType.objects.create(code='batch', name='BatchDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        NumberLimit.objects.create(zone=self.zone, draw_type=self.draw, number='12', max_pieces=5)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='batch', password='p', role='SELLER')
+        self.client = APIClient()
+        from rest_framework_simplejwt.tokens import RefreshToken
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(token)}')
+
+    def _ticket(self, items, **extra):
+        return {'zone': self.zone.id, 'draw_type': self.draw.id, 'items': items, **extra}
+
+    def test_batch_creates_all_tickets(self):
+        res = self.client.post('/api/sales/tickets/batch/', {'tickets': [
+            self._ticket([{'number': '01', 'pieces': 2}], client_ref='a'),
+            self._ticket([{'number': '02', 'pieces': 3}, {'number': '12', 'pieces': 1}], client_ref='b'),
+        ]}, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual([r['client_ref'] for r in res.data['results']], ['a', 'b'])
+        self.assertEqual(res.data['results'][1]['ticket']['total_pieces'], 4)
+        self.assertEqual(len(res.data['results'][1]['ticket']['items']), 2)
+        self.assertEqual(Ticket.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(NumberExposure.objects.get(zone=self.zone, draw_type=self.draw, number='12').sold_pieces, 1)
+
+    def test_batch_enforces_limits_across_tickets(self):
+        res = self.client.post('/api/sales/tickets/batch/', {'tickets': [
+            self._ticket([{'number': '12', 'pieces': 3}]),
+            self._ticket([{'number': '12', 'pieces': 3}]),
+            self._ticket([{'number': '99', 'pieces': 1}]),
+            self._ticket([{'number': '1', 'pieces': 1}]),
+        ]}, format='json')
+        self.assertEqual(res.status_code, 207, res.content)
+        self.assertEqual([r['status'] for r in res.data['results']], [201, 400, 201, 400])
+        self.assertEqual(Ticket.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(NumberExposure.objects.get(zone=self.zone, draw_type=self.draw, number='12').sold_pieces, 3)
+
+    def test_repeated_number_is_rejected(self):
+        res = self.client.post('/api/sales/tickets/', self._ticket(
+            [{'number': '07', 'pieces': 1}, {'number': '07', 'pieces': 2}]
+        ), format='json')
+        self.assertEqual(res.status_code, 400, res.content)
+        res = self.client.post('/api/sales/tickets/batch/', {'tickets': [
+            self._ticket([{'number': '07', 'pieces': 1}, {'number': '07', 'pieces': 2}]),
+            self._ticket([{'number': '08', 'pieces': 1}]),
+        ]}, format='json')
+        self.assertEqual(res.status_code, 207, res.content)
+        self.assertEqual([r['status'] for r in res.data['results']], [400, 201])
+        self.assertFalse(TicketItem.objects.filter(number='07').exists())
+
+    def test_batch_requires_ticket_list(self):
+        res = self.client.post('/api/sales/tickets/batch/', {'tickets': []}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='RollupZone')
+        self.draw = DrawType.objects.create(code='rollup', name='RollupDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        User = get_user_model()
+        self.user = User.objects.create_user(username='rollup', password='p', role='SELLER')
+        self.client = APIClient()
+        from rest_framework_simplejwt.tokens import RefreshToken
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {str(token)}')
+        for pieces in (1, 2, 3):
+            res = self.client.post('/api/sales/tickets/', {
+                'zone': self.zone.id,
+                'draw_type': self.draw.id,
+                'items': [{'number': '01', 'pieces': pieces}],
+            }, format='json')
+            assert res.status_code == 201
+
+    def _row(self):
+        return DailySalesRollup.objects.get(zone=self.zone, draw_type=self.draw, user=self.user)
+
+    def test_rollup_maintained_on_create_and_delete(self):
+        row = self._row()
+        self.assertEqual((row.sale_date, row.total_tickets, row.total_pieces), (timezone.localdate(), 3, 6))
+        ticket = Ticket.objects.filter(zone=self.zone).order_by('id').first()
+        self.client.delete(f'/api/sales/tickets/{ticket.id}/')
+        row = self._row()
+        self.assertEqual((row.total_tickets, row.total_pieces), (2, 5))
+
+    def test_rebuild_command_matches_tickets(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        DailySalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollup', start=str(timezone.localdate()), stdout=StringIO())
+        row = self._row()
+        self.assertEqual((row.total_tickets, row.total_pieces), (3, 6))
+
+    def test_rollup_is_keyed_by_sale_date(self):
+        from datetime import timedelta
+
+        from .rollup_service import SalesRollupService
+
+        # Ticket registrado hoy para el día de ayer: cuenta en su sale_date
+        yesterday = timezone.localdate() - timedelta(days=1)
+        ticket = Ticket.objects.create(
+            user=self.user, zone=self.zone, draw_type=self.draw, total_pieces=4, sale_date=yesterday
+        )
+        SalesRollupService.record([ticket])
+        row = DailySalesRollup.objects.get(sale_date=yesterday, zone=self.zone, user=self.user)
+        self.assertEqual((row.total_tickets, row.total_pieces), (1, 4))
+
+        DailySalesRollup.objects.all().delete()
+        SalesRollupService.rebuild(yesterday, yesterday)
+        row = DailySalesRollup.objects.get(sale_date=yesterday, zone=self.zone, user=self.user)
+        self.assertEqual((row.total_tickets, row.total_pieces), (1, 4))
+
+    def test_summary_reads_from_rollup(self):
+        res = self.client.get(f'/api/sales/tickets/reports/summary/?group_by=zone&zone={self.zone.id}&daily=1&refresh=1')
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(data['totals'], {'total_tickets': 3, 'total_pieces': 6})
+        self.assertEqual(data['daily'], [{'date': str(timezone.localdate()), 'total_tickets': 3, 'total_pieces': 6}])
+
+
+class ReportPaginationTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='PageZone')
+        self.draw = DrawType.objects.create(code='page', name='PageDraw')
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'seller{i}', password='p', role='SELLER') for i in range(5)]
+        for i, user in enumerate(self.users):
+            DailySalesRollup.objects.create(
+                sale_date=timezone.localdate(), zone=self.zone, draw_type=self.draw, user=user,
+                total_tickets=i + 1, total_pieces=10 * (i + 1),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users[0])
+
+    def _summary(self, page):
+        res = self.client.get(f'/api/sales/tickets/reports/summary/?group_by=user&page={page}&page_size=2&refresh=1')
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_pages_are_ordered_and_totals_cover_all_groups(self):
+        first = self._summary(1)
+        self.assertEqual([row['group'] for row in first['summary']], ['seller0', 'seller1'])
+        self.assertEqual(first['pagination']['total_items'], 5)
+        self.assertEqual(first['pagination']['total_pages'], 3)
+        self.assertEqual(first['totals'], {'total_tickets': 15, 'total_pieces': 150})
+        last = self._summary(3)
+        self.assertEqual([row['group'] for row in last['summary']], ['seller4'])
+        self.assertEqual(last['totals'], first['totals'])
+
+    def test_page_out_of_range_keeps_totals(self):
+        data = self._summary(9)
+        self.assertEqual(data['summary'], [])
+        self.assertEqual(data['pagination']['total_items'], 5)
+        self.assertEqual(data['totals'], {'total_tickets': 15, 'total_pieces': 150})
+
+
+class DetailExportTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='ExportZone')
+        self.draw = DrawType.objects.create(code='export', name='ExportDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        User = get_user_model()
+        self.user = User.objects.create_user(username='exporter', password='p', role='SELLER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for n in ('01', '02'):
+            res = self.client.post('/api/sales/tickets/', {
+                'zone': self.zone.id,
+                'draw_type': self.draw.id,
+                'items': [{'number': n, 'pieces': 2}, {'number': '50', 'pieces': 1}],
+            }, format='json')
+            assert res.status_code == 201
+
+    def _lines(self, url):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode().splitlines()
+
+    def test_ticket_level_csv(self):
+        today = timezone.localdate()
+        lines = self._lines(f'/api/sales/tickets/reports/detail/?level=tickets&start={today}&end={today}')
+        self.assertEqual(lines[0], 'Ticket,Fecha,Zona,Sorteo,Vendedor,Total Pedazos')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(',ExportZone,ExportDraw,exporter,3'))
+
+    def test_item_level_csv(self):
+        lines = self._lines(f'/api/sales/tickets/reports/detail/?level=items&zone={self.zone.id}')
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[1].endswith(',01,2'))
+
+    def test_item_level_xlsx(self):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        res = self.client.get('/api/sales/tickets/reports/detail/?level=items&format=xlsx')
+        self.assertEqual(res.status_code, 200)
+        wb = load_workbook(BytesIO(b''.join(res.streaming_content)), read_only=True)
+        rows = list(wb['Items'].values)
+        self.assertEqual(list(rows[0]), ['Ticket', 'Fecha', 'Zona', 'Sorteo', 'Vendedor', 'Número', 'Pedazos'])
+        self.assertEqual(len(rows), 5)
+
+    def test_xlsx_continues_on_a_new_sheet_at_the_row_limit(self):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        with mock.patch('sales.exports.XLSX_MAX_ROWS', 3):
+            res = self.client.get('/api/sales/tickets/reports/detail/?level=items&format=xlsx')
+        self.assertEqual(res.status_code, 200)
+        wb = load_workbook(BytesIO(b''.join(res.streaming_content)), read_only=True)
+        self.assertEqual(wb.sheetnames, ['Items', 'Items 2'])
+        first, second = (list(wb[name].values) for name in wb.sheetnames)
+        self.assertEqual((len(first), len(second)), (3, 3))
+        self.assertEqual(second[0], first[0])
+
+    def test_invalid_level_or_date(self):
+        self.assertEqual(self.client.get('/api/sales/tickets/reports/detail/?level=foo').status_code, 400)
+        self.assertEqual(self.client.get('/api/sales/tickets/reports/detail/?start=ayer').status_code, 400)
+
+    def test_summary_xlsx_with_detail_sheet(self):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+
+        res = self.client.get('/api/sales/tickets/reports/summary/?format=xlsx&daily=1&detail=1&refresh=1')
+        self.assertEqual(res.status_code, 200)
+        wb = load_workbook(BytesIO(b''.join(res.streaming_content)), read_only=True)
+        self.assertEqual(wb.sheetnames, ['Resumen', 'Diario', 'Tickets'])
+        self.assertEqual(len(list(wb['Tickets'].values)), 3)
+
+
+@override_settings(EXPORT_JOBS_BACKEND='sync')
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.zone = Zone.objects.create(name='JobZone')
+        self.draw = DrawType.objects.create(code='job', name='JobDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        User = get_user_model()
+        self.user = User.objects.create_user(username='jobber', password='p', role='SELLER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        res = self.client.post('/api/sales/tickets/', {
+            'zone': self.zone.id,
+            'draw_type': self.draw.id,
+            'items': [{'number': '07', 'pieces': 3}],
+        }, format='json')
+        assert res.status_code == 201
+
+    def _enqueue(self, query):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(f'/api/sales/tickets/reports/export/?{query}')
+        self.assertEqual(res.status_code, 202)
+        return self.client.get(f"/api/sales/export-jobs/{res.data['job_id']}/").data
+
+    def test_detail_csv_job_is_downloadable(self):
+        job = self._enqueue('level=items&format=csv')
+        self.assertEqual(job['status'], ExportJob.STATUS_DONE)
+        self.assertEqual(job['rows_written'], 1)
+        res = self.client.get(job['download_url'])
+        self.assertEqual(res.status_code, 200)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertTrue(lines[1].endswith(',JobZone,JobDraw,jobber,07,3'))
+
+    def test_summary_xlsx_and_pdf_jobs(self):
+        for fmt in ('excel', 'pdf'):
+            job = self._enqueue(f'format={fmt}&daily=1')
+            self.assertEqual(job['status'], ExportJob.STATUS_DONE, job['error'])
+            stored = ExportJob.objects.get(pk=job['id'])
+            self.assertTrue(os.path.exists(stored.file.path))
+
+    def test_invalid_job_is_rejected(self):
+        res = self.client.post('/api/sales/tickets/reports/export/?format=invalid')
+        self.assertEqual(res.status_code, 400)
+        res = self.client.post('/api/sales/tickets/reports/export/?format=pdf&level=items')
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_form_encoded_export_is_parsed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/sales/tickets/reports/export/', {'level': 'items', 'format': 'csv'})
+        self.assertEqual(res.status_code, 202, res.content)
+        self.assertEqual(ExportJob.objects.get().level, 'items')
+
+    def test_export_requires_post(self):
+        self.assertEqual(self.client.get('/api/sales/tickets/reports/export/?format=csv').status_code, 405)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_running_job_without_heartbeat_is_reaped(self):
+        from datetime import timedelta
+
+        from .export_jobs import ExportJobService
+
+        now = timezone.now()
+        stale = ExportJob.objects.create(
+            user=self.user, status=ExportJob.STATUS_RUNNING, heartbeat_at=now - timedelta(minutes=10)
+        )
+        alive = ExportJob.objects.create(user=self.user, status=ExportJob.STATUS_RUNNING, heartbeat_at=now)
+
+        job = self.client.get(f'/api/sales/export-jobs/{stale.pk}/').data
+        self.assertEqual(job['status'], ExportJob.STATUS_FAILED)
+        self.assertTrue(job['error'])
+        self.assertEqual(ExportJobService.reap_stale(), 0)
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, ExportJob.STATUS_RUNNING)
+
+    def test_pending_job_cannot_be_downloaded_by_others(self):
+        job = ExportJob.objects.create(user=self.user, level='tickets', format='csv')
+        self.assertEqual(self.client.get(f'/api/sales/export-jobs/{job.pk}/download/').status_code, 409)
+        other = get_user_model().objects.create_user(username='otro', password='p', role='SELLER')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f'/api/sales/export-jobs/{job.pk}/').status_code, 404)
+
+
+@override_settings(TICKET_PDF_PREWARM=False)
+class TicketPdfCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        override = override_settings(TICKET_PDF_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.zone = Zone.objects.create(name='PdfZone')
+        self.draw = DrawType.objects.create(code='pdf', name='PdfDraw')
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0))
+        User = get_user_model()
+        self.user = User.objects.create_user(username='printer', password='p', role='SELLER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.ticket_ids = []
+        for n in ('11', '12'):
+            res = self.client.post('/api/sales/tickets/', {
+                'zone': self.zone.id,
+                'draw_type': self.draw.id,
+                'items': [{'number': n, 'pieces': 1}],
+            }, format='json')
+            assert res.status_code == 201
+            self.ticket_ids.append(res.data['id'])
+
+    def test_reprint_is_served_from_cache_with_etag(self):
+        url = f'/api/sales/tickets/{self.ticket_ids[0]}/pdf/'
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(b''.join(res.streaming_content).startswith(b'%PDF'))
+        etag = res['ETag']
+        self.assertTrue(os.path.exists(TicketPdfCache._path(self.ticket_ids[0])))
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_warm_and_lru_eviction(self):
+        self.assertEqual(TicketPdfCache.warm(self.ticket_ids), 2)
+        self.assertEqual(TicketPdfCache.warm(self.ticket_ids), 0)
+        first, second = (TicketPdfCache._path(pk) for pk in self.ticket_ids)
+        os.utime(first, (1, 1))
+        # Límite apenas por debajo del total: basta con eliminar el menos usado
+        removed = TicketPdfCache.evict(max_bytes=os.path.getsize(first) + os.path.getsize(second) - 1)
+        self.assertEqual(removed, 1)
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+
+    @override_settings(TICKET_PDF_PREWARM=True)
+    def test_prewarm_drops_work_when_queue_is_full(self):
+        from sales import pdf_cache
+
+        pool = mock.Mock()
+        with mock.patch.object(pdf_cache, 'PREWARM_MAX_PENDING', 1), \
+                mock.patch.object(pdf_cache, '_prewarm_pending', 0), \
+                mock.patch.object(TicketPdfCache, '_get_prewarm_pool', return_value=pool):
+            self.assertTrue(TicketPdfCache.prewarm(self.ticket_ids[:1]))
+            # El primer lote sigue en espera: el segundo se descarta
+            self.assertFalse(TicketPdfCache.prewarm(self.ticket_ids[1:]))
+            pool.submit.return_value.add_done_callback.call_args[0][0](None)
+            self.assertTrue(TicketPdfCache.prewarm(self.ticket_ids[1:]))
+        self.assertEqual(pool.submit.call_count, 2)
+
+    def test_eviction_runs_outside_the_request(self):
+        from sales import pdf_cache
+
+        threads = []
+        with mock.patch.object(pdf_cache, 'EVICT_EVERY_WRITES', 1), \
+                mock.patch.object(TicketPdfCache, 'evict', side_effect=lambda: threads.append(threading.current_thread())):
+            TicketPdfCache.warm(self.ticket_ids[:1])
+            pdf_cache._evicting.result(timeout=5)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_thermal_and_escpos_renderers(self):
+        from io import BytesIO
+
+        from pypdf import PdfReader
+
+        url = f'/api/sales/tickets/{self.ticket_ids[0]}/pdf/'
+        res = self.client.get(url + '?renderer=thermal')
+        self.assertEqual(res.status_code, 200)
+        page = PdfReader(BytesIO(b''.join(res.streaming_content))).pages[0]
+        text = page.extract_text()
+        self.assertIn(f'Ticket #{self.ticket_ids[0]}', text)
+        self.assertIn('Número', text)
+        # 80 mm de ancho
+        self.assertAlmostEqual(float(page.mediabox.width), 80 * 72 / 25.4, places=1)
+
+        res = self.client.get(url + '?renderer=escpos')
+        self.assertEqual(res.status_code, 200)
+        body = b''.join(res.streaming_content)
+        self.assertTrue(body.startswith(b'\x1b@'))
+        self.assertIn('Número'.encode('cp858'), body)
+        self.assertNotEqual(res['ETag'], self.client.get(url).get('ETag'))
+
+        self.assertEqual(self.client.get(url + '?renderer=foo').status_code, 400)
+
+    def test_preview_with_thermal_renderer(self):
+        res = self.client.post('/api/sales/tickets/preview/?renderer=thermal', {
+            'zone': self.zone.id,
+            'draw_type': self.draw.id,
+            'items': [{'number': '05', 'pieces': 2}],
+        }, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content.startswith(b'%PDF'))
+
+
+@override_settings(TICKET_PDF_PREWARM=False)
+class TicketBatchPdfTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='CierreZone')
+        self.other_zone = Zone.objects.create(name='OtraZone')
+        self.draw = DrawType.objects.create(code='cierre', name='CierreDraw')
+        cutoff = timezone.localtime().time().replace(hour=23, minute=59, second=0)
+        DrawSchedule.objects.create(zone=self.zone, draw_type=self.draw, cutoff_time=cutoff)
+        DrawSchedule.objects.create(zone=self.other_zone, draw_type=self.draw, cutoff_time=cutoff)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='supervisor', password='p', role='ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for zone, n in ((self.zone, '01'), (self.zone, '02'), (self.zone, '03'), (self.other_zone, '04')):
+            res = self.client.post('/api/sales/tickets/', {
+                'zone': zone.id,
+                'draw_type': self.draw.id,
+                'items': [{'number': n, 'pieces': 1}],
+            }, format='json')
+            assert res.status_code == 201
+
+    def test_multi_page_pdf_for_zone(self):
+        from io import BytesIO
+
+        from pypdf import PdfReader
+
+        res = self.client.get(f'/api/sales/tickets/pdf-batch/?zone={self.zone.id}&draw_type={self.draw.id}&renderer=thermal')
+        self.assertEqual(res.status_code, 200)
+        reader = PdfReader(BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual(len(reader.pages), 3)
+        self.assertIn('Ticket #', reader.pages[0].extract_text())
+
+    def test_zip_and_limits(self):
+        import zipfile
+        from io import BytesIO
+
+        res = self.client.get(f'/api/sales/tickets/pdf-batch/?zone={self.zone.id}&output=zip&renderer=escpos')
+        self.assertEqual(res.status_code, 200)
+        names = zipfile.ZipFile(BytesIO(b''.join(res.streaming_content))).namelist()
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(name.endswith('.bin') for name in names))
+
+        self.assertEqual(self.client.get('/api/sales/tickets/pdf-batch/?renderer=escpos').status_code, 400)
+        self.assertEqual(self.client.get('/api/sales/tickets/pdf-batch/?zone=999').status_code, 404)
+        with override_settings(SALES_PDF_BATCH_MAX_TICKETS=2):
+            self.assertEqual(self.client.get('/api/sales/tickets/pdf-batch/').status_code, 400)
+
+    def test_render_in_process_pool(self):
+        from pypdf import PdfReader
+
+        from sales.batch_pdf import TicketBatchRenderer
+        from sales.renderers import get_renderer
+
+        with self.assertNumQueries(2):
+            tickets = TicketBatchRenderer.load({'zone_id__in': [self.zone.id]})
+        # Ya con los datos en memoria el renderizado no vuelve a la base
+        with self.assertNumQueries(0):
+            out = TicketBatchRenderer.render(tickets * 12, get_renderer('thermal'), 'pdf', processes=2)
+        self.assertEqual(len(PdfReader(out).pages), 36)
+
+    def test_process_pool_is_reused_between_batches(self):
+        from sales.batch_pdf import TicketBatchRenderer
+        from sales.process_pool import shared_process_pool
+        from sales.renderers import get_renderer
+
+        tickets = TicketBatchRenderer.load({'zone_id__in': [self.zone.id]}) * 12
+        TicketBatchRenderer.render(tickets, get_renderer('thermal'), 'zip', processes=2)
+        pool = shared_process_pool('pdf_batch', 2)
+        TicketBatchRenderer.render(tickets, get_renderer('thermal'), 'zip', processes=2)
+        self.assertIs(shared_process_pool('pdf_batch', 2), pool)
+
+
+@override_settings(TICKET_PDF_PREWARM=False)
+class TicketListTests(TestCase):
+    def setUp(self):
+        self.zone = Zone.objects.create(name='ListZone')
+        self.draw = DrawType.objects.create(code='list', name='ListDraw')
+        User = get_user_model()
+        self.user = User.objects.create_user(username='lister', password='p', role='SELLER')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_tickets(self, count):
+        tickets = Ticket.objects.bulk_create([
+            Ticket(zone=self.zone, draw_type=self.draw, user=self.user, total_pieces=2) for _ in range(count)
+        ])
+        TicketItem.objects.bulk_create([
+            TicketItem(ticket=ticket, number=number, pieces=1) for ticket in tickets for number in ('01', '02')
+        ])
+
+    def _count_list_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        self._create_tickets(30)
+        few = self._count_list_queries('/api/sales/tickets/?page_size=5')
+        many = self._count_list_queries('/api/sales/tickets/?page_size=30')
+        self.assertEqual(few, many)
+
+    def test_cursor_pagination_walks_by_descending_id(self):
+        self._create_tickets(7)
+        res = self.client.get('/api/sales/tickets/?page_size=5')
+        first_ids = [t['id'] for t in res.data['results']]
+        self.assertEqual(first_ids, sorted(first_ids, reverse=True))
+        self.assertEqual(len(res.data['results'][0]['items']), 2)
+        res = self.client.get(res.data['next'])
+        second_ids = [t['id'] for t in res.data['results']]
+        self.assertEqual(len(second_ids), 2)
+        self.assertLess(max(second_ids), min(first_ids))
+        self.assertIsNone(res.data['next'])
+
+    def test_read_path_matches_ticket_serializer(self):
+        from .serializers import TicketSerializer
+
+        self._create_tickets(3)
+        Ticket.objects.create(zone=self.zone, draw_type=self.draw, user=self.user)
+        expected = TicketSerializer(Ticket.objects.order_by('-id').prefetch_related('items'), many=True).data
+        res = self.client.get('/api/sales/tickets/')
+        self.assertEqual(res.json()['results'], [dict(ticket) for ticket in expected])
+
+        ticket = Ticket.objects.order_by('id').first()
+        res = self.client.get(f'/api/sales/tickets/{ticket.id}/')
+        self.assertEqual(res.json(), TicketSerializer(ticket).data)
+        self.assertEqual(self.client.get('/api/sales/tickets/999999/').status_code, 404)
+
+
+class SalesIndexTests(TestCase):
+    """El planificador usa los índices compuestos en las consultas calientes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import timedelta
+
+        from django.db import connection
+
+        cls.zone = Zone.objects.create(name='IdxZone')
+        cls.draw = DrawType.objects.create(code='idx', name='IdxDraw')
+        cls.user = get_user_model().objects.create_user(username='indexer', password='p', role='SELLER')
+        other_zone = Zone.objects.create(name='IdxOtherZone')
+        other_user = get_user_model().objects.create_user(username='other-indexer', password='p', role='SELLER')
+        # Volumen suficiente para que cada índice sea el plan más barato sin
+        # forzar al planificador: la zona y el vendedor tienen muchas ventas de
+        # otros días y el día tiene ventas de otras zonas y vendedores
+        groups = [
+            (cls.zone, cls.user, 20, 0),
+            (cls.zone, cls.user, 3000, 30),
+            (other_zone, other_user, 300, 0),
+            (other_zone, other_user, 5000, 30),
+        ]
+        past = []
+        for zone, user, count, days_ago in groups:
+            tickets = Ticket.objects.bulk_create([
+                Ticket(zone=zone, draw_type=cls.draw, user=user) for _ in range(count)
+            ])
+            if days_ago:
+                past.extend(ticket.pk for ticket in tickets)
+        Ticket.objects.filter(pk__in=past).update(created_at=timezone.now() - timedelta(days=30))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE sales_ticket' if connection.vendor == 'postgresql' else 'ANALYZE')
+
+    def assertUsesIndex(self, queryset, name):
+        from django.db import connection
+
+        names = [name]
+        if connection.vendor == 'postgresql':
+            # En la tabla particionada cada partición tiene su copia del índice
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                    'WHERE i.inhparent = to_regclass(%s)',
+                    [name],
+                )
+                names += [row[0] for row in cursor.fetchall()]
+        plan = queryset.explain()
+        self.assertTrue(any(index in plan for index in names), plan)
+
+    def test_zone_draw_range_uses_composite_index(self):
+        from .exports import build_ticket_filters
+
+        today = str(timezone.localdate())
+        filters = build_ticket_filters(today, today, str(self.zone.id), str(self.draw.id))
+        self.assertUsesIndex(Ticket.objects.filter(**filters), 'ticket_zone_draw_created_idx')
+
+    def test_date_range_uses_created_at_index(self):
+        from .exports import build_ticket_filters
+
+        today = str(timezone.localdate())
+        self.assertUsesIndex(Ticket.objects.filter(**build_ticket_filters(today, today)), 'ticket_created_idx')
+        self.assertUsesIndex(
+            Ticket.objects.filter(user_id=self.user.id, **build_ticket_filters(today, today)),
+            'ticket_user_created_idx',
+        )
+
+
+class TicketPartitioningTests(TestCase):
+    """Fecha de venta como clave de partición de tickets e items"""
+
+    def setUp(self):
+        self.zone = Zone.objects.create(name='PartZone')
+        self.draw = DrawType.objects.create(code='part', name='PartDraw')
+        DrawSchedule.objects.create(
+            zone=self.zone, draw_type=self.draw,
+            cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0),
+        )
+        self.user = get_user_model().objects.create_user(username='parter', password='p', role='SELLER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_ticket_and_items_share_sale_date(self):
+        res = self.client.post('/api/sales/tickets/', {
+            'zone': self.zone.id,
+            'draw_type': self.draw.id,
+            'items': [{'number': '07', 'pieces': 2}, {'number': '08', 'pieces': 1}],
+        }, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        ticket = Ticket.objects.get(id=res.data['id'])
+        self.assertEqual(ticket.sale_date, timezone.localdate())
+        self.assertEqual(set(ticket.items.values_list('sale_date', flat=True)), {ticket.sale_date})
+
+    def test_items_copy_the_ticket_sale_date(self):
+        from datetime import timedelta
+
+        ticket = Ticket.objects.create(
+            zone=self.zone, draw_type=self.draw, user=self.user,
+            sale_date=timezone.localdate() - timedelta(days=3),
+        )
+        single = TicketItem.objects.create(ticket=ticket, number='07', pieces=1)
+        TicketItem.objects.bulk_create([TicketItem(ticket=ticket, number='08', pieces=1)])
+        self.assertEqual(single.sale_date, ticket.sale_date)
+        self.assertEqual(set(ticket.items.values_list('sale_date', flat=True)), {ticket.sale_date})
+
+    def test_filters_bound_the_partition_key(self):
+        from .exports import build_ticket_filters
+
+        filters = build_ticket_filters('2024-06-01', '2024-06-03', prefix='ticket__')
+        self.assertEqual(str(filters['ticket__sale_date__gte']), '2024-06-01')
+        self.assertEqual(str(filters['ticket__sale_date__lte']), '2024-06-03')
+
+    def test_tables_have_every_declared_index(self):
+        from django.db import connection
+
+        for model in (Ticket, TicketItem):
+            declared = [
+                tuple(model._meta.get_field(name).column for name in index.fields)
+                for index in model._meta.indexes
+            ]
+            declared += [
+                (field.column,) for field in model._meta.local_fields
+                if field.db_index and not field.unique
+            ]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            indexed = {
+                tuple(info['columns']) for info in constraints.values()
+                if info['index'] and not info['primary_key']
+            }
+            for columns in declared:
+                self.assertIn(columns, indexed, f'{model._meta.db_table}: falta índice {columns}')
+
+    def test_command_requires_partitioned_tables(self):
+        from django.core.management import CommandError, call_command
+        from django.db import connection
+
+        if connection.vendor == 'postgresql':
+            self.skipTest('Solo aplica a bases sin particiones')
+        with self.assertRaises(CommandError):
+            call_command('manage_ticket_partitions')
+
+
+class TicketArchiveTests(TestCase):
+    """Archivo frío de días cerrados y reportes que lo combinan con el rollup"""
+
+    def setUp(self):
+        from datetime import datetime, time, timedelta
+
+        from .rollup_service import SalesRollupService
+
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        override = override_settings(TICKET_ARCHIVE_DIR=self.tmp)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.zone = Zone.objects.create(name='ArchiveZone')
+        self.draw = DrawType.objects.create(code='arch', name='ArchiveDraw')
+        self.user = get_user_model().objects.create_user(username='archiver', password='p', role='SELLER')
+        self.old_day = timezone.localdate() - timedelta(days=120)
+        for day, pieces in ((self.old_day, 2), (self.old_day, 3), (timezone.localdate(), 4)):
+            ticket = Ticket.objects.create(
+                zone=self.zone, draw_type=self.draw, user=self.user, total_pieces=pieces, sale_date=day,
+            )
+            TicketItem.objects.create(ticket=ticket, number='05', pieces=pieces, sale_date=day)
+        Ticket.objects.filter(sale_date=self.old_day).update(
+            created_at=timezone.make_aware(datetime.combine(self.old_day, time(12))),
+        )
+        SalesRollupService.rebuild(self.old_day, timezone.localdate())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _summary(self):
+        res = self.client.get(
+            f'/api/sales/tickets/reports/summary/?group_by=zone&zone={self.zone.id}&start={self.old_day}&daily=1&refresh=1'
+        )
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_archive_moves_closed_days_and_reports_merge_them(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from .models import ArchivedSalesDay
+
+        before = self._summary()
+        call_command('archive_tickets', stdout=StringIO())
+
+        self.assertFalse(Ticket.objects.filter(sale_date=self.old_day).exists())
+        self.assertFalse(TicketItem.objects.filter(sale_date=self.old_day).exists())
+        self.assertFalse(DailySalesRollup.objects.filter(sale_date=self.old_day).exists())
+        self.assertEqual(Ticket.objects.count(), 1)
+        archived = ArchivedSalesDay.objects.get(sale_date=self.old_day)
+        self.assertEqual((archived.tickets, archived.items, archived.total_pieces), (2, 2, 5))
+        day_dir = os.path.join(self.tmp, 'tickets', f'sale_date={self.old_day}')
+        self.assertEqual([name for name in os.listdir(day_dir) if name.endswith('.parquet')], os.listdir(day_dir))
+
+        after = self._summary()
+        self.assertEqual(after['summary'], before['summary'])
+        self.assertEqual(after['totals'], {'total_tickets': 3, 'total_pieces': 9})
+        self.assertEqual(after['daily'], before['daily'])
+
+    def test_rebuild_skips_archived_days(self):
+        from .archive import TicketArchiveService
+        from .rollup_service import SalesRollupService
+
+        TicketArchiveService.archive_day(self.old_day)
+        SalesRollupService.rebuild(self.old_day, self.old_day)
+        self.assertEqual(self._summary()['totals'], {'total_tickets': 3, 'total_pieces': 9})
+
+
+    def test_rows_sold_after_the_check_are_not_deleted(self):
+        from django.db.models import QuerySet
+
+        from .archive import TicketArchiveService
+
+        count = QuerySet.count
+        ticket = Ticket.objects.filter(sale_date=self.old_day).first()
+
+        def count_then_sell(queryset):
+            result = count(queryset)
+            if queryset.model is TicketItem and not TicketItem.objects.filter(number='06').exists():
+                # Item que llega entre la verificación de los archivos y el borrado
+                TicketItem.objects.create(ticket=ticket, number='06', pieces=1)
+            return result
+
+        with mock.patch.object(QuerySet, 'count', autospec=True, side_effect=count_then_sell):
+            with self.assertRaises(RuntimeError):
+                TicketArchiveService.archive_day(self.old_day)
+        self.assertEqual(Ticket.objects.filter(sale_date=self.old_day).count(), 2)
+        self.assertEqual(TicketItem.objects.filter(sale_date=self.old_day).count(), 3)
+        day_dir = os.path.join(self.tmp, 'tickets', f'sale_date={self.old_day}')
+        self.assertEqual(os.listdir(day_dir), [])
+
+class ExposureBoardTests(TestCase):
+    """Tablero de pedazos vendidos por número para supervisores"""
+
+    def setUp(self):
+        self.zone = Zone.objects.create(name='BoardZone')
+        self.draw = DrawType.objects.create(code='board', name='BoardDraw')
+        DrawSchedule.objects.create(
+            zone=self.zone, draw_type=self.draw,
+            cutoff_time=timezone.localtime().time().replace(hour=23, minute=59, second=0),
+        )
+        NumberLimit.objects.create(zone=self.zone, draw_type=self.draw, number='07', max_pieces=10)
+        User = get_user_model()
+        self.seller = User.objects.create_user(username='boardseller', password='p', role='SELLER')
+        self.supervisor = User.objects.create_user(username='boardsup', password='p', role='SUPERVISOR')
+        self.client = APIClient()
+
+    def test_board_reflects_sales_and_requires_supervisor(self):
+        self.client.force_authenticate(self.seller)
+        for items in ([{'number': '07', 'pieces': 3}, {'number': '99', 'pieces': 1}], [{'number': '07', 'pieces': 2}]):
+            res = self.client.post('/api/sales/tickets/', {
+                'zone': self.zone.id, 'draw_type': self.draw.id, 'items': items,
+            }, format='json')
+            self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(self.client.get('/api/sales/exposure/').status_code, 403)
+
+        self.client.force_authenticate(self.supervisor)
+        res = self.client.get(f'/api/sales/exposure/?zone={self.zone.id}')
+        self.assertEqual(res.status_code, 200)
+        board = res.json()['boards'][0]
+        self.assertEqual((board['zone'], board['draw_type']), (self.zone.id, self.draw.id))
+        self.assertEqual(len(board['sold']), 100)
+        self.assertEqual((board['sold'][7], board['sold'][99], board['total_pieces']), (5, 1, 6))
+        self.assertEqual(board['limits'], {'07': 10})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ExposureStreamTests(TestCase):
+    """Cambios de exposición publicados por zona+sorteo con su secuencia"""
+
+    def setUp(self):
+        from .exposure_stream import ExposureStream
+
+        self.zone = Zone.objects.create(name='StreamZone')
+        self.draw = DrawType.objects.create(code='stream', name='StreamDraw')
+        NumberLimit.objects.create(zone=self.zone, draw_type=self.draw, number='07', max_pieces=10)
+        patcher = mock.patch.object(ExposureStream, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_each_change_is_sent_once_with_its_seq_and_warnings(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        from catalog.cache_service import CatalogCacheService
+
+        from .exposure_stream import ExposureStream, group_name
+
+        CatalogCacheService.invalidate()
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(group_name(self.zone.id, self.draw.id), channel)
+
+        today = timezone.localdate()
+        board = (self.zone.id, self.draw.id)
+        key = (self.zone.id, self.draw.id, '07')
+        ExposureStream.publish(today, {key: 5}, {key: 0}, {board: 1})
+        ExposureStream.publish(today, {key: 3, (self.zone.id, self.draw.id, '08'): 2}, {key: 5}, {board: 2})
+        ExposureStream.publish(today, {key: 2}, {key: 8}, {board: 3})
+        # Sin acumular: el consumer de cada conexión es la única etapa que agrupa
+        self.assertEqual(ExposureStream.flush(), 3)
+        self.assertEqual(ExposureStream.flush(), 0)
+
+        messages = [async_to_sync(layer.receive)(channel) for _ in range(3)]
+        self.assertEqual([m['seq'] for m in messages], [1, 2, 3])
+        self.assertEqual([m['deltas'] for m in messages], [{'07': 5}, {'07': 3, '08': 2}, {'07': 2}])
+        self.assertEqual(
+            [(w['threshold'], w['sold']) for m in messages for w in m['warnings']],
+            [(80, 8), (100, 10)],
+        )
+
+    def test_snapshot_without_redis_has_no_seq(self):
+        from .exposure_board import ExposureBoardService
+
+        NumberExposure.objects.create(
+            zone=self.zone, draw_type=self.draw, sale_date=timezone.localdate(), number='07', sold_pieces=4
+        )
+        sold, seq = ExposureBoardService.snapshot(self.zone.id, self.draw.id, timezone.localdate())
+        self.assertEqual(sold[7], 4)
+        self.assertIsNone(seq)
+
+    def test_consumer_applies_out_of_order_changes_once(self):
+        from asgiref.sync import async_to_sync
+
+        from notifications.consumers import ExposureConsumer
+
+        consumer = ExposureConsumer()
+        consumer.sale_date = str(timezone.localdate())
+        consumer.pending, consumer.pending_warnings = {}, []
+        # Envío programado: los cambios solo se acumulan
+        consumer.flush_task = mock.Mock()
+        consumer.seq = consumer.snapshot_seq = 5
+        consumer.seen_seqs = set()
+
+        for seq, pieces in [(7, 1), (6, 2), (7, 1), (5, 4), (8, 8)]:
+            async_to_sync(consumer.exposure_delta)({
+                'date': consumer.sale_date, 'seq': seq, 'deltas': {'07': pieces}, 'warnings': [],
+            })
+        self.assertEqual(consumer.pending, {'07': 11})
+        self.assertEqual(consumer.seq, 8)
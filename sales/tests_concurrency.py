@@ -8,14 +8,15 @@ import time
 import queue
 import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from django.test import TestCase, override_settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from catalog.models import Zone, DrawType, DrawSchedule
-from sales.models import Ticket, TicketItem
+from catalog.models import Zone, DrawType, DrawSchedule, NumberLimit
+from sales.models import NumberExposure, Ticket, TicketItem
 
 User = get_user_model()
 
@@ -546,3 +547,77 @@ class ConcurrencyWithRateLimitingTestCase(ConcurrencyTestCase):
         print(f"   Exitosos: {len(successful_requests)}")
         print(f"   Rate limited: {len(rate_limited_requests)}")
         print(f"   Porcentaje limitado: {len(rate_limited_requests)/len(all_results)*100:.1f}%")
+
+
+class ExposureLockingTestCase(TransactionTestCase):
+    """Ventas y eliminaciones simultáneas en transacciones reales (sin sobreventa ni deadlocks)"""
+
+    def setUp(self):
+        if not connection.features.has_select_for_update:
+            self.skipTest('Requiere SELECT ... FOR UPDATE (PostgreSQL)')
+        self.zone = Zone.objects.create(name='Zona Bloqueo', code='LOCK', is_active=True)
+        self.draw_type = DrawType.objects.create(name='Sorteo Bloqueo', code='LOCK', is_active=True)
+        DrawSchedule.objects.create(
+            zone=self.zone, draw_type=self.draw_type, cutoff_time='23:59:00', is_active=True
+        )
+        for number in ('12', '34'):
+            NumberLimit.objects.create(zone=self.zone, draw_type=self.draw_type, number=number, max_pieces=10)
+        self.user = User.objects.create_user(username='lockuser', password='testpass123')
+
+    def _run_in_threads(self, calls):
+        """Ejecuta cada llamada en su propio thread y conexión, todas a la vez"""
+        barrier = threading.Barrier(len(calls))
+
+        def run(call):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                return call(client).status_code
+            except Exception as exc:
+                return exc
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            return [future.result() for future in [executor.submit(run, call) for call in calls]]
+
+    def _sell(self, items):
+        return lambda client: client.post('/api/sales/tickets/', {
+            'zone': self.zone.id, 'draw_type': self.draw_type.id, 'items': items,
+        }, format='json')
+
+    def test_concurrent_sales_never_oversell(self):
+        """Ocho ventas simultáneas de 3 pedazos sobre un límite de 10: solo pasan 3"""
+        results = self._run_in_threads([self._sell([{'number': '12', 'pieces': 3}])] * 8)
+
+        self.assertEqual([r for r in results if r not in (201, 400)], [])
+        self.assertEqual(results.count(201), 3)
+        sold = NumberExposure.objects.get(zone=self.zone, draw_type=self.draw_type, number='12').sold_pieces
+        self.assertEqual(sold, 9)
+        self.assertEqual(
+            sum(TicketItem.objects.filter(ticket__zone=self.zone, number='12').values_list('pieces', flat=True)),
+            sold,
+        )
+
+    def test_sales_and_deletes_with_crossed_numbers_do_not_deadlock(self):
+        """Eliminar y vender a la vez los mismos números en distinto orden no se bloquea"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        ticket_ids = [
+            client.post('/api/sales/tickets/', {
+                'zone': self.zone.id, 'draw_type': self.draw_type.id,
+                'items': [{'number': '34', 'pieces': 1}, {'number': '12', 'pieces': 1}],
+            }, format='json').data['id']
+            for _ in range(4)
+        ]
+        calls = [lambda c, pk=pk: c.delete(f'/api/sales/tickets/{pk}/') for pk in ticket_ids]
+        calls += [self._sell([{'number': '12', 'pieces': 1}, {'number': '34', 'pieces': 1}])] * 4
+
+        results = self._run_in_threads(calls)
+
+        self.assertEqual(results, [204] * 4 + [201] * 4)
+        sold = dict(NumberExposure.objects.filter(
+            zone=self.zone, draw_type=self.draw_type
+        ).values_list('number', 'sold_pieces'))
+        self.assertEqual(sold, {'12': 4, '34': 4})
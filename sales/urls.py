@@ -1,10 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import TicketViewSet
+from .views import ExportJobViewSet, ExposureBoardViewSet, TicketViewSet
 
 router = DefaultRouter()
 router.register(r'tickets', TicketViewSet)
+router.register(r'export-jobs', ExportJobViewSet, basename='export-job')
+router.register(r'exposure', ExposureBoardViewSet, basename='exposure')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,18 +1,43 @@
-import csv
-from io import BytesIO, StringIO
+from datetime import date
+from io import StringIO
+from types import SimpleNamespace
 
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Count, Sum
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from openpyxl import Workbook
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.response import Response
-from xhtml2pdf import pisa
 
+from catalog.cache_service import CatalogCacheService
+
+from .batch_pdf import TicketBatchRenderer
+from .batch_service import TicketBatchService
 from .cache_service import ReportCacheService
-from .models import Ticket
-from .serializers import TicketSerializer
+from .export_jobs import ExportJobService
+from .exports import (
+    XLSX_CONTENT_TYPE,
+    build_ticket_filters,
+    detail_export,
+    stream_csv,
+    summary_sheets,
+    write_summary_csv,
+    write_xlsx,
+)
+from .exposure_board import ExposureBoardService
+from .exposure_service import ExposureService
+from .models import ExportJob, Ticket
+from .pagination import TicketCursorPagination
+from .pdf_cache import TicketPdfCache
+from .renderers import get_renderer
+from .read_service import TicketReadService
+from .rollup_service import SalesRollupService
+from .serializers import ExportJobSerializer, TicketSerializer
 
 
 class IsSellerOrAdmin(permissions.BasePermission):
@@ -20,24 +45,143 @@ class IsSellerOrAdmin(permissions.BasePermission):
         return bool(request.user and request.user.is_authenticated)
 
 
+class IsSupervisorOrAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return bool(
+            request.user and request.user.is_authenticated and
+            (request.user.role in {'ADMIN', 'SUPERVISOR'} or request.user.is_superuser)
+        )
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Ignora ?format= al elegir el renderer
+
+    En los reportes ?format= indica el tipo de archivo a exportar, no el
+    renderer de DRF; sin esto DRF responde 404 para csv/xlsx. Los parsers
+    se eligen como siempre, por Content-Type.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
 class TicketViewSet(viewsets.ModelViewSet):
     queryset = Ticket.objects.select_related('zone', 'draw_type', 'user').all().order_by('-id')
     serializer_class = TicketSerializer
     permission_classes = [IsSellerOrAdmin]
+    pagination_class = TicketCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        # Lectura liviana desde .values(): misma forma JSON que TicketSerializer
+        rows = TicketReadService.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(TicketReadService.to_representation(page))
+        return Response(TicketReadService.to_representation(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        rows = TicketReadService.rows(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(rows, pk=kwargs[self.lookup_field])
+        self.check_object_permissions(request, row)
+        return Response(TicketReadService.to_representation([row])[0])
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        ticket = serializer.save(user=self.request.user)
+        transaction.on_commit(lambda: TicketPdfCache.prewarm([ticket.pk]))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Devolver al acumulado diario y al rollup de reportes lo del ticket eliminado,
+        # en el mismo orden de bloqueo que la venta (acumulado y luego rollup)
+        ExposureService.release(
+            instance.zone_id,
+            instance.draw_type_id,
+            instance.sale_date,
+            dict(instance.items.filter(sale_date=instance.sale_date).values_list('number', 'pieces')),
+        )
+        SalesRollupService.remove([instance])
+        ticket_id = instance.pk
+        instance.delete()
+        transaction.on_commit(lambda: TicketPdfCache.discard(ticket_id))
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Emite varios tickets en una sola petición, con resultado por ticket"""
+        tickets = request.data.get('tickets') if isinstance(request.data, dict) else None
+        if not isinstance(tickets, list) or not tickets:
+            return Response({'detail': 'Se requiere una lista de tickets.'}, status=400)
+        max_tickets = getattr(settings, 'SALES_BATCH_MAX_TICKETS', 100)
+        if len(tickets) > max_tickets:
+            return Response({'detail': f'Máximo {max_tickets} tickets por lote.'}, status=400)
+
+        results = TicketBatchService.issue(tickets, request.user, self.get_serializer_context())
+        created_ids = [r['ticket']['id'] for r in results if r['status'] == 201]
+        transaction.on_commit(lambda: TicketPdfCache.prewarm(created_ids))
+        created = len(created_ids)
+        if created == len(results):
+            status_code = 201
+        elif created == 0:
+            status_code = 400
+        else:
+            status_code = 207
+        return Response(
+            {'created': created, 'rejected': len(results) - created, 'results': results},
+            status=status_code,
+        )
 
     @action(detail=True, methods=['get'])
     def pdf(self, request, pk=None):
+        """
+        Ticket servido desde el cache en disco, con ETag
+
+        ?renderer=html|thermal|escpos elige el formato (por defecto
+        TICKET_PDF_RENDERER).
+        """
+        try:
+            renderer = get_renderer(request.query_params.get('renderer'))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
         ticket = self.get_object()
-        html = render_to_string('tickets/ticket.html', {'ticket': ticket})
-        result = BytesIO()
-        pisa.CreatePDF(src=html, dest=result)
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="ticket-{ticket.id}.pdf"'
+        etag = TicketPdfCache.etag(ticket.pk, renderer)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                open(TicketPdfCache.get_path(ticket, renderer), 'rb'), content_type=renderer.content_type
+            )
+            response['Content-Disposition'] = f'inline; filename="ticket-{ticket.id}.{renderer.extension}"'
+        response['ETag'] = etag
         return response
 
+    @action(detail=False, methods=['get'], url_path='pdf-batch')
+    def pdf_batch(self, request):
+        """
+        Reimpresión de un rango de tickets en un solo archivo
+
+        Filtros como reports/detail (start, end, zone, draw_type, user);
+        ?output=pdf (una página por ticket) o zip, y ?renderer=.
+        """
+        params = request.query_params
+        output = params.get('output', 'pdf')
+        try:
+            renderer = get_renderer(params.get('renderer'))
+            filters = build_ticket_filters(
+                params.get('start'), params.get('end'), params.get('zone'), params.get('draw_type'), params.get('user'),
+            )
+            tickets = TicketBatchRenderer.load(filters, max_tickets=settings.SALES_PDF_BATCH_MAX_TICKETS)
+            if not tickets:
+                return Response({'detail': 'No hay tickets para los filtros indicados.'}, status=404)
+            out = TicketBatchRenderer.render(tickets, renderer, output, settings.SALES_PDF_BATCH_PROCESSES)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        return FileResponse(
+            out,
+            as_attachment=True,
+            filename=f'tickets.{output}',
+            content_type='application/zip' if output == 'zip' else 'application/pdf',
+        )
+
     @action(detail=False, methods=['post'])
     def preview(self, request):
         data = request.data
@@ -46,43 +190,30 @@ class TicketViewSet(viewsets.ModelViewSet):
         items = data.get('items', [])
         if not zone or not draw_type or not items:
             return Response({'detail': 'Datos incompletos.'}, status=400)
+        try:
+            renderer = get_renderer(request.query_params.get('renderer'))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
         # Renderizar previo sin persistir
-        context = {
-            'ticket': {
-                'id': 'PREVIEW',
-                'created_at': '',
-                'zone': type('X', (), {'name': ''})(),
-                'draw_type': type('X', (), {'name': ''})(),
-                'user': type('X', (), {'username': request.user.username if request.user.is_authenticated else 'anon'})(),
-                'total_pieces': sum(int(i.get('pieces', 0)) for i in items),
-                'items': type('Y', (), {'all': lambda self: [type('I', (), i)() for i in items]})(),
-            }
-        }
-        html = render_to_string('tickets/ticket.html', context)
-        result = BytesIO()
-        pisa.CreatePDF(src=html, dest=result)
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = 'inline; filename="ticket-preview.pdf"'
+        ticket = SimpleNamespace(
+            id='PREVIEW',
+            created_at='',
+            zone=SimpleNamespace(name=''),
+            draw_type=SimpleNamespace(name=''),
+            user=SimpleNamespace(username=request.user.username if request.user.is_authenticated else 'anon'),
+            total_pieces=sum(int(i.get('pieces', 0)) for i in items),
+            items=SimpleNamespace(all=lambda: [SimpleNamespace(**i) for i in items]),
+        )
+        response = HttpResponse(renderer.render(ticket), content_type=renderer.content_type)
+        response['Content-Disposition'] = f'inline; filename="ticket-preview.{renderer.extension}"'
         return response
 
     def _build_filters(self, request):
-        start = request.query_params.get('start')
-        end = request.query_params.get('end')
-        filters = {}
-        if start:
-            filters['created_at__date__gte'] = start
-        if end:
-            filters['created_at__date__lte'] = end
-        zone = request.query_params.get('zone')
-        draw_type = request.query_params.get('draw_type')
-        user = request.query_params.get('user')
-        if zone:
-            filters['zone_id__in'] = [z for z in str(zone).split(',') if z]
-        if draw_type:
-            filters['draw_type_id__in'] = [d for d in str(draw_type).split(',') if d]
-        if user:
-            filters['user_id__in'] = [u for u in str(user).split(',') if u]
-        return filters
+        # Rango semiabierto sobre created_at para que se usen los índices
+        params = request.query_params
+        return build_ticket_filters(
+            params.get('start'), params.get('end'), params.get('zone'), params.get('draw_type'), params.get('user'),
+        )
 
     def _build_summary(self, request):
         group_by = request.query_params.get('group_by', 'zone')
@@ -162,7 +293,7 @@ class TicketViewSet(viewsets.ModelViewSet):
             payload['daily'] = daily
         return payload, None
 
-    @action(detail=False, methods=['get'], url_path='reports/summary')
+    @action(detail=False, methods=['get'], url_path='reports/summary', content_negotiation_class=ExportContentNegotiation)
     def reports_summary(self, request):
         # Obtener parámetros de la request
         start_date = request.query_params.get('start')
@@ -197,37 +328,16 @@ class TicketViewSet(viewsets.ModelViewSet):
                 filename = 'reporte'
                 if fmt == 'csv':
                     sio = StringIO()
-                    writer = csv.writer(sio)
-                    writer.writerow(['Grupo', 'Total Tickets', 'Total Pedazos'])
-                    for row in payload['summary']:
-                        writer.writerow([row['group'], row['total_tickets'], row['total_pieces']])
-                    writer.writerow([])
-                    writer.writerow(['Totales', payload['totals']['total_tickets'], payload['totals']['total_pieces']])
-                    if payload.get('daily'):
-                        writer.writerow([])
-                        writer.writerow(['Fecha', 'Total Tickets', 'Total Pedazos'])
-                        for row in payload['daily']:
-                            writer.writerow([row['date'], row['total_tickets'], row['total_pieces']])
+                    write_summary_csv(payload, sio)
                     out = HttpResponse(sio.getvalue(), content_type='text/csv; charset=utf-8')
                     out['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
                     return out
                 elif fmt == 'xlsx':
-                    wb = Workbook()
-                    ws = wb.active
-                    ws.title = 'Resumen'
-                    ws.append(['Grupo', 'Total Tickets', 'Total Pedazos'])
-                    for row in payload['summary']:
-                        ws.append([row['group'], row['total_tickets'], row['total_pieces']])
-                    ws.append([])
-                    ws.append(['Totales', payload['totals']['total_tickets'], payload['totals']['total_pieces']])
-                    if payload.get('daily'):
-                        ws2 = wb.create_sheet('Diario')
-                        ws2.append(['Fecha', 'Total Tickets', 'Total Pedazos'])
-                        for row in payload['daily']:
-                            ws2.append([row['date'], row['total_tickets'], row['total_pieces']])
-                    bio = BytesIO()
-                    wb.save(bio)
-                    out = HttpResponse(bio.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                    sheets = summary_sheets(payload)
+                    if request.query_params.get('detail', '0') in {'1', 'true', 'True'}:
+                        header, rows = detail_export('tickets', request.query_params)
+                        sheets.append(('Tickets', header, rows))
+                    out = FileResponse(write_xlsx(sheets), content_type=XLSX_CONTENT_TYPE)
                     out['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
                     return out
             except Exception as e:
@@ -236,53 +346,65 @@ class TicketViewSet(viewsets.ModelViewSet):
         
         return Response(payload)
 
+    @action(detail=False, methods=['get'], url_path='reports/detail', content_negotiation_class=ExportContentNegotiation)
+    def reports_detail(self, request):
+        """
+        Exportación detallada (tickets o números jugados) en streaming
+
+        Recorre la base de datos con un cursor del servidor y envía el archivo
+        a medida que se genera, por lo que la memoria no depende del rango.
+        """
+        level = request.query_params.get('level', 'tickets')
+        fmt = request.query_params.get('format', 'csv').lower()
+        if fmt not in {'csv', 'xlsx'}:
+            return Response({'detail': 'Formato no soportado'}, status=400)
+        try:
+            header, rows = detail_export(level, request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        if fmt == 'xlsx':
+            out = FileResponse(write_xlsx([(level.capitalize(), header, rows)]), content_type=XLSX_CONTENT_TYPE)
+        else:
+            out = StreamingHttpResponse(stream_csv(header, rows), content_type='text/csv; charset=utf-8')
+        out['Content-Disposition'] = f'attachment; filename="reporte-{level}.{fmt}"'
+        return out
+
     @action(detail=False, methods=['get'], url_path='test-export')
     def test_export(self, request):
         print(f"Test export endpoint called with params: {request.query_params}")
         return Response({"message": "Test export endpoint working", "params": dict(request.query_params)}, status=200)
     
-    @action(detail=False, methods=['get', 'post'], url_path='reports/export')
+    @action(detail=False, methods=['post'], url_path='reports/export', content_negotiation_class=ExportContentNegotiation)
     def reports_export(self, request):
-        print(f"Export endpoint called with params: {request.query_params}")
-        return Response({"message": "Export endpoint working", "params": dict(request.query_params)}, status=200)
-        fmt = request.query_params.get('format', 'csv').lower()
-        filename = 'reporte'
-        if fmt == 'csv':
-            sio = StringIO()
-            writer = csv.writer(sio)
-            writer.writerow(['Grupo', 'Total Tickets', 'Total Pedazos'])
-            for row in payload['summary']:
-                writer.writerow([row['group'], row['total_tickets'], row['total_pieces']])
-            writer.writerow([])
-            writer.writerow(['Totales', payload['totals']['total_tickets'], payload['totals']['total_pieces']])
-            if payload.get('daily'):
-                writer.writerow([])
-                writer.writerow(['Fecha', 'Total Tickets', 'Total Pedazos'])
-                for row in payload['daily']:
-                    writer.writerow([row['date'], row['total_tickets'], row['total_pieces']])
-            out = HttpResponse(sio.getvalue(), content_type='text/csv; charset=utf-8')
-            out['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-            return out
-        elif fmt == 'xlsx':
-            wb = Workbook()
-            ws = wb.active
-            ws.title = 'Resumen'
-            ws.append(['Grupo', 'Total Tickets', 'Total Pedazos'])
-            for row in payload['summary']:
-                ws.append([row['group'], row['total_tickets'], row['total_pieces']])
-            ws.append([])
-            ws.append(['Totales', payload['totals']['total_tickets'], payload['totals']['total_pieces']])
-            if payload.get('daily'):
-                ws2 = wb.create_sheet('Diario')
-                ws2.append(['Fecha', 'Total Tickets', 'Total Pedazos'])
-                for row in payload['daily']:
-                    ws2.append([row['date'], row['total_tickets'], row['total_pieces']])
-            bio = BytesIO()
-            wb.save(bio)
-            out = HttpResponse(bio.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            out['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
-            return out
-        return Response({'detail': 'Formato no soportado'}, status=400)
+        """
+        Encola una exportación y responde de inmediato con el id del trabajo
+
+        El archivo (csv, xlsx o pdf) lo genera el pool de workers en
+        MEDIA_ROOT; el avance se consulta en export-jobs/<id>/ y también se
+        publica como notificación de reporte al usuario.
+        """
+        params = request.query_params.dict()
+        if hasattr(request.data, 'dict'):
+            # Formulario o multipart: QueryDict guarda listas por clave
+            params.update(request.data.dict())
+        elif isinstance(request.data, dict):
+            params.update(request.data)
+        level = params.get('level', 'summary')
+        fmt = str(params.get('format', 'csv')).lower()
+        if fmt == 'excel':
+            fmt = 'xlsx'
+        try:
+            job = ExportJobService.create(request.user, level, fmt, params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        return Response(
+            {
+                'job_id': str(job.pk),
+                'status': job.status,
+                'status_url': f'/api/sales/export-jobs/{job.pk}/',
+            },
+            status=202,
+        )
 
     @action(detail=False, methods=['get'], url_path='cache/stats')
     def cache_stats(self, request):
@@ -297,3 +419,90 @@ class TicketViewSet(viewsets.ModelViewSet):
         return Response(result)
 
 
+
+
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Estado y descarga de las exportaciones del usuario"""
+
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsSellerOrAdmin]
+
+    CONTENT_TYPES = {
+        'csv': 'text/csv; charset=utf-8',
+        'xlsx': XLSX_CONTENT_TYPE,
+        'pdf': 'application/pdf',
+    }
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Un trabajo huérfano (worker caído) se informa como fallido al consultarlo
+        job = self.get_object()
+        if job.status == ExportJob.STATUS_RUNNING and ExportJobService.reap_stale(job.pk):
+            job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.STATUS_DONE or not job.file:
+            return Response({'detail': 'La exportación aún no está disponible', 'status': job.status}, status=409)
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=f'reporte-{job.level}.{job.format}',
+            content_type=self.CONTENT_TYPES[job.format],
+        )
+
+
+class ExposureBoardViewSet(viewsets.ViewSet):
+    """
+    Tablero de exposición: pedazos vendidos de los números 00-99 por zona y sorteo
+
+    Se lee del tablero precalculado en Redis, sin consultar la base, para
+    poder refrescarlo cada segundo. Parámetros opcionales: zone y draw_type
+    (ids separados por coma; por defecto los horarios activos), date
+    (YYYY-MM-DD, por defecto hoy) y refresh=1 para recalcular desde la base.
+    """
+
+    permission_classes = [IsSupervisorOrAdmin]
+
+    def list(self, request):
+        params = request.query_params
+        try:
+            sale_date = date.fromisoformat(params['date']) if params.get('date') else timezone.localdate()
+            zones = [int(z) for z in params.get('zone', '').split(',') if z.strip()]
+            draw_types = [int(d) for d in params.get('draw_type', '').split(',') if d.strip()]
+        except ValueError:
+            return Response({'detail': 'Parámetros inválidos'}, status=400)
+
+        catalog = CatalogCacheService.get_snapshot()
+        if zones and draw_types:
+            pairs = [(zone_id, draw_type_id) for zone_id in zones for draw_type_id in draw_types]
+        else:
+            pairs = [
+                (zone_id, draw_type_id)
+                for zone_id, draw_type_id in sorted(catalog.schedules)
+                if (not zones or zone_id in zones) and (not draw_types or draw_type_id in draw_types)
+            ]
+
+        if params.get('refresh', '0') in {'1', 'true', 'True'}:
+            boards = ExposureBoardService.rebuild(pairs, sale_date)
+        else:
+            boards = ExposureBoardService.get_boards(pairs, sale_date)
+        return Response({
+            'date': str(sale_date),
+            'boards': [
+                {
+                    'zone': zone_id,
+                    'zone_name': getattr(catalog.zones.get(zone_id), 'name', ''),
+                    'draw_type': draw_type_id,
+                    'draw_type_name': getattr(catalog.draw_types.get(draw_type_id), 'name', ''),
+                    'sold': boards[(zone_id, draw_type_id)],
+                    'limits': catalog.get_limits(zone_id, draw_type_id),
+                    'total_pieces': sum(boards[(zone_id, draw_type_id)]),
+                }
+                for zone_id, draw_type_id in pairs
+            ],
+        })
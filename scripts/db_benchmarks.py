@@ -125,12 +125,15 @@ class DatabaseBenchmark:
     def benchmark_report_queries(self):
         """Benchmarks para queries de reportes"""
         print("📊 Ejecutando benchmarks de reportes...")
+        # Rango semiabierto sobre created_at (usa el índice, a diferencia de __date)
+        today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
         
         # 1. Reporte de resumen diario
         self.measure_query(
             "daily_summary_report",
             lambda: list(Ticket.objects.filter(
-                created_at__date=timezone.now().date()
+                created_at__gte=today_start,
+                created_at__lt=today_start + timedelta(days=1)
             ).values('zone__name').annotate(
                 total_tickets=Count('id'),
                 total_pieces=Sum('total_pieces')
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización del listado de tickets
+Compara TicketSerializer (ModelSerializer anidado) con la lectura liviana
+desde .values() que usan list/retrieve, en tiempo por cada 1.000 tickets.
+
+Los datos de prueba se crean dentro de una transacción que se revierte al final.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Agregar el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.db import transaction
+
+# Configurar Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+
+from catalog.models import DrawType, Zone
+from sales.models import Ticket, TicketItem
+from sales.read_service import TicketReadService
+from sales.serializers import TicketSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+def create_tickets(count: int, items_per_ticket: int):
+    zone = Zone.objects.create(name='Benchmark Zona')
+    draw = DrawType.objects.create(code='benchmark', name='Benchmark Sorteo')
+    user = get_user_model().objects.create_user(username='benchmark_serializer', password='x')
+    tickets = Ticket.objects.bulk_create([
+        Ticket(zone=zone, draw_type=draw, user=user, total_pieces=items_per_ticket) for _ in range(count)
+    ])
+    TicketItem.objects.bulk_create([
+        TicketItem(ticket=ticket, number=f'{n:02d}', pieces=1)
+        for ticket in tickets
+        for n in range(items_per_ticket)
+    ])
+    return [ticket.id for ticket in tickets]
+
+
+def measure(func, rounds: int):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialización del listado de tickets')
+    parser.add_argument('--tickets', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=5, help='Items por ticket')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"🚀 Serializando {args.tickets} tickets con {args.items} items cada uno ({args.rounds} rondas)...")
+    try:
+        with transaction.atomic():
+            ids = create_tickets(args.tickets, args.items)
+            queryset = Ticket.objects.filter(id__in=ids).order_by('-id')
+
+            # Solo serialización: los datos ya están en memoria
+            instances = list(queryset.prefetch_related('items'))
+            rows = list(TicketReadService.rows(queryset))
+            results = {
+                'TicketSerializer (solo serialización)': measure(
+                    lambda: TicketSerializer(instances, many=True).data, args.rounds
+                ),
+                'TicketReadService (armado + consulta items)': measure(
+                    lambda: TicketReadService.to_representation(rows), args.rounds
+                ),
+                # Camino completo: consultas + serialización
+                'TicketSerializer + prefetch (completo)': measure(
+                    lambda: TicketSerializer(queryset.prefetch_related('items'), many=True).data, args.rounds
+                ),
+                'TicketReadService (completo)': measure(
+                    lambda: TicketReadService.to_representation(TicketReadService.rows(queryset)), args.rounds
+                ),
+            }
+            raise _Rollback
+    except _Rollback:
+        pass
+
+    print("\n" + "=" * 60)
+    print("📊 TIEMPO POR 1.000 TICKETS (mediana)")
+    print("=" * 60)
+    scale = 1000 / args.tickets
+    for name, seconds in results.items():
+        print(f"{name:<42} {seconds * scale * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()